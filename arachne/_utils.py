@@ -1,4 +1,7 @@
+import os
+import tempfile
 from os import PathLike
+from pathlib import Path
 from typing import Any
 
 
@@ -10,3 +13,19 @@ def load_js(path: PathLike[Any]) -> str:
         raise ValueError(
             "Could not find tag_utils.js. Please ensure that you complied typescript using `npm run build`"
         ) from e
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """
+    Writes `text` to a temporary file next to `path` and renames it over `path`, so readers see either the old
+    file or the new one, never a partial write.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -1,25 +1,39 @@
+import asyncio
 from asyncio import Protocol
 from pathlib import Path
-from typing import Dict, Tuple
-import io
-
-from regex import regex
-import json
-
-import base64
-from PIL import Image
-import requests
+from typing import Any, Dict, Tuple
+import hashlib
+import time
+import weakref
 
 from icecream import ic
 
 from arachne._utils import load_js
 from arachne.browser import PlaywrightAsync
-from playwright.async_api import async_playwright
+from arachne.browser.manager import ScreenshotOptions
+from arachne.browser.actions import Action, ClickAction, GotoUrlAction, InputTextAction
+from arachne.browser.readiness import PageReadiness, ReadinessConfig
+from arachne.executor import ActionExecutor
+from arachne.fingerprint import PageFingerprint, tag_digest
+from arachne.history import TaskHistory
+from arachne.llm.cache import LLMResponseCache
+from arachne.llm.chat import ChatClient
+from arachne.llm.parsing import IncrementalJSONParser, extract_json
+from arachne.metrics import Metrics, metrics as shared_metrics
+from arachne.ocr import OCRBackend
+from arachne.segments import ImageContent, SegmentEncoder
+from arachne.text_format import format_text
+from arachne.trace import ActionTrace, TraceReplayer, TraceStore
+from playwright.async_api import BrowserContext, ElementHandle, async_playwright
 
 from playwright.async_api import Page as PageAsync
 
 TagToXPath = Dict[int, str]
 
+# Versions of the tagging utilities registered as an init script, by browser context. Shared by every WebWeaver,
+# because a pooled context outlives the weavers that use it and init scripts can't be removed.
+_js_utils_versions: weakref.WeakKeyDictionary[BrowserContext, set[str]] = weakref.WeakKeyDictionary()
+
 
 class IWebWeaver(Protocol):
     async def page_to_image(self, driver: PageAsync) -> Tuple[bytes, Dict[int, str]]:
@@ -31,11 +45,65 @@ class IWebWeaver(Protocol):
 
 class WebWeaver(IWebWeaver):
     _JS_TAG_UTILS = Path(__file__).parent / "tags.min.js"
+    _UNCHANGED_PAGE_NOTE = (
+        "The page did not change after your last action, so its screenshots are not attached again. "
+        "Pick a different action or element than the one you just tried."
+    )
 
-    def __init__(self, api_key: str):
+    def __init__(
+            self,
+            api_key: str,
+            incremental_tagging: bool = False,
+            screenshot_options: ScreenshotOptions | None = None,
+            segment_encoder: SegmentEncoder | None = None,
+            skip_unchanged_pages: bool = True,
+            readiness_config: ReadinessConfig | None = None,
+            chat_client: ChatClient | None = None,
+            stream_responses: bool = False,
+            llm_cache: LLMResponseCache | None = None,
+            history_token_budget: int = 2000,
+            history_keep_last: int = 3,
+            metrics: Metrics | None = None,
+            ocr_backend: OCRBackend | None = None,
+            trace_store: TraceStore | None = None,
+    ):
         self._js_utils: str = load_js(self._JS_TAG_UTILS)
+        self._js_utils_version = hashlib.sha1(self._js_utils.encode()).hexdigest()[:12]
+        # Wrapped so re-running it in a document that already has this version is a no-op
+        self._js_utils_init_script = (
+            f'(() => {{ if (window.__arachneTagsVersion === "{self._js_utils_version}") return;\n'
+            f"{self._js_utils}\n"
+            f'window.__arachneTagsVersion = "{self._js_utils_version}"; }})();'
+        )
         self.tag_to_xpath: TagToXPath = {}
         self.api_key = api_key
+        # Pass a shared client to reuse its connection pool across agents
+        self.chat_client = chat_client or ChatClient(api_key, cache=llm_cache)
+        # Streams model responses and prepares the action while the model is still writing its thought
+        self.stream_responses = stream_responses
+        self._prepared_elements: Dict[int, ElementHandle] = {}
+        self.history_token_budget = history_token_budget
+        self.history_keep_last = history_keep_last
+        # Keeps element ids stable across steps and only re-tags the subtrees that changed
+        self.incremental_tagging = incremental_tagging
+        self._incremental_tag_to_xpath: TagToXPath = {}
+        self.screenshot_options = screenshot_options or ScreenshotOptions()
+        # Segments are encoded in the screenshot's own format, so jpeg and webp screenshots are not sent as png
+        self.segment_encoder = segment_encoder or SegmentEncoder(
+            image_format=self.screenshot_options.image_format, quality=self.screenshot_options.quality
+        )
+        # When the page did not change after an action the model is told so instead of getting the same images
+        self.skip_unchanged_pages = skip_unchanged_pages
+        self.page_fingerprint: PageFingerprint | None = None
+        self.page_changed = True
+        self._observation: list[ImageContent] = []
+        self.metrics = metrics or shared_metrics
+        self.readiness = PageReadiness(readiness_config, metrics=self.metrics)
+        # Reads page_to_text from a screenshot instead of the DOM, for text drawn in images and canvases
+        self.ocr_backend = ocr_backend
+        self.action_executor = ActionExecutor(self)
+        # Records successful runs and replays them without the model while the pages stay the same
+        self.trace_store = trace_store
 
     async def setup_web(self):
         p = await async_playwright().__aenter__()
@@ -49,12 +117,14 @@ class WebWeaver(IWebWeaver):
             tagless: bool = False,
             keep_tags_showing: bool = False,
     ) -> Tuple[bytes, TagToXPath]:
-        self.tag_to_xpath = (
-            await self._tag_page(driver, tag_text_elements) if not tagless else {}
-        )
-        screenshot = await self._take_screenshot(PlaywrightAsync(driver))
+        with self.metrics.span("tagging"):
+            self.tag_to_xpath = (
+                await self._tag_page(driver, tag_text_elements) if not tagless else {}
+            )
+        with self.metrics.span("screenshot"):
+            screenshot = await self._take_screenshot(PlaywrightAsync(driver))
         if not tagless and not keep_tags_showing:
-            await self._remove_tags(PlaywrightAsync(driver))
+            await self._remove_tags(driver)
         return screenshot, self.tag_to_xpath if not tagless else {}
 
     async def page_to_text(
@@ -64,11 +134,24 @@ class WebWeaver(IWebWeaver):
             tagless: bool = False,
             keep_tags_showing: bool = False,
     ) -> Tuple[str, TagToXPath]:
-        image, tag_to_xpath = await self.page_to_image(
-            driver, tag_text_elements, tagless, keep_tags_showing
-        )
-        page_text = self._run_ocr(image)
-        return page_text, tag_to_xpath
+        """
+        Text view of the page with the tags of the elements inline. It is laid out from the DOM without taking a
+        screenshot, or read from a screenshot when an OCR backend is configured.
+        """
+        if self.ocr_backend is not None:
+            image, tag_to_xpath = await self.page_to_image(
+                driver, tag_text_elements, tagless, keep_tags_showing
+            )
+            return await self._run_ocr(image), tag_to_xpath
+
+        with self.metrics.span("tagging"):
+            self.tag_to_xpath = (
+                await self._tag_page(driver, tag_text_elements) if not tagless else {}
+            )
+        page_text = await self._layout_text(driver)
+        if not tagless and not keep_tags_showing:
+            await self._remove_tags(driver)
+        return page_text, self.tag_to_xpath if not tagless else {}
 
     async def page_to_image_and_text(
             self,
@@ -77,76 +160,121 @@ class WebWeaver(IWebWeaver):
             tagless: bool = False,
             keep_tags_showing: bool = False,
     ) -> Tuple[bytes, str, TagToXPath]:
+        if self.ocr_backend is not None:
+            image, tag_to_xpath = await self.page_to_image(
+                driver, tag_text_elements, tagless, keep_tags_showing
+            )
+            return image, await self._run_ocr(image), tag_to_xpath
+
         image, tag_to_xpath = await self.page_to_image(
-            driver, tag_text_elements, tagless, keep_tags_showing
+            driver, tag_text_elements, tagless, keep_tags_showing=True
         )
-        return image, "", tag_to_xpath
+        page_text = await self._layout_text(driver)
+        if not tagless and not keep_tags_showing:
+            await self._remove_tags(driver)
+        return image, page_text, tag_to_xpath
 
-    @staticmethod
-    async def _take_screenshot(browser: PlaywrightAsync) -> bytes:
+    async def _take_screenshot(self, browser: PlaywrightAsync) -> bytes:
         viewport = await browser.get_viewport_size()
         default_width = viewport["width"]
 
         await browser.set_viewport_size(default_width, viewport["content_height"])
-        screenshot = await browser.take_screenshot()
-        # await browser.set_viewport_size(default_width, viewport["height"])
+        try:
+            screenshot = await browser.take_screenshot(self.screenshot_options)
+        finally:
+            await browser.set_viewport_size(default_width, viewport["height"])
 
         return screenshot
 
-    def _run_ocr(self, image: bytes) -> str:
-        return ""
+    async def _run_ocr(self, image: bytes) -> str:
+        if self.ocr_backend is None:
+            return ""
+        with self.metrics.span("ocr"):
+            annotations = await self.ocr_backend.annotate(image)
+            if not annotations:
+                return ""
+            return await asyncio.to_thread(format_text, annotations)
+
+    async def _layout_text(self, page: PageAsync) -> str:
+        with self.metrics.span("text_layout"):
+            annotations = await self._run_js_utils(page, "window.getTextAnnotations()")
+            if not annotations:
+                return ""
+            return await asyncio.to_thread(format_text, annotations)
+
+    async def _ensure_js_utils(self, page: PageAsync) -> None:
+        """
+        Registers the tagging utilities as an init script of the page's browser context, once per context and
+        version, whichever weaver gets there first. Init scripts run in every frame of every document the context
+        loads, so they survive navigations.
+        """
+        versions = _js_utils_versions.setdefault(page.context, set())
+        if self._js_utils_version in versions:
+            return
+        # Claimed before awaiting, so weavers sharing the context don't register it concurrently
+        versions.add(self._js_utils_version)
+        try:
+            await page.context.add_init_script(self._js_utils_init_script)
+        except BaseException:
+            versions.discard(self._js_utils_version)
+            raise
+
+    async def _run_js_utils(self, page: PageAsync, expression: str) -> Any:
+        """
+        Evaluates an expression that needs the tagging utilities in a single round trip. Documents that were loaded
+        before the init script was registered get the utilities injected once and the expression is retried.
+        """
+        await self._ensure_js_utils(page)
+        browser = PlaywrightAsync(page)
+        script = (
+            f'window.__arachneTagsVersion === "{self._js_utils_version}" '
+            f"? {{ ready: true, value: {expression} }} : {{ ready: false }}"
+        )
+
+        result = await browser.run_js(script)
+        if not result["ready"]:
+            await browser.run_js(self._js_utils_init_script)
+            result = await browser.run_js(script)
+        return result.get("value")
 
     async def _tag_page(
             self, page: PageAsync, tag_text_elements: bool = False
     ) -> Dict[int, str]:
-        browser = PlaywrightAsync(page)
-        await browser.run_js(self._js_utils)
+        if self.incremental_tagging:
+            return await self._tag_page_incremental(page, tag_text_elements)
 
-        script = f"return window.tagifyWebpage({str(tag_text_elements).lower()});"
-        tag_to_xpath = await browser.run_js(script)
+        script = f"window.tagifyWebpage({str(tag_text_elements).lower()})"
+        tag_to_xpath = await self._run_js_utils(page, script)
 
         return {int(key): value for key, value in tag_to_xpath.items()}
 
-    async def _remove_tags(self, browser: PlaywrightAsync) -> None:
-        await browser.run_js(js=self._js_utils)
-        script = "return window.removeTags();"
+    async def _tag_page_incremental(
+            self, page: PageAsync, tag_text_elements: bool = False
+    ) -> Dict[int, str]:
+        script = f"window.tagifyWebpageIncremental({str(tag_text_elements).lower()})"
+        delta = await self._run_js_utils(page, script)
+
+        if delta["reset"]:
+            self._incremental_tag_to_xpath = {}
+        for key in delta["removed"]:
+            self._incremental_tag_to_xpath.pop(int(key), None)
+        self._incremental_tag_to_xpath.update({int(key): value for key, value in delta["changed"].items()})
 
-        await browser.run_js(script)
+        return dict(self._incremental_tag_to_xpath)
+
+    async def _remove_tags(self, page: PageAsync) -> None:
+        await self._run_js_utils(page, "window.removeTags()")
 
     async def remove_tags(self, browser: PlaywrightAsync) -> None:
 
-        await self._remove_tags(browser)
+        await self._remove_tags(browser.page)
 
         self.page = None
 
     # Function to encode the image
-    def encode_image(self, input_image: Image, height=2048):
-
-        # Get the width and height of the image
-        width, img_height = input_image.size
-
-        # Calculate the number of segments
-        num_segments = (img_height + height - 1) // height
-        image_resp = []
-
-        # Split the image into segments
-        for i in range(num_segments if num_segments < 10 else 10):
-            # Calculate the box for cropping
-            top = i * height
-            bottom = min((i + 1) * height, img_height)
-            box = (0, top, width, bottom)
-
-            # Crop the image
-            segment = input_image.crop(box)
-            buffered = io.BytesIO()
-            segment.save(buffered, format="PNG")
-            image_resp.append({
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64.b64encode(buffered.getvalue()).decode('utf-8')}"
-                }})
-
-        return image_resp
+    async def encode_image(self, image: bytes) -> list[ImageContent]:
+        with self.metrics.span("encode"):
+            return await self.segment_encoder.encode(image)
 
     # Path to your image
     # image_path = "../test-images/screenshot_20240909_173326.png"
@@ -157,56 +285,178 @@ class WebWeaver(IWebWeaver):
         """
         Use to read the current state of the page
         """
+        # Always observed: the DOM digest alone misses changes made through styles and media, so whether the page
+        # changed is decided on the full fingerprint and only the re-upload to the model is skipped
+        dom_digest = await self._run_js_utils(self.page, "window.getDomDigest()")
         image, inner_tag_to_xpath = await self.page_to_image(self.page)
         ic(type(inner_tag_to_xpath))
         ic(type(image))
-        self.tag_to_xpath.clear()
-        self.tag_to_xpath.update(inner_tag_to_xpath)
-        image_buffer = io.BytesIO(image)
-        return self.encode_image(Image.open(image_buffer))
+        with self.metrics.span("encode"):
+            images, segment_hashes = await self.segment_encoder.encode_with_hashes(image)
 
-    async def go_to_page(self, url: str) -> [Image]:
-        await self.page.goto(url)
+        fingerprint = PageFingerprint(
+            dom_digest=dom_digest,
+            segment_hashes=segment_hashes,
+            tag_digest=tag_digest(inner_tag_to_xpath),
+        )
+        self.page_changed = not fingerprint.matches(self.page_fingerprint)
+        self.metrics.increment("observations_total", result="changed" if self.page_changed else "unchanged")
+        self.page_fingerprint = fingerprint
+        self._observation = images
+        return list(images)
+
+    async def go_to_page(self, url: str) -> list[ImageContent]:
+        await self._go_to(url)
         return await self.read_page()
 
+    async def _go_to(self, url: str) -> None:
+        self.readiness.track(self.page)
+        await self.page.goto(url)
+        await self.readiness.wait_for_settle(self.page)
 
-    async def click(self, element_id: int) -> str:
+
+    async def _resolve_element(self, element_id: int) -> ElementHandle:
         """
-        Click on an element based on element_id and return the new page state
+        Resolves a tag id to the element it was attached to through the registry kept by the tagging script,
+        falling back to the element's xpath when the registry no longer has it.
         """
-        # ic(element_id)
-        # ic(type(element_id))
+        prepared = self._prepared_elements.pop(element_id, None)
+        if prepared is not None:
+            return prepared
+
+        start_time = time.perf_counter()
+        handle = await self.page.evaluate_handle(
+            f"window.getTaggedElement ? window.getTaggedElement({int(element_id)}) : null"
+        )
+        element = handle.as_element()
+        if element is not None:
+            self.metrics.observe("element_resolution", time.perf_counter() - start_time, method="handle")
+            return element
+        await handle.dispose()
+
         x_path = self.tag_to_xpath[element_id]
         ic(x_path)
-        element = self.page.locator(x_path)
+        element = await self.page.locator(x_path).element_handle()
+        self.metrics.observe("element_resolution", time.perf_counter() - start_time, method="xpath")
+        return element
+
+    async def click(self, element_id: int) -> str:
+        """
+        Click on an element based on element_id and return the new page state
+        """
+        await self._click(element_id)
+        return await self.read_page()
+
+    async def _click(self, element_id: int) -> None:
+        element = await self._resolve_element(element_id)
+        self.readiness.track(self.page)
         await element.scroll_into_view_if_needed()
-        await self.page.wait_for_timeout(1000)
+        await self.readiness.wait_for_element_stable(element)
         await element.click()
-        await self.page.wait_for_timeout(2000)
-        return await self.read_page_impl()
+        await self.readiness.wait_for_settle(self.page)
 
     async def type_text(self, text: str, element_id: int ) -> str:
         """
         Input text into a textbox based on element_id and return the new page state
         """
-        x_path = self.tag_to_xpath[element_id]
-        await self.page.locator(x_path).press_sequentially(text)
-        return await self.read_page_impl()
+        element = await self._resolve_element(element_id)
+        await self._press_sequentially(element, text)
+        return await self.read_page()
+
+    async def _press_sequentially(self, element: ElementHandle, text: str) -> None:
+        # Locator.press_sequentially for a resolved handle, which only has the deprecated type: focus, then type
+        # key by key on the page's keyboard
+        await element.focus()
+        await self.page.keyboard.type(text)
 
     async def press_key(self, key: str) -> str:
         """
         Press a key on the keyboard and return the new page state
         """
+        self.readiness.track(self.page)
         await self.page.keyboard.press(key)
-        await self.page.wait_for_timeout(2000)
-        return await self.read_page_impl()
+        await self.readiness.wait_for_settle(self.page)
+        return await self.read_page()
+
+    async def _prepare_action(self, action: str, action_input: Any) -> None:
+        """
+        Does the browser side work of an action that does not change anything yet: finding and scrolling to the
+        elements it targets. Navigations are not started early, the streamed fields may not be the final ones and
+        a page that was left can't be restored.
+        """
+        if action == "click":
+            element_ids = [action_input]
+        elif action == "type_text":
+            items = action_input if isinstance(action_input[0], list) else [action_input]
+            element_ids = [item[1] for item in items]
+        else:
+            return
+
+        for element_id in element_ids:
+            element = await self._resolve_element(int(element_id))
+            await element.scroll_into_view_if_needed()
+            self._prepared_elements[int(element_id)] = element
+
+    @staticmethod
+    def _response_actions(resp_json: Dict[str, Any]) -> list[Action]:
+        action = resp_json["action"]
+        if action == "click":
+            ic("Clicking")
+            return [ClickAction(element_id=resp_json.get("action_input", 0))]
+        if action == "type_text":
+            ic("Typing")
+            action_inputs = resp_json.get("action_input", ["0", "0"])
+            items = action_inputs if isinstance(action_inputs[0], list) else [action_inputs]
+            return [InputTextAction(element_id=item[1], text=item[0]) for item in items]
+        if action == "go_to_url":
+            ic("Going to URL")
+            return [GotoUrlAction(url=resp_json.get("action_input", "https://google.com"))]
+        return []
+
+    async def _stream_response(self, payload: Dict[str, Any]) -> Tuple[str, Dict[str, Any] | None]:
+        """
+        Streams the model response and starts preparing its action as soon as `action` and `action_input` are
+        complete. Returns the full response text and the parsed object, if the response contained one.
+        """
+        self._prepared_elements.clear()
+        parser = IncrementalJSONParser()
+        preparation: asyncio.Task | None = None
+        prepared_for: Tuple[Any, Any] | None = None
+
+        try:
+            async for chunk in self.chat_client.stream(payload):
+                parser.feed(chunk)
+                if preparation is None and "action" in parser.fields and "action_input" in parser.fields:
+                    prepared_for = parser.fields["action"], parser.fields["action_input"]
+                    preparation = asyncio.create_task(self._prepare_action(*prepared_for))
+        except BaseException:
+            if preparation is not None:
+                preparation.cancel()
+                await asyncio.gather(preparation, return_exceptions=True)
+            raise
+
+        if preparation is not None:
+            try:
+                await preparation
+            except Exception as e:
+                # Preparing is only a head start, the action itself reports the real error
+                ic(f'Preparing the action failed : {e}')
+                self._prepared_elements.clear()
+
+        resp_json = parser.result()
+        final = (resp_json.get("action"), resp_json.get("action_input")) if resp_json is not None else None
+        if prepared_for is not None and prepared_for != final:
+            # The streamed fields were not the ones of the final object, so what was prepared does not apply
+            ic('Prepared action does not match the response, dropping it')
+            self._prepared_elements.clear()
+        return parser.text, resp_json
 
     async def _main(self):
 
         # with open("config.json", "r") as f:
         #     google_cloud_credentials = json.load(f)
 
-        tasks_history = []
+        tasks_history = TaskHistory(token_budget=self.history_token_budget, keep_last=self.history_keep_last)
 
         question = '''
     biography:
@@ -223,20 +473,45 @@ class WebWeaver(IWebWeaver):
 
         ic(type(self.page))
 
-        screenshot, tag_to_xpath = await self.page_to_image(self.page)
-
-        screenshot_buffer = io.BytesIO(screenshot)
-        images = self.encode_image(Image.open(screenshot_buffer))
+        images = await self.read_page()
+        images_skipped = False
         notDone = True
 
+        trace = ActionTrace(start_url=site_name, task_template=question)
+        if self.trace_store is not None:
+            recorded = await self.trace_store.load(site_name, question)
+            if recorded is not None:
+                # The recorded steps run without the model until the page differs from the one they were recorded on
+                replay = await TraceReplayer(self).replay(recorded)
+                for step in replay.steps:
+                    tasks_history.append(step.response)
+                trace.steps.extend(replay.steps)
+                images = list(self._observation)
+                if replay.completed:
+                    ic("Replayed the recorded trace", recorded.final_answer)
+                    return recorded.final_answer
+
+        if self.stream_responses:
+            # The action comes first so the browser can get ready for it while the model writes its thought
+            response_format = '''{
+        "question": "the input question you must answer"
+        "action": "the action to take, should be one of [read_page, click, type_text]"
+        "action_input": "the input to the action"
+        "thought": "explain why you chose this action"
+        }'''
+        else:
+            response_format = '''{
+        "question": "the input question you must answer"
+        "thought": "you should always think about what to do"
+        "action": "the action to take, should be one of [read_page, click, type_text]"
+        "action_input": "the input to the action"
+        }'''
+
         while notDone:
 
             ic("len(images)", len(images))
-
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
+            rendered_history = tasks_history.render()
+            ic("history tokens saved", tasks_history.reports[-1].saved_tokens)
 
             template = f"""
         You are a web interaction agent. Use the read page tool to understand where you currently are. The current page and its contents are provided you are starting with the site {site_name}
@@ -252,16 +527,12 @@ class WebWeaver(IWebWeaver):
         read_page: Use to read the current state of the page
         click: Click on an element based on element_id and return the new page state takes in "tag_id"
         type_text: Input text into a textbox based on element_id and return the new page state. Takes in list of ["input_text", tag_id:int]
+        fill every field of a form you can see in a single type_text, e.g. [["Jane", 3], ["jane@example.com", 5]]
     
     
         Use the following json format:
     
-        {{
-        "question": "the input question you must answer"
-        "thought": "you should always think about what to do"
-        "action": "the action to take, should be one of [read_page, click, type_text]"
-        "action_input": "the input to the action"
-        }}
+        {response_format}
         ... (this Thought/Action/Action_Input/Observation can repeat N times)
     
         if you've reached the end of the task, you can provide the final answer in the following format:
@@ -271,7 +542,7 @@ class WebWeaver(IWebWeaver):
     
         These were previous tasks you completed:
     
-        {tasks_history}
+        {rendered_history}
     
         Begin!
     
@@ -296,42 +567,51 @@ class WebWeaver(IWebWeaver):
             # resp[0]
             #
             ic(payload)
-            payload["messages"][0]["content"].extend(images)
-            response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
+            # Images are only left out once in a row so the model never loses sight of the tag ids for long
+            if self.skip_unchanged_pages and not self.page_changed and not images_skipped:
+                payload["messages"][0]["content"].append({"type": "text", "text": self._UNCHANGED_PAGE_NOTE})
+                images_skipped = True
+            else:
+                payload["messages"][0]["content"].extend(images)
+                images_skipped = False
+            response_json = None
             try:
-                resp = response.json()["choices"][0]["message"]["content"]
-                pattern = regex.compile(r'\{(?:[^{}]|(?R))*\}')
-                resp_content = pattern.findall(resp)
-                resp_json = json.loads(resp_content[0])
+                with self.metrics.span("llm_request", streamed=self.stream_responses):
+                    if self.stream_responses:
+                        resp, resp_json = await self._stream_response(payload)
+                    else:
+                        response_json = await self.chat_client.complete(payload)
+                        resp = response_json["choices"][0]["message"]["content"]
+                        resp_json = None
+                if resp_json is None:
+                    resp_json = extract_json(resp)
                 ic(resp_json)
 
                 if "final_answer" in resp:
                     notDone = False
+                    if self.trace_store is not None:
+                        trace.final_answer = resp_json.get("final_answer") if resp_json else None
+                        await self.trace_store.save(trace)
                 else:
                     tasks_history.append(resp_json)
 
-                if resp_json["action"] == "read_page":
-                    ic("Reading Page")
-                    await self.read_page()
-                elif resp_json["action"] == "click":
-                    ic("Clicking")
-                    action_inputs = resp_json.get("action_input", 0)
-                    await self.click(int(action_inputs))
-                elif resp_json["action"] == "type_text":
-                    ic("Typing")
-                    if isinstance(resp_json["action_input"][0], list):
-                        for action_input in resp_json["action_input"]:
-                            ic(action_input)
-                            await self.type_text(action_input[0], action_input[1])
+                with self.metrics.span("action", action=str(resp_json.get("action"))):
+                    if resp_json["action"] == "read_page":
+                        ic("Reading Page")
+                        images = await self.read_page()
                     else:
-                        action_inputs = resp_json.get("action_input", ["0", "0"])
-                        await self.type_text(action_inputs[0], action_inputs[1])
-                elif resp_json["action"] == "go_to_url":
-                    ic("Going to URL")
-                    action_inputs = resp_json.get("action_input", "https://google.com")
-                    await self.go_to_page(action_inputs)
+                        actions = self._response_actions(resp_json)
+                        if actions:
+                            # Recorded against the page the model chose them on, before they change it
+                            page_fingerprint, tag_to_xpath = self.page_fingerprint, dict(self.tag_to_xpath)
+                            # Every field of a type_text is filled in one call to the page and observed once
+                            results, images = await self.action_executor.execute(actions)
+                            failed = [result for result in results if not result.success]
+                            ic([(result.action.element_id, result.error) for result in failed])
+                            if not failed:
+                                trace.record(resp_json, actions, page_fingerprint, tag_to_xpath)
 
             except Exception as e:
-                ic(response.json())
+                ic(response_json)
                 ic(f'Exception Reason : {e}')
                 notDone = False
@@ -11,6 +11,7 @@ LOG = structlog.get_logger()
 
 class ActionType(StrEnum):
     CLICK = "click"
+    GOTO_URL = "goto_url"
     INPUT_TEXT = "input_text"
     UPLOAD_FILE = "upload_file"
 
@@ -57,6 +58,7 @@ class Action(BaseModel):
     text: str | None = None
     option: SelectOption | None = None
     is_checked: bool | None = None
+    url: str | None = None
 
 
 class WebAction(Action):
@@ -95,6 +97,14 @@ class UploadFileAction(WebAction):
 
 
 
+class GotoUrlAction(Action):
+    action_type: ActionType = ActionType.GOTO_URL
+    url: str
+
+    def __repr__(self) -> str:
+        return f"GotoUrlAction(url={self.url})"
+
+
 class NullAction(Action):
     action_type: ActionType = ActionType.NULL_ACTION
 
@@ -166,6 +176,13 @@ def parse_action(action: Dict[str, Any]) -> Action:
             download=action.get("download", False),
         )
 
+    if action_type == ActionType.GOTO_URL:
+        return GotoUrlAction(
+            url=action["url"],
+            reasoning=reasoning,
+            confidence_float=confidence_float,
+        )
+
     if action_type == ActionType.INPUT_TEXT:
         return InputTextAction(
             element_id=element_id,
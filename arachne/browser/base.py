@@ -4,6 +4,8 @@ from typing import Any, TypedDict, Union
 from playwright.async_api import Page as PageAsync
 from playwright.sync_api import Page as PageSync
 
+from arachne.browser.manager import ScreenshotOptions, ViewPortSize
+
 AnyDriver = Union[PageSync, PageAsync]
 
 
@@ -16,7 +18,7 @@ class BrowserAdapter(ABC):
         pass
 
     @abstractmethod
-    async def take_screenshot(self) -> bytes:
+    async def take_screenshot(self, options: ScreenshotOptions | None = None) -> bytes:
         pass
 
     @abstractmethod
@@ -1,7 +1,14 @@
+import asyncio
+import io
+import random
 from datetime import datetime
+from enum import StrEnum
+from pathlib import Path
 from typing import Any, TypedDict
 
+from PIL import Image
 from playwright.async_api import Page as PageAsync
+from pydantic import BaseModel, Field
 
 
 class ViewPortSize(TypedDict):
@@ -10,23 +17,92 @@ class ViewPortSize(TypedDict):
     content_height: int
 
 
+class ScreenshotFormat(StrEnum):
+    PNG = "png"
+    JPEG = "jpeg"
+    WEBP = "webp"
+
+
+class ScreenshotOptions(BaseModel):
+    image_format: ScreenshotFormat = ScreenshotFormat.PNG
+    quality: int | None = Field(
+        default=None,
+        ge=1,
+        le=100,
+        description="Encoding quality for jpeg and webp screenshots. Ignored for png.",
+    )
+    full_page: bool = True
+    omit_background: bool = False
+    debug_dir: str | None = Field(
+        default=None,
+        description="Directory to write sampled screenshots to. Screenshots stay in memory when unset.",
+    )
+    debug_sample_rate: float = Field(
+        default=1.0,
+        ge=0,
+        le=1,
+        description="Fraction of screenshots written to debug_dir.",
+    )
+
+
+# Keeps background writes alive until they finish
+_pending_writes: set[asyncio.Task] = set()
+
+
+def _write_screenshot(path: Path, screenshot: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(screenshot)
+
+
+def _convert_to_webp(screenshot: bytes, quality: int | None) -> bytes:
+    buffered = io.BytesIO()
+    Image.open(io.BytesIO(screenshot)).save(buffered, format="WEBP", quality=quality or 80)
+    return buffered.getvalue()
+
+
 class PlaywrightAsync:
     STRIP_RETURN = "return window."
 
     def __init__(self, page: PageAsync):
         self._page = page
 
+    @property
+    def page(self) -> PageAsync:
+        return self._page
+
     async def run_js(self, js: str) -> Any:
         if js.startswith(self.STRIP_RETURN):
             js = js[len(self.STRIP_RETURN):]
 
-        print(type(self._page))
-
         return await self._page.evaluate(js)
 
-    async def take_screenshot(self) -> bytes:
-        return await self._page.screenshot(path=f"debug-ss/{datetime.now()}.png", type="png", full_page=True,
-                                           omit_background=True)
+    async def take_screenshot(self, options: ScreenshotOptions | None = None) -> bytes:
+        options = options or ScreenshotOptions()
+
+        if options.image_format == ScreenshotFormat.JPEG:
+            screenshot = await self._page.screenshot(
+                type="jpeg",
+                quality=options.quality,
+                full_page=options.full_page,
+                omit_background=options.omit_background,
+            )
+        else:
+            # Chromium can only encode png and jpeg, webp is converted from a lossless capture
+            screenshot = await self._page.screenshot(
+                type="png",
+                full_page=options.full_page,
+                omit_background=options.omit_background,
+            )
+            if options.image_format == ScreenshotFormat.WEBP:
+                screenshot = await asyncio.to_thread(_convert_to_webp, screenshot, options.quality)
+
+        if options.debug_dir and random.random() < options.debug_sample_rate:
+            path = Path(options.debug_dir) / f"{datetime.now()}.{options.image_format}"
+            task = asyncio.create_task(asyncio.to_thread(_write_screenshot, path, screenshot))
+            _pending_writes.add(task)
+            task.add_done_callback(_pending_writes.discard)
+
+        return screenshot
 
     async def set_viewport_size(self, width: int, height: int) -> None:
         await self._page.set_viewport_size({"width": width, "height": height})
@@ -0,0 +1,304 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+import structlog
+from playwright.async_api import BrowserContext, Playwright, Request, async_playwright
+from pydantic import BaseModel
+
+from arachne.browser.state import BrowserArtifacts, BrowserCleanupFunc, BrowserContextFactory
+from arachne.exceptions import BrowserContextPoolClosed, BrowserContextPoolExhausted, InvalidBrowserContext
+
+log = structlog.get_logger()
+
+
+@dataclass
+class PooledBrowserContext:
+    browser_context: BrowserContext
+    browser_artifacts: BrowserArtifacts
+    browser_cleanup: BrowserCleanupFunc = None
+    created_at: float = field(default_factory=time.monotonic)
+    uses: int = 0
+    # Origins of every document loaded since the last reset, pages and frames alike, whose storage must be cleared
+    origins: set[str] = field(default_factory=set)
+
+
+class BrowserContextPoolMetrics(BaseModel):
+    size: int
+    idle: int
+    leased: int
+    created: int
+    discarded: int
+    lease_hits: int
+    lease_misses: int
+    lease_timeouts: int
+    lease_wait_seconds_total: float
+    reset_failures: int
+
+
+class BrowserContextPool:
+    """
+    Keeps a number of launched browser contexts warm and leases them to tasks.
+
+    A leased context is handed back with `release`. Released contexts are reset (extra pages closed, cookies and
+    site storage cleared, remaining page sent to about:blank) and re-validated before they are leased again. Site
+    storage is cleared for every origin a document was loaded from during the lease, including the ones navigated
+    away from and the ones of frames. Contexts that fail the reset, fail validation, loaded documents from more
+    than `max_reset_origins` origins or have been used `max_uses` times are closed and replaced.
+    """
+
+    def __init__(
+            self,
+            playwright: Playwright | None = None,
+            min_size: int = 2,
+            max_size: int = 4,
+            max_uses: int = 50,
+            lease_timeout: float = 120.0,
+            max_reset_origins: int = 100,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size bounds min_size={min_size} max_size={max_size}")
+
+        self.pw = playwright
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.lease_timeout = lease_timeout
+        self.max_reset_origins = max_reset_origins
+
+        self._owns_playwright = playwright is None
+        self._idle: deque[PooledBrowserContext] = deque()
+        self._leased: set[int] = set()
+        self._size = 0
+        self._closed = False
+        self._condition = asyncio.Condition()
+        self._background_tasks: set[asyncio.Task] = set()
+
+        self._created = 0
+        self._discarded = 0
+        self._lease_hits = 0
+        self._lease_misses = 0
+        self._lease_timeouts = 0
+        self._lease_wait_seconds_total = 0.0
+        self._reset_failures = 0
+
+    async def start(self) -> None:
+        if self.pw is None:
+            log.info("Starting playwright for browser context pool")
+            self.pw = await async_playwright().start()
+        await self._fill_to_min_size()
+        log.info("Browser context pool is warm", **self.metrics().model_dump())
+
+    async def lease(self, timeout: float | None = None) -> PooledBrowserContext:
+        timeout = self.lease_timeout if timeout is None else timeout
+        start_time = time.monotonic()
+        deadline = start_time + timeout
+        should_create = False
+
+        async with self._condition:
+            while True:
+                if self._closed:
+                    raise BrowserContextPoolClosed()
+                if self._idle:
+                    pooled = self._idle.popleft()
+                    self._lease_hits += 1
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._lease_misses += 1
+                    should_create = True
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._lease_timeouts += 1
+                    raise BrowserContextPoolExhausted(max_size=self.max_size, timeout=timeout)
+                try:
+                    await asyncio.wait_for(self._condition.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+        if should_create:
+            pooled = await self._create_reserved()
+
+        pooled.uses += 1
+        self._leased.add(id(pooled))
+        self._lease_wait_seconds_total += time.monotonic() - start_time
+        return pooled
+
+    async def release(self, pooled: PooledBrowserContext, discard: bool = False) -> None:
+        if id(pooled) not in self._leased:
+            log.warning("Releasing a browser context that is not leased from this pool")
+            return
+        self._leased.discard(id(pooled))
+
+        if discard or self._closed or pooled.uses >= self.max_uses or not await self._reset(pooled):
+            await self._discard(pooled)
+            self._spawn(self._replenish())
+            return
+
+        async with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    @asynccontextmanager
+    async def leased(self, timeout: float | None = None) -> AsyncIterator[PooledBrowserContext]:
+        pooled = await self.lease(timeout=timeout)
+        discard = False
+        try:
+            yield pooled
+        except BaseException:
+            discard = True
+            raise
+        finally:
+            await self.release(pooled, discard=discard)
+
+    async def close(self) -> None:
+        log.info("Closing browser context pool")
+        async with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._condition.notify_all()
+
+        for task in list(self._background_tasks):
+            task.cancel()
+        for pooled in idle:
+            await self._discard(pooled)
+
+        if self.pw is not None and self._owns_playwright:
+            await self.pw.stop()
+            self.pw = None
+        log.info("Browser context pool is closed", **self.metrics().model_dump())
+
+    def metrics(self) -> BrowserContextPoolMetrics:
+        return BrowserContextPoolMetrics(
+            size=self._size,
+            idle=len(self._idle),
+            leased=len(self._leased),
+            created=self._created,
+            discarded=self._discarded,
+            lease_hits=self._lease_hits,
+            lease_misses=self._lease_misses,
+            lease_timeouts=self._lease_timeouts,
+            lease_wait_seconds_total=self._lease_wait_seconds_total,
+            reset_failures=self._reset_failures,
+        )
+
+    async def _fill_to_min_size(self) -> None:
+        while True:
+            async with self._condition:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            pooled = await self._create_reserved()
+            async with self._condition:
+                self._idle.append(pooled)
+                self._condition.notify()
+
+    async def _replenish(self) -> None:
+        try:
+            await self._fill_to_min_size()
+        except Exception:
+            log.warning("Failed to replenish browser context pool", exc_info=True)
+
+    async def _create_reserved(self) -> PooledBrowserContext:
+        """Creates a context for a slot that has already been counted in `_size`."""
+        try:
+            if self.pw is None:
+                raise BrowserContextPoolClosed()
+            browser_context, browser_artifacts, browser_cleanup = await BrowserContextFactory.create_browser_context(
+                self.pw
+            )
+            pooled = PooledBrowserContext(
+                browser_context=browser_context,
+                browser_artifacts=browser_artifacts,
+                browser_cleanup=browser_cleanup,
+            )
+            browser_context.on("request", lambda request: self._record_origin(pooled, request))
+            if not await BrowserContextFactory.validate_browser_context(await self._blank_page(pooled)):
+                await self._close(pooled)
+                raise InvalidBrowserContext()
+        except BaseException:
+            async with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        self._created += 1
+        return pooled
+
+    async def _reset(self, pooled: PooledBrowserContext) -> bool:
+        browser_context = pooled.browser_context
+        try:
+            origins = pooled.origins | {_origin(page.url) for page in browser_context.pages}
+            origins.discard(None)
+            pooled.origins = set()
+            if len(origins) > self.max_reset_origins:
+                log.info("Recycling pooled browser context, too many origins to clear", origins=len(origins))
+                return False
+            page = await self._blank_page(pooled)
+            await browser_context.clear_cookies()
+            await browser_context.clear_permissions()
+            if origins:
+                cdp_session = await browser_context.new_cdp_session(page)
+                try:
+                    for origin in origins:
+                        await cdp_session.send("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+                finally:
+                    await cdp_session.detach()
+            return await BrowserContextFactory.validate_browser_context(page)
+        except Exception:
+            self._reset_failures += 1
+            log.warning("Failed to reset pooled browser context", exc_info=True)
+            return False
+
+    @staticmethod
+    def _record_origin(pooled: PooledBrowserContext, request: Request) -> None:
+        # Only documents can store data for their origin, the workers they start share it
+        if request.resource_type == "document":
+            origin = _origin(request.url)
+            if origin is not None:
+                pooled.origins.add(origin)
+
+    @staticmethod
+    async def _blank_page(pooled: PooledBrowserContext):
+        browser_context = pooled.browser_context
+        pages = browser_context.pages
+        page = pages[0] if pages else await browser_context.new_page()
+        for other_page in pages[1:]:
+            await other_page.close()
+        if page.url != "about:blank":
+            await page.goto("about:blank")
+        return page
+
+    async def _discard(self, pooled: PooledBrowserContext) -> None:
+        await self._close(pooled)
+        self._discarded += 1
+        async with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    @staticmethod
+    async def _close(pooled: PooledBrowserContext) -> None:
+        try:
+            await pooled.browser_context.close()
+        except Exception:
+            log.warning("Failed to close pooled browser context", exc_info=True)
+        if pooled.browser_cleanup is not None:
+            pooled.browser_cleanup()
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+
+def _origin(url: str) -> str | None:
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        return None
+    return f"{parts.scheme}://{parts.netloc}"
@@ -0,0 +1,228 @@
+import asyncio
+import time
+import weakref
+from collections import deque
+from enum import StrEnum
+
+import structlog
+from playwright.async_api import ElementHandle, Error, Page, Request
+from pydantic import BaseModel
+
+from arachne.metrics import Metrics, metrics as shared_metrics
+
+log = structlog.get_logger()
+
+# Resolves once no DOM mutation happened for `quietMs`, or with quiet=false after `timeoutMs`.
+# Inline style changes are ignored so that running animations do not keep the page from settling.
+_DOM_QUIET_JS = """
+([quietMs, timeoutMs]) => new Promise((resolve) => {
+  const start = performance.now();
+  let quietTimer = null;
+  let deadlineTimer = null;
+  const observer = new MutationObserver((mutations) => {
+    if (mutations.every((m) => m.type === "attributes" && m.attributeName === "style")) {
+      return;
+    }
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(() => finish(true), quietMs);
+  });
+  const finish = (quiet) => {
+    observer.disconnect();
+    clearTimeout(quietTimer);
+    clearTimeout(deadlineTimer);
+    resolve({ quiet, elapsed: performance.now() - start });
+  };
+  observer.observe(document, { childList: true, subtree: true, attributes: true, characterData: true });
+  quietTimer = setTimeout(() => finish(true), quietMs);
+  deadlineTimer = setTimeout(() => finish(false), timeoutMs);
+})
+"""
+
+# Resolves once the element's bounding box stayed the same for `frames` consecutive animation frames
+_ELEMENT_STABLE_JS = """
+(el, [frames, timeoutMs]) => new Promise((resolve) => {
+  const start = performance.now();
+  let last = null;
+  let same = 0;
+  const step = () => {
+    const elapsed = performance.now() - start;
+    if (!el.isConnected) {
+      return resolve({ stable: false, elapsed });
+    }
+    const r = el.getBoundingClientRect();
+    const key = `${r.x},${r.y},${r.width},${r.height}`;
+    same = key === last ? same + 1 : 0;
+    last = key;
+    if (same >= frames) {
+      return resolve({ stable: true, elapsed });
+    }
+    if (elapsed > timeoutMs) {
+      return resolve({ stable: false, elapsed });
+    }
+    requestAnimationFrame(step);
+  };
+  requestAnimationFrame(step);
+})
+"""
+
+
+class ReadinessSignal(StrEnum):
+    settled = "settled"
+    element_stable = "element_stable"
+    timeout = "timeout"
+
+
+class ReadinessConfig(BaseModel):
+    # Upper bound for a single wait, the old fixed sleeps were 1 to 5 seconds
+    timeout_ms: int = 5000
+    # How long the DOM has to go without mutations to be considered quiet
+    dom_quiet_ms: int = 150
+    # How long there must be no request in flight to be considered network idle
+    network_quiet_ms: int = 250
+    # Requests in flight for longer than this (long polling, streaming) do not keep the network busy
+    network_ignore_after_ms: int = 2000
+    # Consecutive animation frames an element's box has to stay the same
+    stable_frames: int = 2
+    poll_interval_ms: int = 25
+
+
+class ReadinessResult(BaseModel):
+    signal: ReadinessSignal
+    elapsed_ms: float
+    dom_quiet_ms: float | None = None
+    network_idle_ms: float | None = None
+    timed_out: bool = False
+
+
+class NetworkTracker:
+    """Keeps track of the requests a page has in flight, from the page's request events."""
+
+    def __init__(self, page: Page):
+        self._in_flight: dict[Request, float] = {}
+        self._last_activity = time.monotonic()
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+
+    def _on_request(self, request: Request) -> None:
+        now = time.monotonic()
+        self._in_flight[request] = now
+        self._last_activity = now
+
+    def _on_request_done(self, request: Request) -> None:
+        self._in_flight.pop(request, None)
+        self._last_activity = time.monotonic()
+
+    def idle_for(self, ignore_after: float) -> float:
+        """Seconds since the network last became idle, or 0 when a recent request is still in flight."""
+        now = time.monotonic()
+        if any(now - started < ignore_after for started in self._in_flight.values()):
+            return 0.0
+        return now - self._last_activity
+
+    async def wait_for_idle(self, quiet: float, ignore_after: float, poll_interval: float) -> None:
+        while self.idle_for(ignore_after) < quiet:
+            await asyncio.sleep(poll_interval)
+
+
+class PageReadiness:
+    """
+    Waits for a page to be ready instead of sleeping for a fixed time.
+
+    `wait_for_settle` returns once the DOM stopped mutating and no request is in flight, which is usually within a
+    few hundred milliseconds of an action. `wait_for_element_stable` returns once an element stopped moving, which
+    is all a click needs. Every wait is capped by `ReadinessConfig.timeout_ms` and its timings are kept in `history`.
+    Call `track` before the action so the requests it starts are seen.
+    """
+
+    def __init__(
+            self,
+            config: ReadinessConfig | None = None,
+            history_size: int = 256,
+            metrics: Metrics | None = None,
+    ):
+        self.config = config or ReadinessConfig()
+        self.metrics = metrics or shared_metrics
+        self.history: deque[ReadinessResult] = deque(maxlen=history_size)
+        self._trackers: weakref.WeakKeyDictionary[Page, NetworkTracker] = weakref.WeakKeyDictionary()
+
+    def track(self, page: Page) -> NetworkTracker:
+        tracker = self._trackers.get(page)
+        if tracker is None:
+            tracker = NetworkTracker(page)
+            self._trackers[page] = tracker
+        return tracker
+
+    async def wait_for_settle(self, page: Page, timeout_ms: int | None = None) -> ReadinessResult:
+        config = self.config
+        timeout_ms = config.timeout_ms if timeout_ms is None else timeout_ms
+        tracker = self.track(page)
+        start_time = time.monotonic()
+        deadline = start_time + timeout_ms / 1000
+
+        async def dom_quiet() -> float | None:
+            while True:
+                remaining_ms = max((deadline - time.monotonic()) * 1000, 0)
+                try:
+                    quiet = await page.evaluate(_DOM_QUIET_JS, [config.dom_quiet_ms, remaining_ms])
+                    return (time.monotonic() - start_time) * 1000 if quiet["quiet"] else None
+                except Error:
+                    # The action navigated and destroyed the execution context, wait for the next document
+                    await page.wait_for_load_state("domcontentloaded", timeout=max(remaining_ms, 1))
+
+        async def network_idle() -> float:
+            await tracker.wait_for_idle(
+                config.network_quiet_ms / 1000,
+                config.network_ignore_after_ms / 1000,
+                config.poll_interval_ms / 1000,
+            )
+            return (time.monotonic() - start_time) * 1000
+
+        dom_task = asyncio.create_task(dom_quiet())
+        network_task = asyncio.create_task(network_idle())
+        done, pending = await asyncio.wait(
+            {dom_task, network_task},
+            timeout=max(deadline - time.monotonic(), 0),
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        def finished_at(task: asyncio.Task) -> float | None:
+            return task.result() if task in done and task.exception() is None else None
+
+        dom_quiet_ms = finished_at(dom_task)
+        network_idle_ms = finished_at(network_task)
+        timed_out = dom_quiet_ms is None or network_idle_ms is None
+        result = ReadinessResult(
+            signal=ReadinessSignal.timeout if timed_out else ReadinessSignal.settled,
+            elapsed_ms=(time.monotonic() - start_time) * 1000,
+            dom_quiet_ms=dom_quiet_ms,
+            network_idle_ms=network_idle_ms,
+            timed_out=timed_out,
+        )
+        return self._record(result, url=page.url)
+
+    async def wait_for_element_stable(self, element: ElementHandle, timeout_ms: int | None = None) -> ReadinessResult:
+        timeout_ms = self.config.timeout_ms if timeout_ms is None else timeout_ms
+        start_time = time.monotonic()
+        try:
+            stable = await element.evaluate(_ELEMENT_STABLE_JS, [self.config.stable_frames, timeout_ms])
+        except Error:
+            # The element's document went away, whatever acts on it next reports the real error
+            stable = {"stable": False}
+        result = ReadinessResult(
+            signal=ReadinessSignal.element_stable if stable["stable"] else ReadinessSignal.timeout,
+            elapsed_ms=(time.monotonic() - start_time) * 1000,
+            timed_out=not stable["stable"],
+        )
+        return self._record(result)
+
+    def _record(self, result: ReadinessResult, **kwargs) -> ReadinessResult:
+        self.history.append(result)
+        self.metrics.observe("readiness_wait", result.elapsed_ms / 1000, signal=result.signal)
+        if result.timed_out:
+            log.info("Page did not become ready before the timeout", **result.model_dump(), **kwargs)
+        else:
+            log.debug("Page is ready", **result.model_dump(), **kwargs)
+        return result
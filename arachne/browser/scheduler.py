@@ -0,0 +1,258 @@
+import asyncio
+import heapq
+import itertools
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+import structlog
+
+from arachne.browser.state import SkyvernContext, set_current
+from arachne.browser.task import Task, TaskRequest, TaskStatus
+from arachne.exceptions import TaskNotFound
+
+log = structlog.get_logger()
+
+TaskResult = dict[str, Any] | list | str | None
+TaskRunner = Callable[[Task], Awaitable[TaskResult]]
+
+
+@dataclass(order=True)
+class _QueuedTask:
+    priority: int
+    sequence: int
+    task_id: str = field(compare=False)
+    deadline: float | None = field(default=None, compare=False)
+
+
+class TaskScheduler:
+    """
+    Runs many tasks on one event loop with at most `max_concurrency` of them running at a time.
+
+    Tasks are picked by priority (lower value first, FIFO within the same priority) and moved through
+    `TaskStatus` with `Task.validate_update`. A task with a timeout gets a deadline measured from submission;
+    if it expires while the task is queued or running the task ends as `timed_out` right away, without waiting
+    for a worker to pick it up.
+
+    Only the last `max_finished_tasks` finished tasks are kept for `get_task` and `wait`, pass None to keep them
+    all.
+    """
+
+    def __init__(
+            self,
+            runner: TaskRunner,
+            max_concurrency: int = 4,
+            default_timeout: float | None = None,
+            max_finished_tasks: int | None = 1000,
+    ):
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+
+        self.runner = runner
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+        self.max_finished_tasks = max_finished_tasks
+
+        self._heap: list[_QueuedTask] = []
+        self._sequence = itertools.count()
+        self._available = asyncio.Condition()
+        self._tasks: dict[str, Task] = {}
+        # Set when the task finishes, only unfinished tasks have one
+        self._done: dict[str, asyncio.Event] = {}
+        self._finished: deque[str] = deque()
+        # Expire tasks whose deadline passes while they are queued
+        self._deadline_timers: dict[str, asyncio.TimerHandle] = {}
+        self._running: dict[str, asyncio.Task] = {}
+        self._workers: list[asyncio.Task] = []
+        self._stopping = False
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._stopping = False
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"task-scheduler-worker-{i}")
+            for i in range(self.max_concurrency)
+        ]
+        log.info("Task scheduler started", max_concurrency=self.max_concurrency)
+
+    async def stop(self, cancel_running: bool = False) -> None:
+        async with self._available:
+            self._stopping = True
+            self._available.notify_all()
+        if cancel_running:
+            for task_id in list(self._running):
+                await self.cancel(task_id)
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        log.info("Task scheduler stopped")
+
+    async def submit(
+            self,
+            request: TaskRequest,
+            priority: int = 0,
+            timeout: float | None = None,
+    ) -> Task:
+        now = datetime.now(timezone.utc)
+        task = Task(
+            **request.model_dump(),
+            task_id=str(uuid.uuid4()),
+            status=TaskStatus.created,
+            created_at=now,
+            modified_at=now,
+        )
+        self._tasks[task.task_id] = task
+        self._done[task.task_id] = asyncio.Event()
+
+        timeout = self.default_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+
+        self._update_status(task, TaskStatus.queued)
+        async with self._available:
+            heapq.heappush(
+                self._heap,
+                _QueuedTask(priority=priority, sequence=next(self._sequence), task_id=task.task_id, deadline=deadline),
+            )
+            self._available.notify()
+        if deadline is not None:
+            self._deadline_timers[task.task_id] = loop.call_at(deadline, self._expire_queued, task.task_id)
+        log.info("Task queued", task_id=task.task_id, priority=priority, timeout=timeout)
+        return task
+
+    def get_task(self, task_id: str) -> Task:
+        task = self._tasks.get(task_id)
+        if task is None:
+            raise TaskNotFound(task_id=task_id)
+        return task
+
+    async def wait(self, task_id: str) -> Task:
+        task = self.get_task(task_id)
+        done = self._done.get(task_id)
+        if done is not None:
+            await done.wait()
+        return task
+
+    async def join(self) -> None:
+        await asyncio.gather(*(done.wait() for done in list(self._done.values())))
+
+    async def cancel(self, task_id: str) -> None:
+        task = self.get_task(task_id)
+        if task.status.is_final():
+            return
+        running = self._running.get(task_id)
+        if running is not None:
+            # The worker marks the task canceled once the runner has unwound
+            running.cancel()
+            return
+        self._finish(task, TaskStatus.canceled)
+
+    async def _worker(self) -> None:
+        while True:
+            async with self._available:
+                while not self._heap and not self._stopping:
+                    await self._available.wait()
+                if not self._heap:
+                    return
+                queued = heapq.heappop(self._heap)
+
+            task = self._tasks.get(queued.task_id)
+            if task is None or task.status.is_final():
+                continue
+            self._cancel_deadline_timer(task.task_id)
+            if queued.deadline is not None and asyncio.get_running_loop().time() >= queued.deadline:
+                self._finish(task, TaskStatus.timed_out, failure_reason="Task deadline expired while queued")
+                continue
+
+            self._update_status(task, TaskStatus.running)
+            running = asyncio.create_task(self._run(task, queued.deadline))
+            self._running[task.task_id] = running
+            try:
+                await running
+            except asyncio.CancelledError:
+                if not running.cancelled():
+                    raise
+            except Exception:
+                log.exception("Task scheduler failed to run task", task_id=task.task_id)
+            finally:
+                self._running.pop(task.task_id, None)
+
+    async def _run(self, task: Task, deadline: float | None) -> None:
+        set_current(SkyvernContext(task_id=task.task_id, organization_id=task.organization_id))
+        log.info("Task started", task_id=task.task_id)
+        timeout = asyncio.timeout_at(deadline)
+        try:
+            async with timeout:
+                result = await self.runner(task)
+        except TimeoutError as e:
+            if not timeout.expired():
+                log.exception("Task failed", task_id=task.task_id)
+                self._finish(task, TaskStatus.failed, failure_reason=repr(e))
+                return
+            log.warning("Task timed out", task_id=task.task_id)
+            self._finish(task, TaskStatus.timed_out, failure_reason="Task deadline expired while running")
+        except asyncio.CancelledError:
+            log.info("Task canceled", task_id=task.task_id)
+            self._finish(task, TaskStatus.canceled)
+            raise
+        except Exception as e:
+            log.exception("Task failed", task_id=task.task_id)
+            self._finish(task, TaskStatus.failed, failure_reason=repr(e))
+        else:
+            try:
+                self._finish(task, TaskStatus.completed, extracted_information=result)
+            except ValueError as e:
+                log.warning("Task result was rejected", task_id=task.task_id, reason=str(e))
+                self._finish(task, TaskStatus.failed, failure_reason=str(e))
+
+    def _expire_queued(self, task_id: str) -> None:
+        self._deadline_timers.pop(task_id, None)
+        task = self._tasks.get(task_id)
+        if task is not None and task.status == TaskStatus.queued:
+            self._finish(task, TaskStatus.timed_out, failure_reason="Task deadline expired while queued")
+
+    def _cancel_deadline_timer(self, task_id: str) -> None:
+        timer = self._deadline_timers.pop(task_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _finish(
+            self,
+            task: Task,
+            status: TaskStatus,
+            extracted_information: TaskResult = None,
+            failure_reason: str | None = None,
+    ) -> None:
+        try:
+            self._update_status(task, status, extracted_information, failure_reason)
+        finally:
+            self._cancel_deadline_timer(task.task_id)
+            done = self._done.pop(task.task_id, None)
+            if done is not None:
+                done.set()
+                self._evict_finished(task.task_id)
+        log.info("Task finished", task_id=task.task_id, status=task.status)
+
+    def _evict_finished(self, task_id: str) -> None:
+        if self.max_finished_tasks is None:
+            return
+        self._finished.append(task_id)
+        while len(self._finished) > self.max_finished_tasks:
+            self._tasks.pop(self._finished.popleft(), None)
+
+    @staticmethod
+    def _update_status(
+            task: Task,
+            status: TaskStatus,
+            extracted_information: TaskResult = None,
+            failure_reason: str | None = None,
+    ) -> None:
+        task.validate_update(status, extracted_information, failure_reason)
+        task.status = status
+        task.modified_at = datetime.now(timezone.utc)
+        if extracted_information is not None:
+            task.extracted_information = extracted_information
+        if failure_reason is not None:
+            task.failure_reason = failure_reason
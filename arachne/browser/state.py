@@ -1,4 +1,5 @@
 import asyncio
+import shutil
 import tempfile
 import uuid
 from contextvars import ContextVar
@@ -8,12 +9,17 @@ import time
 
 from playwright.async_api import BrowserContext, Error, Page, Playwright, async_playwright
 from pydantic import BaseModel
-from typing import Any, Awaitable, Callable, Protocol
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Protocol
 import structlog
 
+from arachne.browser.readiness import PageReadiness
+from arachne.metrics import metrics
 from arachne.exceptions import UnknownBrowserType, UnknownErrorWhileCreatingBrowserContext, MissingBrowserStatePage, \
     FailedToNavigateToUrl, FailedToStopLoadingPage, FailedToReloadPage
 
+if TYPE_CHECKING:
+    from arachne.browser.pool import BrowserContextPool, PooledBrowserContext
+
 log = structlog.get_logger()
 
 BrowserCleanupFunc = Callable[[], None] | None
@@ -52,6 +58,16 @@ def current() -> SkyvernContext | None:
     return _context.get()
 
 
+def set_current(context: SkyvernContext | None) -> None:
+    """
+    Set the current context
+
+    Args:
+        context: The context to set for the running task
+    """
+    _context.set(context)
+
+
 
 class BrowserArtifacts(BaseModel):
     har_path: str | None = None
@@ -147,13 +163,20 @@ class BrowserContextFactory:
 
 
 
+def _build_user_data_dir_cleanup(user_data_dir: str) -> BrowserCleanupFunc:
+    def cleanup() -> None:
+        shutil.rmtree(user_data_dir, ignore_errors=True)
+
+    return cleanup
+
+
 async def _create_headless_chromium(
     playwright: Playwright, **kwargs: dict
 ) -> tuple[BrowserContext, BrowserArtifacts, BrowserCleanupFunc]:
     browser_args = BrowserContextFactory.build_browser_args()
     browser_artifacts = BrowserContextFactory.build_browser_artifacts(har_path=browser_args["record_har_path"])
     browser_context = await playwright.chromium.launch_persistent_context(**browser_args)
-    return browser_context, browser_artifacts, None
+    return browser_context, browser_artifacts, _build_user_data_dir_cleanup(browser_args["user_data_dir"])
 
 
 async def _create_headful_chromium(
@@ -167,7 +190,7 @@ async def _create_headful_chromium(
     )
     browser_artifacts = BrowserContextFactory.build_browser_artifacts(har_path=browser_args["record_har_path"])
     browser_context = await playwright.chromium.launch_persistent_context(**browser_args)
-    return browser_context, browser_artifacts, None
+    return browser_context, browser_artifacts, _build_user_data_dir_cleanup(browser_args["user_data_dir"])
 
 
 BrowserContextFactory.register_type("chromium-headless", _create_headless_chromium)
@@ -184,12 +207,17 @@ class BrowserState:
             page: Page | None = None,
             browser_artifacts: BrowserArtifacts = BrowserArtifacts(),
             browser_cleanup: BrowserCleanupFunc = None,
+            browser_context_pool: "BrowserContextPool | None" = None,
+            readiness: PageReadiness | None = None,
     ):
         self.__page = browser_context.pages[-1] if page is None and browser_context is not None else page
         self.pw = pw
         self.browser_context = browser_context
         self.browser_artifacts = browser_artifacts
         self.browser_cleanup = browser_cleanup
+        self.browser_context_pool = browser_context_pool
+        self.__pooled_context: "PooledBrowserContext | None" = None
+        self.readiness = readiness or PageReadiness()
 
     # Method to use when printing the object
     def __repr__(self) -> str:
@@ -220,6 +248,14 @@ class BrowserState:
             self,
             url: str | None = None,
     ) -> None:
+        if self.browser_context is None and self.browser_context_pool is not None:
+            log.info("leasing browser context from pool")
+            self.__pooled_context = await self.browser_context_pool.lease()
+            self.pw = self.browser_context_pool.pw
+            self.browser_context = self.__pooled_context.browser_context
+            self.browser_artifacts = self.__pooled_context.browser_artifacts
+            self.browser_cleanup = None
+            log.info("browser context is leased", **self.browser_context_pool.metrics().model_dump())
         if self.pw is None:
             log.info("Starting playwright")
             self.pw = await async_playwright().start()
@@ -253,17 +289,20 @@ class BrowserState:
                     await self._close_all_other_pages()
                     log.info(f"A new page is created {url}")
                     if url:
-                        log.info(f"Navigating page to {url} and waiting for 5 seconds")
+                        log.info(f"Navigating page to {url} and waiting for it to settle")
                         try:
                             start_time = time.time()
+                            self.readiness.track(page)
                             await page.goto(url, timeout=120000)
                             end_time = time.time()
+                            metrics.observe("page_load", end_time - start_time)
+                            readiness = await self.readiness.wait_for_settle(page)
                             log.info(
                                 "Page loading time",
                                 loading_time=end_time - start_time,
+                                settle_time_ms=readiness.elapsed_ms,
                                 url=url,
                             )
-                            await asyncio.sleep(5)
                         except Error as playright_error:
                             log.warning(
                                 f"Error while navigating to url: {str(playright_error)}",
@@ -337,11 +376,21 @@ class BrowserState:
 
     async def close_current_open_page(self) -> None:
         await self._close_all_other_pages()
-        if self.browser_context is not None:
+        if self.__pooled_context is not None:
+            await self._release_pooled_context(discard=True)
+        elif self.browser_context is not None:
             await self.browser_context.close()
         self.browser_context = None
         await self.set_working_page(None)
 
+    async def _release_pooled_context(self, discard: bool = False) -> None:
+        pooled_context = self.__pooled_context
+        if pooled_context is None or self.browser_context_pool is None:
+            return
+        self.__pooled_context = None
+        await self.browser_context_pool.release(pooled_context, discard=discard)
+        log.info("browser context is returned to pool", **self.browser_context_pool.metrics().model_dump())
+
     async def stop_page_loading(self) -> None:
         page = await self.__assert_page()
         try:
@@ -353,22 +402,31 @@ class BrowserState:
     async def reload_page(self) -> None:
         page = await self.__assert_page()
 
-        log.info(f"Reload page {page.url} and waiting for 5 seconds")
+        log.info(f"Reload page {page.url} and waiting for it to settle")
         try:
             start_time = time.time()
+            self.readiness.track(page)
             await page.reload(timeout=120000)
             end_time = time.time()
+            metrics.observe("page_load", end_time - start_time, reload=True)
+            readiness = await self.readiness.wait_for_settle(page)
             log.info(
                 "Page loading time",
                 loading_time=end_time - start_time,
+                settle_time_ms=readiness.elapsed_ms,
             )
-            await asyncio.sleep(5)
         except Exception as e:
             log.exception(f"Error while reload url: {repr(e)}")
             raise FailedToReloadPage(url=page.url, error_message=repr(e))
 
     async def close(self, close_browser_on_completion: bool = True) -> None:
         log.info("Closing browser state")
+        if self.__pooled_context is not None:
+            # Pooled contexts and the playwright instance belong to the pool
+            await self._release_pooled_context()
+            self.browser_context = None
+            await self.set_working_page(None)
+            return
         if self.browser_context and close_browser_on_completion:
             log.info("Closing browser context and its pages")
             await self.browser_context.close()
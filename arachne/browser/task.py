@@ -34,6 +34,12 @@ class TaskRequest(BaseModel):
         examples=[{"name": "John Doe", "email": "john@doe.com", "password": "password", "post_content": "Hello World"}],
     )
 
+    data_extraction_goal: str | None = Field(
+        default=None,
+        description="The information to extract from the page once the task is complete.",
+        examples=["Extract the title of the book I marked as read."],
+    )
+
 
 class TaskStatus(StrEnum):
     created = "created"
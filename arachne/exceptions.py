@@ -49,6 +49,21 @@ class MissingBrowserState(SkyvernException):
         super().__init__(f"Browser state for task {task_id} is missing.")
 
 
+class BrowserContextPoolClosed(SkyvernException):
+    def __init__(self) -> None:
+        super().__init__("Browser context pool is closed")
+
+
+class BrowserContextPoolExhausted(SkyvernException):
+    def __init__(self, max_size: int, timeout: float) -> None:
+        super().__init__(f"No browser context became available within {timeout}s. Pool max size: {max_size}")
+
+
+class InvalidBrowserContext(SkyvernException):
+    def __init__(self) -> None:
+        super().__init__("Browser context failed validation")
+
+
 class MissingBrowserStatePage(SkyvernException):
     def __init__(self, task_id: str | None = None, workflow_run_id: str | None = None):
         task_str = f"task_id={task_id}" if task_id else ""
@@ -71,6 +86,37 @@ class UnsupportedActionType(SkyvernException):
         super().__init__(f"Unsupport action type: {action_type}")
 
 
+class LLMRequestTimeout(SkyvernException):
+    def __init__(self, model_id: str, timeout: float) -> None:
+        super().__init__(f"LLM request to {model_id} did not complete within {timeout}s")
+
+
+class LLMRequestAbandoned(SkyvernException):
+    def __init__(self) -> None:
+        super().__init__("LLM request was abandoned by its caller before this attempt")
+
+
+class LLMCacheMiss(SkyvernException):
+    def __init__(self, key: str) -> None:
+        super().__init__(f"No recorded LLM response for cache key {key} in replay mode")
+
+
+class ChatCompletionFailed(SkyvernException):
+    def __init__(self, status_code: int | None, message: str) -> None:
+        self.status_code = status_code
+        super().__init__(f"Chat completion request failed. Status code: {status_code}. Error message: {message}")
+
+
+class OCRBackendUnavailable(SkyvernException):
+    def __init__(self, backend: str, reason: str) -> None:
+        super().__init__(f"OCR backend {backend} is not available: {reason}")
+
+
+class InvalidPlan(SkyvernException):
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"Invalid plan: {reason}")
+
+
 class SkyvernHTTPException(SkyvernException):
     def __init__(self, message: str | None = None, status_code: int = status.HTTP_400_BAD_REQUEST):
         self.status_code = status_code
@@ -86,4 +132,9 @@ class TaskAlreadyCanceled(SkyvernHTTPException):
 
 class InvalidTaskStatusTransition(SkyvernHTTPException):
     def __init__(self, old_status: str, new_status: str, task_id: str):
-        super().__init__(f"Invalid task status transition from {old_status} to {new_status} for {task_id}")
\ No newline at end of file
+        super().__init__(f"Invalid task status transition from {old_status} to {new_status} for {task_id}")
+
+
+class TaskNotFound(SkyvernHTTPException):
+    def __init__(self, task_id: str):
+        super().__init__(f"Task {task_id} not found", status_code=status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,165 @@
+import json
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+import structlog
+
+from arachne.browser.actions import (
+    Action,
+    ActionType,
+    ClickAction,
+    DecisiveAction,
+    GotoUrlAction,
+)
+from arachne.segments import ImageContent
+
+if TYPE_CHECKING:
+    from arachne.agent import WebWeaver
+
+log = structlog.get_logger()
+
+# Actions that only change form state, so the page can't navigate away while a batch of them is applied
+BATCHABLE_ACTIONS = {ActionType.INPUT_TEXT, ActionType.SELECT_OPTION, ActionType.CHECKBOX}
+
+
+@dataclass
+class ActionResult:
+    action: Action
+    success: bool
+    error: str | None = None
+
+
+class ActionExecutor:
+    """
+    Applies a list of actions to the weaver's page and observes the page once at the end.
+
+    Consecutive form actions (input_text, select_option, checkbox) are applied together in one `applyActions`
+    call to the page; an action the page could not apply is retried on its own through Playwright. Text for a
+    contenteditable element, or for an input that did not keep a value set without key events, is typed key by
+    key. A click or a goto_url may replace the page, so it is the last action run: the actions after it targeted
+    elements of the old page and are reported as not run. Decisive actions (complete, terminate) end the list
+    without running.
+    """
+
+    def __init__(self, weaver: "WebWeaver"):
+        self.weaver = weaver
+
+    async def execute(self, actions: List[Action]) -> Tuple[List[ActionResult], List[ImageContent]]:
+        results: List[ActionResult] = []
+        batch: List[Action] = []
+        stopped_at: int | None = None
+
+        for index, action in enumerate(actions):
+            if action.action_type in BATCHABLE_ACTIONS:
+                batch.append(action)
+                continue
+            results.extend(await self._apply_batch(batch))
+            batch = []
+
+            if isinstance(action, DecisiveAction):
+                stopped_at = index
+                break
+            if action.action_type == ActionType.NULL_ACTION:
+                results.append(ActionResult(action=action, success=True))
+            elif action.action_type == ActionType.WAIT:
+                await self.weaver.readiness.wait_for_settle(self.weaver.page)
+                results.append(ActionResult(action=action, success=True))
+            elif isinstance(action, (ClickAction, GotoUrlAction)):
+                results.append(await self._navigate(action))
+                stopped_at = index + 1
+                break
+            else:
+                results.append(
+                    ActionResult(action=action, success=False, error=f"{action.action_type} is not supported")
+                )
+        results.extend(await self._apply_batch(batch))
+
+        if stopped_at is not None:
+            for action in actions[stopped_at:]:
+                if not isinstance(action, DecisiveAction):
+                    results.append(
+                        ActionResult(action=action, success=False, error="not run, the page may have changed")
+                    )
+
+        observation = await self.weaver.read_page()
+        log.info(
+            "Executed actions",
+            actions=len(actions),
+            succeeded=sum(result.success for result in results),
+            failed=sum(not result.success for result in results),
+        )
+        return results, observation
+
+    async def _apply_batch(self, batch: List[Action]) -> List[ActionResult]:
+        if not batch:
+            return []
+        weaver = self.weaver
+        payload = [self._batch_action(action) for action in batch]
+        weaver.readiness.track(weaver.page)
+        with weaver.metrics.span("action_batch"):
+            applied = await weaver._run_js_utils(weaver.page, f"window.applyActions({json.dumps(payload)})")
+            results = []
+            for action, outcome in zip(batch, applied):
+                if outcome["success"]:
+                    results.append(ActionResult(action=action, success=True))
+                    continue
+                log.debug("Batched action failed, retrying it through playwright", error=outcome.get("error"))
+                if outcome.get("needsTyping"):
+                    results.append(await self._type_text(action))
+                else:
+                    results.append(await self._apply_single(action))
+            await weaver.readiness.wait_for_settle(weaver.page)
+        weaver.metrics.increment("actions_total", len(batch), mode="batched")
+        return results
+
+    async def _apply_single(self, action: Action) -> ActionResult:
+        try:
+            element = await self.weaver._resolve_element(int(action.element_id))
+            if action.action_type == ActionType.INPUT_TEXT:
+                await element.fill(action.text)
+            elif action.action_type == ActionType.SELECT_OPTION:
+                option = action.option
+                if option.value is not None:
+                    await element.select_option(value=option.value)
+                elif option.label is not None:
+                    await element.select_option(label=option.label)
+                else:
+                    await element.select_option(index=option.index)
+            else:
+                await element.set_checked(bool(action.is_checked))
+        except Exception as e:
+            return ActionResult(action=action, success=False, error=f"{type(e).__name__}: {e}")
+        return ActionResult(action=action, success=True)
+
+    async def _type_text(self, action: Action) -> ActionResult:
+        try:
+            element = await self.weaver._resolve_element(int(action.element_id))
+            await element.click()
+            # Replaces the current content like fill does, through the same key events a user would send
+            await element.select_text()
+            await element.press("Backspace")
+            await self.weaver._press_sequentially(element, action.text)
+        except Exception as e:
+            return ActionResult(action=action, success=False, error=f"{type(e).__name__}: {e}")
+        return ActionResult(action=action, success=True)
+
+    async def _navigate(self, action: Action) -> ActionResult:
+        try:
+            if isinstance(action, GotoUrlAction):
+                await self.weaver._go_to(action.url)
+            else:
+                await self.weaver._click(int(action.element_id))
+        except Exception as e:
+            return ActionResult(action=action, success=False, error=f"{type(e).__name__}: {e}")
+        self.weaver.metrics.increment("actions_total", mode="single")
+        return ActionResult(action=action, success=True)
+
+    @staticmethod
+    def _batch_action(action: Action) -> Dict[str, Any]:
+        return {
+            "id": int(action.element_id),
+            "type": str(action.action_type),
+            "text": action.text,
+            "option": action.option.model_dump() if action.option else None,
+            "checked": action.is_checked,
+        }
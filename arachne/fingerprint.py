@@ -0,0 +1,50 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Dict
+
+from PIL import Image
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    """
+    64 bit difference hash. Visually identical images hash the same even when their encodings differ,
+    and small visual changes only flip a few bits.
+    """
+    pixels = list(image.convert("L").resize((9, 8), Image.Resampling.BILINEAR).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] < pixels[row * 9 + col + 1])
+    return value
+
+
+def tag_digest(tag_to_xpath: Dict[int, str]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for tag_id, xpath in sorted(tag_to_xpath.items()):
+        digest.update(f"{tag_id}={xpath}\n".encode())
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class PageFingerprint:
+    # Digest of the page's url, scroll position, visible text and form state, computed in the page
+    dom_digest: str
+    segment_hashes: tuple[int, ...]
+    tag_digest: str
+
+    def matches(self, other: "PageFingerprint | None", max_distance: int = 4) -> bool:
+        """
+        Whether two observations show the same page: the DOM digests and the tags are identical and every
+        screenshot segment is within `max_distance` bits. Each signal catches changes the others miss, the
+        digest a typed value too small to move a perceptual hash, the hashes a class or style change.
+        """
+        if other is None:
+            return False
+        if self.dom_digest != other.dom_digest or self.tag_digest != other.tag_digest:
+            return False
+        if len(self.segment_hashes) != len(other.segment_hashes):
+            return False
+        return all(
+            bin(segment_hash ^ other_hash).count("1") <= max_distance
+            for segment_hash, other_hash in zip(self.segment_hashes, other.segment_hashes)
+        )
@@ -0,0 +1,166 @@
+import json
+import math
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+import structlog
+
+log = structlog.get_logger()
+
+TokenCounter = Callable[[str], int]
+
+
+def estimate_tokens(text: str) -> int:
+    # About four characters per token for English and JSON, close enough to budget a prompt
+    return math.ceil(len(text) / 4)
+
+
+@dataclass
+class HistoryReport:
+    step: int
+    full_tokens: int
+    rendered_tokens: int
+    verbatim_steps: int
+    compacted_steps: int
+    summarized_steps: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.full_tokens - self.rendered_tokens
+
+
+@dataclass
+class _Step:
+    number: int
+    response: Dict[str, Any]
+    verbatim: str
+    compact: str
+    full_tokens: int
+    verbatim_tokens: int
+    compact_tokens: int
+
+
+@dataclass
+class TaskHistory:
+    """
+    The steps an agent has taken, rendered for its prompt within a token budget.
+
+    The last `keep_last` steps are rendered verbatim. Older steps are reduced to their action and input, and when
+    that is still over `token_budget` the oldest of them are folded into one summary of which actions were taken
+    on which targets. Every `render` appends a `HistoryReport` with the tokens saved against the full history.
+    """
+    token_budget: int = 2000
+    keep_last: int = 3
+    max_input_chars: int = 200
+    count_tokens: TokenCounter = estimate_tokens
+    reports: List[HistoryReport] = field(default_factory=list)
+    _steps: List[_Step] = field(default_factory=list, init=False)
+    _full_tokens: int = field(default=0, init=False)
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    def append(self, response: Dict[str, Any]) -> None:
+        number = len(self._steps) + 1
+        verbatim = json.dumps({"step": number, **response}, ensure_ascii=False)
+        compact = json.dumps(
+            {
+                "step": number,
+                "action": response.get("action"),
+                "action_input": self._truncate(response.get("action_input")),
+            },
+            ensure_ascii=False,
+        )
+        full_tokens = self.count_tokens(repr(response))
+        self._full_tokens += full_tokens
+        self._steps.append(
+            _Step(
+                number=number,
+                response=response,
+                verbatim=verbatim,
+                compact=compact,
+                full_tokens=full_tokens,
+                verbatim_tokens=self.count_tokens(verbatim),
+                compact_tokens=self.count_tokens(compact),
+            )
+        )
+
+    def render(self) -> str:
+        steps = self._steps
+        split = max(len(steps) - self.keep_last, 0)
+        older, recent = steps[:split], steps[split:]
+
+        tokens = sum(step.verbatim_tokens for step in recent) + sum(step.compact_tokens for step in older)
+        summarized = 0
+        summary = _Summary()
+        summary_text = ""
+        # Fold the oldest compact steps into the summary until the history fits
+        while summarized < len(older) and tokens + self.count_tokens(summary_text) > self.token_budget:
+            tokens -= older[summarized].compact_tokens
+            summary.add(older[summarized])
+            summarized += 1
+            summary_text = summary.render()
+
+        lines = [summary_text] if summary_text else []
+        lines.extend(step.compact for step in older[summarized:])
+        lines.extend(step.verbatim for step in recent)
+        rendered = "\n".join(lines)
+
+        report = HistoryReport(
+            step=len(steps),
+            full_tokens=self._full_tokens,
+            rendered_tokens=self.count_tokens(rendered),
+            verbatim_steps=len(recent),
+            compacted_steps=len(older) - summarized,
+            summarized_steps=summarized,
+        )
+        self.reports.append(report)
+        log.debug("Rendered task history", saved_tokens=report.saved_tokens, **report.__dict__)
+        return rendered
+
+    def _truncate(self, value: Any) -> Any:
+        if isinstance(value, str) and len(value) > self.max_input_chars:
+            return value[:self.max_input_chars] + "..."
+        return value
+
+
+class _Summary:
+    """Which actions a run of steps took and on which targets, keeping the most recent targets of each action."""
+
+    max_targets = 20
+
+    def __init__(self):
+        self.first: int | None = None
+        self.last: int | None = None
+        self.counts: Dict[str, int] = {}
+        self.targets: Dict[str, List[Any]] = {}
+
+    def add(self, step: _Step) -> None:
+        self.first = step.number if self.first is None else self.first
+        self.last = step.number
+        action = str(step.response.get("action"))
+        action_input = step.response.get("action_input")
+        self.counts[action] = self.counts.get(action, 0) + 1
+
+        if action == "click":
+            new_targets = [action_input]
+        elif action == "type_text" and isinstance(action_input, list) and action_input:
+            items = action_input if isinstance(action_input[0], list) else [action_input]
+            new_targets = [item[1] for item in items if isinstance(item, list) and len(item) > 1]
+        elif action == "go_to_url":
+            new_targets = [action_input]
+        else:
+            return
+        targets = self.targets.setdefault(action, [])
+        targets.extend(new_targets)
+        del targets[:-self.max_targets]
+
+    def render(self) -> str:
+        actions = {
+            action: {"count": count, "targets": self.targets[action]} if action in self.targets else {"count": count}
+            for action, count in self.counts.items()
+        }
+        return json.dumps(
+            {"steps": f"{self.first}-{self.last}", "summary": "earlier steps", "actions": actions},
+            ensure_ascii=False,
+        )
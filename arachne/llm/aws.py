@@ -1,59 +1,238 @@
+import asyncio
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator
 
 import boto3
-from regex import regex
+import structlog
+from botocore.config import Config
 
-from logs import logger
+from arachne.exceptions import LLMCacheMiss, LLMRequestAbandoned, LLMRequestTimeout
+from arachne.llm.cache import LLMCacheMode, LLMResponseCache
+from arachne.llm.parsing import extract_json
+from arachne.metrics import metrics
+
+log = structlog.get_logger()
+
+# Set on a worker thread while it runs a call, to the event that tells the call was abandoned
+_call_state = threading.local()
+
+
+def _stop_abandoned_call(**kwargs) -> None:
+    # Runs before every attempt, including retries, of the call on this thread
+    abandoned: threading.Event | None = getattr(_call_state, "abandoned", None)
+    if abandoned is not None and abandoned.is_set():
+        raise LLMRequestAbandoned()
 
 
 class LLM:
-    def __init__(self):
-        self.brt = boto3.client(service_name='bedrock-runtime')
-        self.modelId = 'anthropic.claude-v2'
+    """
+    Bedrock runtime client that does not block the event loop.
+
+    `invoke_model` runs on a dedicated thread pool sized to the connection pool. The botocore client, its
+    connections and its thread pool are shared by every `LLM` with the same settings. `endpoint_url` points the
+    client at another Bedrock runtime compatible server, e.g. a local stand-in.
+
+    A call that times out is abandoned: its thread makes no further retries and stops reading a stream, so it is
+    busy for at most the read timeout of the attempt in flight.
+    """
+
+    _clients: dict[tuple, tuple[Any, ThreadPoolExecutor]] = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(
+            self,
+            model_id: str = 'anthropic.claude-v2',
+            region_name: str | None = None,
+            endpoint_url: str | None = None,
+            timeout: float = 120.0,
+            connect_timeout: float = 5.0,
+            max_pool_connections: int = 32,
+            max_attempts: int = 3,
+            cache: LLMResponseCache | None = None,
+    ):
+        self.modelId = model_id
+        self.cache = cache
         self.accept = 'application/json'
         self.contentType = 'application/json'
-        self.prompt = ''
+        self.timeout = timeout
         self.body = {
             "max_tokens": 4000,
             "temperature": 0.1,
             "anthropic_version": "bedrock-2023-05-31",
             "top_p": 0.9,
         }
+        self.brt, self._executor = self._client(
+            region_name, endpoint_url, timeout, connect_timeout, max_pool_connections, max_attempts
+        )
 
-    async def call_llm(self, prompt):
+    @classmethod
+    def _client(
+            cls,
+            region_name: str | None,
+            endpoint_url: str | None,
+            timeout: float,
+            connect_timeout: float,
+            max_pool_connections: int,
+            max_attempts: int,
+    ):
+        key = (region_name, endpoint_url, timeout, connect_timeout, max_pool_connections, max_attempts)
+        with cls._clients_lock:
+            shared = cls._clients.get(key)
+            if shared is None:
+                config = Config(
+                    max_pool_connections=max_pool_connections,
+                    connect_timeout=connect_timeout,
+                    read_timeout=timeout,
+                    retries={"max_attempts": max_attempts, "mode": "standard"},
+                    tcp_keepalive=True,
+                )
+                client = boto3.client(
+                    service_name='bedrock-runtime',
+                    region_name=region_name,
+                    endpoint_url=endpoint_url,
+                    config=config,
+                )
+                client.meta.events.register("before-send.bedrock-runtime", _stop_abandoned_call)
+                # One thread per pooled connection, so a client never waits on another client's calls
+                executor = ThreadPoolExecutor(max_workers=max_pool_connections, thread_name_prefix="bedrock")
+                shared = cls._clients[key] = client, executor
+            return shared
 
-        messages = [
-            {
-                "role": "user",
-                "content": [{"type": "text", "text": f'{prompt}'
-                             }],
-            }
-        ]
+    def _invoke_model(self, body: str, abandoned: threading.Event) -> dict:
+        _call_state.abandoned = abandoned
+        try:
+            response = self.brt.invoke_model(body=body, modelId=self.modelId, accept=self.accept,
+                                             contentType=self.contentType)
+            return json.loads(response.get('body').read())
+        finally:
+            _call_state.abandoned = None
 
-        self.body["messages"] = messages
+    def _build_body(self, prompt) -> str:
+        # Built per call, concurrent calls must not share the messages
+        body = {
+            **self.body,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [{"type": "text", "text": f'{prompt}'}],
+                }
+            ],
+        }
+        return json.dumps(body)
 
-        response = self.brt.invoke_model(body=json.dumps(self.body), modelId=self.modelId, accept=self.accept,
-                                         contentType=self.contentType)
+    def _invoke_model_with_response_stream(self, body: str, emit, abandoned: threading.Event) -> None:
+        _call_state.abandoned = abandoned
+        try:
+            response = self.brt.invoke_model_with_response_stream(body=body, modelId=self.modelId,
+                                                                   accept=self.accept, contentType=self.contentType)
+        finally:
+            _call_state.abandoned = None
+        stream = response.get('body')
+        try:
+            for event in stream:
+                if abandoned.is_set():
+                    return
+                chunk = json.loads(event['chunk']['bytes']) if 'chunk' in event else {}
+                if chunk.get('type') == 'content_block_delta':
+                    emit(chunk['delta'].get('text', ''))
+        finally:
+            stream.close()
+
+    def _cache_key(self, prompt) -> str:
+        return LLMResponseCache.key(self.modelId, self.body, f'{prompt}')
 
-        logger.info(f'response {response}')
-        response_body = json.loads(response.get('body').read())
-        logger.info(f'response_body, {response_body}')
+    async def call_llm(self, prompt, timeout: float | None = None) -> str:
+        if self.cache is not None:
+            return await self.cache.get_or_call(self._cache_key(prompt), lambda: self._call_llm(prompt, timeout))
+        return await self._call_llm(prompt, timeout)
 
-        # text
-        logger.info(f'response_body.get {response_body["content"][0]["text"]}')
+    async def _call_llm(self, prompt, timeout: float | None = None) -> str:
+        timeout = self.timeout if timeout is None else timeout
+        body = self._build_body(prompt)
+
+        loop = asyncio.get_running_loop()
+        abandoned = threading.Event()
+        future = loop.run_in_executor(self._executor, self._invoke_model, body, abandoned)
+        try:
+            with metrics.span("llm_request", provider="bedrock"):
+                response_body = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # The attempt in flight can't be interrupted, but the worker thread won't retry
+            abandoned.set()
+            log.warning("Bedrock call timed out", model_id=self.modelId, timeout=timeout)
+            raise LLMRequestTimeout(model_id=self.modelId, timeout=timeout)
+        except BaseException:
+            abandoned.set()
+            raise
 
+        log.debug("Bedrock response", model_id=self.modelId, response_body=response_body)
         return response_body['content'][0]['text']
 
-    async def get_json_response(self, prompt):
+    async def stream_llm(self, prompt, timeout: float | None = None) -> AsyncIterator[str]:
+        """
+        Streams the response text as the model writes it. The event stream is read on the executor and handed to
+        the event loop chunk by chunk; `timeout` bounds the whole response.
+        """
+        if self.cache is not None and self.cache.mode != LLMCacheMode.off:
+            key = self._cache_key(prompt)
+            cached = await self.cache.get(key)
+            if cached is None and self.cache.mode == LLMCacheMode.replay:
+                raise LLMCacheMiss(key=key)
+            if cached is not None:
+                yield cached
+                return
+            chunks = []
+            async for chunk in self._stream_llm(prompt, timeout):
+                chunks.append(chunk)
+                yield chunk
+            await self.cache.put(key, "".join(chunks))
+            return
 
-        await self.call_llm(prompt)
-        output = await self.call_llm(prompt)
+        async for chunk in self._stream_llm(prompt, timeout):
+            yield chunk
 
-        pattern = regex.compile(r'\{(?:[^{}]|(?R))*\}')
-        resp = pattern.findall(output)
+    async def _stream_llm(self, prompt, timeout: float | None = None) -> AsyncIterator[str]:
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        chunks: asyncio.Queue[str] = asyncio.Queue()
+        abandoned = threading.Event()
 
+        def emit(text: str) -> None:
+            loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+        future = loop.run_in_executor(
+            self._executor, self._invoke_model_with_response_stream, self._build_body(prompt), emit, abandoned
+        )
         try:
-            return json.loads(resp[0])
-        except Exception as e:
-            logger.info(f'json decoding failed with error: {e}')
-            return None
\ No newline at end of file
+            with metrics.span("llm_request", provider="bedrock", streamed=True):
+                while True:
+                    get_chunk = asyncio.ensure_future(chunks.get())
+                    done, _ = await asyncio.wait({get_chunk, future}, timeout=deadline - loop.time(),
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    if get_chunk in done:
+                        yield get_chunk.result()
+                        continue
+                    get_chunk.cancel()
+                    if future in done:
+                        # Chunks emitted right before the stream ended are already queued
+                        while not chunks.empty():
+                            yield chunks.get_nowait()
+                        future.result()
+                        return
+                    log.warning("Bedrock stream timed out", model_id=self.modelId, timeout=timeout)
+                    raise LLMRequestTimeout(model_id=self.modelId, timeout=timeout)
+        finally:
+            # Also when the caller stops reading early, the worker thread stops at the next event
+            abandoned.set()
+
+    async def get_json_response(self, prompt, timeout: float | None = None):
+
+        output = await self.call_llm(prompt, timeout=timeout)
+
+        resp = extract_json(output)
+        if resp is None:
+            log.info('json decoding failed, no JSON object in the response')
+        return resp
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from enum import StrEnum
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, TypeVar
+
+import structlog
+
+from arachne.exceptions import LLMCacheMiss
+from arachne.metrics import metrics
+
+log = structlog.get_logger()
+
+T = TypeVar("T")
+
+
+class LLMCacheMode(StrEnum):
+    # Always call the model
+    off = "off"
+    # Serve cached responses and record new ones
+    read_write = "read_write"
+    # Only serve recorded responses, a miss raises instead of calling the model
+    replay = "replay"
+
+
+def _digest(value: str) -> str:
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+def chat_cache_key(payload: dict[str, Any]) -> str:
+    """
+    Key of a chat completions request: the model and parameters, every text part and a digest of every image.
+    Whether the response is streamed does not change the key.
+    """
+    params = {key: value for key, value in payload.items() if key not in ("messages", "stream")}
+    texts: list[str] = []
+    image_hashes: list[str] = []
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        parts = [{"type": "text", "text": content}] if isinstance(content, str) else content or []
+        for part in parts:
+            if part.get("type") == "image_url":
+                image_hashes.append(_digest(part["image_url"]["url"]))
+            else:
+                texts.append(f"{message.get('role')}:{part.get('text', '')}")
+    return LLMResponseCache.key(payload.get("model", ""), params, "\n".join(texts), image_hashes)
+
+
+class LLMResponseCache:
+    """
+    Content addressed cache of model responses in a SQLite file.
+
+    Entries are keyed by model, parameters, prompt text and image hashes, evicted least recently used beyond
+    `max_entries` and expire after `ttl_seconds` (except in replay mode, which serves every recorded response
+    so runs are reproducible). Point regression runs at a recorded cache in replay mode to run without the model.
+    """
+
+    def __init__(
+            self,
+            path: Path | str = Path(".arachne") / "llm_cache.sqlite3",
+            mode: LLMCacheMode = LLMCacheMode.read_write,
+            max_entries: int = 10_000,
+            ttl_seconds: float | None = 7 * 24 * 3600,
+    ):
+        self.path = Path(path)
+        self.mode = mode
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    @staticmethod
+    def key(model: str, params: dict[str, Any], prompt: str, image_hashes: Iterable[str] = ()) -> str:
+        canonical = json.dumps(
+            {"model": model, "params": params, "prompt": prompt, "images": list(image_hashes)},
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    async def get_or_call(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        if self.mode == LLMCacheMode.off:
+            return await call()
+
+        value = await self.get(key)
+        if value is not None:
+            return value
+        if self.mode == LLMCacheMode.replay:
+            raise LLMCacheMiss(key=key)
+
+        value = await call()
+        await self.put(key, value)
+        return value
+
+    async def get(self, key: str) -> Any | None:
+        value = await asyncio.to_thread(self._get, key)
+        if value is None:
+            self.misses += 1
+            metrics.increment("llm_cache_requests_total", result="miss")
+            log.debug("LLM cache miss", key=key)
+            return None
+        self.hits += 1
+        metrics.increment("llm_cache_requests_total", result="hit")
+        log.debug("LLM cache hit", key=key)
+        return value
+
+    async def put(self, key: str, value: Any) -> None:
+        await asyncio.to_thread(self._put, key, value)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _get(self, key: str) -> Any | None:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            expired = self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+            if expired and self.mode != LLMCacheMode.replay:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                connection.commit()
+                return None
+            connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            connection.commit()
+        return json.loads(value)
+
+    def _put(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            connection.commit()
@@ -0,0 +1,158 @@
+import asyncio
+import importlib.util
+import json
+import random
+from typing import Any, AsyncIterator
+
+import httpx
+import structlog
+
+from arachne.exceptions import ChatCompletionFailed, LLMCacheMiss
+from arachne.llm.cache import LLMCacheMode, LLMResponseCache, chat_cache_key
+
+log = structlog.get_logger()
+
+_RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class ChatClient:
+    """
+    Async client for OpenAI style chat completions.
+
+    One client keeps a pool of keep-alive connections (HTTP/2 when `h2` is installed) and can be shared by every
+    task in the process. Rate limits, server errors and transport errors are retried with jittered exponential
+    backoff, honouring Retry-After. `base_url` can point at any compatible server, e.g. a local mock.
+    With a `cache`, identical requests are answered from it; streamed and non streamed requests share entries.
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            base_url: str = "https://api.openai.com/v1",
+            timeout: float = 120.0,
+            connect_timeout: float = 10.0,
+            max_connections: int = 32,
+            max_keepalive_connections: int = 16,
+            max_retries: int = 3,
+            backoff_base: float = 0.5,
+            backoff_max: float = 8.0,
+            http2: bool | None = None,
+            cache: LLMResponseCache | None = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache
+        self.http2 = importlib.util.find_spec("h2") is not None if http2 is None else http2
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+            http2=self.http2,
+        )
+
+    async def __aenter__(self) -> "ChatClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    async def complete(self, payload: dict[str, Any]) -> dict[str, Any]:
+        if self.cache is not None:
+            return await self.cache.get_or_call(chat_cache_key(payload), lambda: self._complete(payload))
+        return await self._complete(payload)
+
+    async def _complete(self, payload: dict[str, Any]) -> dict[str, Any]:
+        response = await self._post("/chat/completions", payload)
+        return response.json()
+
+    async def stream(self, payload: dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Streams the completion and yields the content deltas as they arrive. Only the request itself is retried,
+        once content has been yielded a failure is raised to the caller.
+        """
+        if self.cache is None or self.cache.mode == LLMCacheMode.off:
+            async for content in self._stream(payload):
+                yield content
+            return
+
+        key = chat_cache_key(payload)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            yield cached["choices"][0]["message"]["content"]
+            return
+        if self.cache.mode == LLMCacheMode.replay:
+            raise LLMCacheMiss(key=key)
+
+        contents = []
+        async for content in self._stream(payload):
+            contents.append(content)
+            yield content
+        # Stored like a non streamed completion so either kind of request can be answered from it
+        await self.cache.put(
+            key, {"choices": [{"message": {"role": "assistant", "content": "".join(contents)}}]}
+        )
+
+    async def _stream(self, payload: dict[str, Any]) -> AsyncIterator[str]:
+        response = await self._post("/chat/completions", {**payload, "stream": True}, stream=True)
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                for choice in json.loads(data).get("choices", []):
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        yield content
+        except httpx.TransportError as e:
+            raise ChatCompletionFailed(status_code=response.status_code, message=repr(e)) from e
+        finally:
+            await response.aclose()
+
+    async def _post(self, path: str, payload: dict[str, Any], stream: bool = False) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                request = self._client.build_request("POST", path, json=payload)
+                response = await self._client.send(request, stream=stream)
+            except httpx.TransportError as e:
+                if attempt >= self.max_retries:
+                    raise ChatCompletionFailed(status_code=None, message=repr(e)) from e
+                delay = self._backoff(attempt)
+                log.warning("Chat completion request failed, retrying", error=repr(e), attempt=attempt, delay=delay)
+            else:
+                if response.is_success:
+                    return response
+                await response.aread()
+                await response.aclose()
+                if response.status_code not in _RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    raise ChatCompletionFailed(status_code=response.status_code, message=response.text)
+                delay = self._retry_after(response) or self._backoff(attempt)
+                log.warning(
+                    "Chat completion request was rejected, retrying",
+                    status_code=response.status_code,
+                    attempt=attempt,
+                    delay=delay,
+                )
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter, so tasks that failed together do not retry together
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _retry_after(self, response: httpx.Response) -> float | None:
+        try:
+            return min(float(response.headers["retry-after"]), self.backoff_max)
+        except (KeyError, ValueError):
+            return None
@@ -7,6 +7,7 @@ from regex import regex
 import structlog
 
 from arachne.llm.aws import LLM
+from arachne.plan import Plan
 
 log = structlog.get_logger()
 
@@ -21,16 +22,34 @@ class Cortex:
     def __init__(self):
         self.llm = LLM()
 
-    def plan(self, prompt):
+    async def plan(self, goal: str) -> Plan:
         prompt = f'''
         Agent performing agentic action on the web.
         Need to plan the steps to achieve the goal.
         plan should be a list of subgoals to achieve to reach the goal.
-        
-        the subgoals should be provided as a json object.
 
+        Subgoals run in separate browsers, at the same time unless one depends on another. A subgoal continues
+        in the browser of the subgoals it depends on, with their session.
+        A subgoal should only depend on the subgoals whose results it needs or that must happen before it
+        on the same website, e.g. logging in before posting. Research on different websites does not depend
+        on each other.
+
+        the subgoals should be provided as a json object in the following format:
+        {{
+            "goal": "the goal",
+            "subgoals": [
+                {{
+                    "id": "a short unique id",
+                    "description": "what to do",
+                    "depends_on": ["ids of the subgoals this one needs"],
+                    "resources": ["what is needed to do it"]
+                }}
+            ]
+        }}
+
+        Goal: {goal}
         '''
 
-        resp =  self.llm.get_json_response(prompt)
+        resp = await self.llm.get_json_response(prompt)
 
-        return resp
+        return Plan.from_response(goal, resp)
@@ -0,0 +1,184 @@
+import json
+import re
+from enum import Enum
+from typing import Any, Iterator
+
+_decoder = json.JSONDecoder()
+# An object can only start with a key or be empty, which rules out most braces in prose before decoding
+_OBJECT_START = re.compile(r'\{\s*["}]')
+
+
+def extract_json(text: str) -> dict[str, Any] | None:
+    """
+    Returns the first JSON object in a model response, or None when there is none.
+
+    Prose, code fences and anything after the object are ignored. Only braces that can start an object are
+    decoded, and decoding stops at the end of the object, so the cost is linear in the text before and in the
+    object rather than in the whole response.
+    """
+    for match in _OBJECT_START.finditer(text):
+        try:
+            value, _ = _decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+class _State(Enum):
+    SEEK_OBJECT = 0
+    EXPECT_KEY = 1
+    IN_KEY = 2
+    EXPECT_COLON = 3
+    EXPECT_VALUE = 4
+    IN_VALUE = 5
+    AFTER_VALUE = 6
+    DONE = 7
+
+
+class IncrementalJSONParser:
+    """
+    Parses the first JSON object in a streamed model response and emits each top level field as soon as its
+    value is complete, without waiting for the rest of the object or the response.
+
+    Text before the object is skipped, so prose around the JSON is fine. `feed` returns the fields completed by
+    that chunk; `fields` holds every field completed so far and `done` is set once the object is closed.
+
+    The fields are only a head start: a brace in the prose can still be mistaken for the object, so `result`
+    checks them against a full parse of the text once the response is complete.
+    """
+
+    def __init__(self):
+        self.fields: dict[str, Any] = {}
+        self.text = ""
+        self._pos = 0
+        self._state = _State.SEEK_OBJECT
+        self._token_start = 0
+        self._object_start = 0
+        self._key: str | None = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == _State.DONE
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        self.text += chunk
+        return list(self._parse())
+
+    def _parse(self) -> Iterator[tuple[str, Any]]:
+        text = self.text
+        while self._pos < len(text) and self._state != _State.DONE:
+            char = text[self._pos]
+            state = self._state
+
+            if state == _State.SEEK_OBJECT:
+                if char == "{":
+                    self._state = _State.EXPECT_KEY
+                    self._object_start = self._pos
+            elif state == _State.EXPECT_KEY:
+                if char == '"':
+                    self._state = _State.IN_KEY
+                    self._token_start = self._pos
+                elif char == "}":
+                    self._state = _State.DONE
+                elif not char.isspace():
+                    self._restart()
+            elif state == _State.IN_KEY:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    try:
+                        self._key = json.loads(text[self._token_start:self._pos + 1])
+                        self._state = _State.EXPECT_COLON
+                    except json.JSONDecodeError:
+                        self._restart()
+            elif state == _State.EXPECT_COLON:
+                if char == ":":
+                    self._state = _State.EXPECT_VALUE
+                elif not char.isspace():
+                    self._restart()
+            elif state == _State.EXPECT_VALUE:
+                if not char.isspace():
+                    self._state = _State.IN_VALUE
+                    self._token_start = self._pos
+                    self._depth = 0
+                    self._in_string = char == '"'
+                    if char in "{[":
+                        self._depth = 1
+            elif state == _State.IN_VALUE:
+                field = self._value_char(char)
+                if field is not None:
+                    yield field
+                    if self._state == _State.DONE:
+                        break
+            elif state == _State.AFTER_VALUE:
+                if char == ",":
+                    self._state = _State.EXPECT_KEY
+                elif char == "}":
+                    self._state = _State.DONE
+                elif not char.isspace():
+                    self._restart()
+
+            self._pos += 1
+
+    def _value_char(self, char: str) -> tuple[str, Any] | None:
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                if self._depth == 0:
+                    return self._complete_value(self._pos + 1, _State.AFTER_VALUE)
+            return None
+
+        if char == '"':
+            self._in_string = True
+        elif char in "{[":
+            self._depth += 1
+        elif char in "}]" and self._depth > 0:
+            self._depth -= 1
+            if self._depth == 0:
+                return self._complete_value(self._pos + 1, _State.AFTER_VALUE)
+        elif self._depth == 0 and (char in ",}" or char.isspace()):
+            # End of a number or literal, the delimiter itself still has to be handled
+            next_state = {",": _State.EXPECT_KEY, "}": _State.DONE}.get(char, _State.AFTER_VALUE)
+            return self._complete_value(self._pos, next_state)
+        return None
+
+    def _complete_value(self, end: int, next_state: _State) -> tuple[str, Any] | None:
+        try:
+            value = json.loads(self.text[self._token_start:end])
+        except json.JSONDecodeError:
+            self._restart()
+            return None
+        self._state = next_state
+        self.fields[self._key] = value
+        return self._key, value
+
+    def result(self) -> dict[str, Any] | None:
+        """
+        Returns the object in the response, or None when there is none. Call it once the response is complete.
+
+        This is a full parse of the text rather than `fields`, which can have locked on to a brace in the prose or
+        a nested value; the two agree whenever the streamed fields were right.
+        """
+        return extract_json(self.text)
+
+    def _restart(self) -> None:
+        # Not the object we are looking for, look for the next one from the character after its brace, which
+        # may itself open the real object. The main loop moves past the brace.
+        self.fields = {}
+        self._key = None
+        self._state = _State.SEEK_OBJECT
+        self._pos = self._object_start
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+import structlog
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from arachne._utils import write_atomic
+
+log = structlog.get_logger()
+
+Labels = Tuple[Tuple[str, str], ...]
+
+QUANTILES = (0.5, 0.95)
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+@dataclass
+class StageTimings:
+    count: int = 0
+    total_seconds: float = 0.0
+    # Most recent durations, quantiles are computed over this window
+    window: deque = field(default_factory=lambda: deque(maxlen=1024))
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.window.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self.window:
+            return 0.0
+        ordered = sorted(self.window)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class Metrics:
+    """
+    Stage timings and counters for the agent loop.
+
+    `span` times a block and records it under its stage; `increment` bumps a counter. Each span is logged through
+    structlog, `summary` logs p50/p95 per stage, and `render_prometheus` exposes everything in the Prometheus text
+    format through `write_prometheus` (for a textfile collector) or the `router` endpoint.
+    """
+
+    def __init__(self, namespace: str = "arachne"):
+        self.namespace = namespace
+        self._stages: Dict[Tuple[str, Labels], StageTimings] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str, **labels) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment("stage_errors_total", stage=stage, **labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.observe(stage, elapsed, **labels)
+            log.debug("Stage timing", stage=stage, duration_ms=elapsed * 1000, **labels)
+
+    def observe(self, stage: str, seconds: float, **labels) -> None:
+        key = (stage, _labels(labels))
+        with self._lock:
+            timings = self._stages.get(key)
+            if timings is None:
+                timings = self._stages[key] = StageTimings()
+            timings.observe(seconds)
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def stage(self, stage: str, **labels) -> StageTimings:
+        return self._stages.get((stage, _labels(labels)), StageTimings())
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            stages = list(self._stages.items())
+        result = {}
+        for (stage, labels), timings in stages:
+            name = stage + _format_labels(labels)
+            result[name] = {
+                "count": timings.count,
+                "p50_ms": timings.quantile(0.5) * 1000,
+                "p95_ms": timings.quantile(0.95) * 1000,
+                "total_ms": timings.total_seconds * 1000,
+            }
+            log.info("Stage timing summary", stage=name, **result[name])
+        return result
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            stages = sorted(self._stages.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        stage_metric = f"{self.namespace}_stage_duration_seconds"
+        if stages:
+            lines.append(f"# HELP {stage_metric} Duration of agent loop stages")
+            lines.append(f"# TYPE {stage_metric} summary")
+        for (stage, labels), timings in stages:
+            for q in QUANTILES:
+                lines.append(
+                    f"{stage_metric}{_format_labels(labels, stage=stage, quantile=str(q))} {timings.quantile(q)}"
+                )
+            lines.append(f"{stage_metric}_sum{_format_labels(labels, stage=stage)} {timings.total_seconds}")
+            lines.append(f"{stage_metric}_count{_format_labels(labels, stage=stage)} {timings.count}")
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{self.namespace}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path | str) -> None:
+        write_atomic(Path(path), self.render_prometheus())
+
+    def router(self, path: str = "/metrics") -> APIRouter:
+        router = APIRouter()
+
+        @router.get(path, response_class=PlainTextResponse)
+        async def prometheus_metrics() -> str:
+            return self.render_prometheus()
+
+        return router
+
+
+# Shared by everything in the process unless a component is given its own
+metrics = Metrics()
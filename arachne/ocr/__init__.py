@@ -0,0 +1,6 @@
+from arachne.ocr.base import OCRBackend
+from arachne.ocr.tesseract import TesseractOCR
+from arachne.ocr.types import ImageAnnotation, ImageAnnotatorResponse
+
+
+__all__ = ["ImageAnnotation", "ImageAnnotatorResponse", "OCRBackend", "TesseractOCR"]
@@ -0,0 +1,14 @@
+from abc import ABC, abstractmethod
+
+from arachne.ocr.types import ImageAnnotatorResponse
+
+
+class OCRBackend(ABC):
+    """
+    Reads the text of a screenshot. Implementations return annotations in page pixels of the whole screenshot,
+    in reading order, ready for `text_format.format_text`, and must not block the event loop while they work.
+    """
+
+    @abstractmethod
+    async def annotate(self, image: bytes) -> ImageAnnotatorResponse:
+        raise NotImplementedError()
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import importlib.util
+import io
+import multiprocessing
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple
+
+import structlog
+from PIL import Image
+
+from arachne.exceptions import OCRBackendUnavailable
+from arachne.ocr.base import OCRBackend
+from arachne.ocr.types import ImageAnnotatorResponse
+from arachne.segments import SegmentCache
+
+log = structlog.get_logger()
+
+# Text, left, top, width and height of a word in segment pixels
+Word = Tuple[str, int, int, int, int]
+
+
+def _ocr_segment(
+        pixels: bytes,
+        mode: str,
+        size: Tuple[int, int],
+        language: str,
+        min_confidence: float,
+) -> List[Word]:
+    # Runs in a worker process, the segment is sent as raw pixels so neither side has to encode it
+    import pytesseract
+
+    segment = Image.frombytes(mode, size, pixels)
+    data = pytesseract.image_to_data(segment, lang=language, output_type=pytesseract.Output.DICT)
+    words = []
+    for text, confidence, left, top, width, height in zip(
+            data["text"], data["conf"], data["left"], data["top"], data["width"], data["height"]
+    ):
+        text = text.strip()
+        if text and float(confidence) >= min_confidence:
+            words.append((text, left, top, width, height))
+    return words
+
+
+class TesseractOCR(OCRBackend):
+    """
+    Local OCR with Tesseract, installed with the `ocr` extra and the `tesseract` binary.
+
+    The screenshot is split into horizontal segments that are read in parallel on a process pool shared by every
+    instance, so OCR never runs on the event loop thread and uses every core when several browser tasks share a
+    process. Segments are cached by a hash of their pixels, so only the parts of a page that changed are read again.
+    """
+
+    _executor: ProcessPoolExecutor | None = None
+    _executor_lock = threading.Lock()
+
+    def __init__(
+            self,
+            language: str = "eng",
+            min_confidence: float = 60.0,
+            segment_height: int = 1024,
+            max_workers: int | None = None,
+            cache: SegmentCache[List[Word]] | None = None,
+    ):
+        if importlib.util.find_spec("pytesseract") is None:
+            raise OCRBackendUnavailable("tesseract", "pytesseract is not installed, install arachne[ocr]")
+        if shutil.which("tesseract") is None:
+            raise OCRBackendUnavailable("tesseract", "the tesseract binary is not on PATH")
+        self.language = language
+        self.min_confidence = min_confidence
+        self.segment_height = segment_height
+        self.max_workers = max_workers
+        self.cache: SegmentCache[List[Word]] = cache or SegmentCache(max_entries=256)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with TesseractOCR._executor_lock:
+            if TesseractOCR._executor is None:
+                # Spawned rather than forked, forking a process that runs an event loop and threads is unsafe
+                TesseractOCR._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return TesseractOCR._executor
+
+    async def annotate(self, image: bytes) -> ImageAnnotatorResponse:
+        decoded = await asyncio.to_thread(self._decode, image)
+        width, height = decoded.size
+        tops = range(0, height, self.segment_height)
+        segment_words = await asyncio.gather(
+            *(self._read_segment(decoded, (0, top, width, min(top + self.segment_height, height))) for top in tops)
+        )
+
+        annotations: ImageAnnotatorResponse = []
+        for top, words in zip(tops, segment_words):
+            for text, left, word_top, word_width, word_height in words:
+                midpoint = (left + word_width / 2, top + word_top + word_height / 2)
+                annotations.append({
+                    "text": text,
+                    "midpoint": midpoint,
+                    "midpoint_normalized": (midpoint[0] / width, midpoint[1] / height),
+                    "width": word_width,
+                    "height": word_height,
+                })
+        # Top to bottom, then left to right, which is the reading order format_text clusters lines in
+        annotations.sort(key=lambda annotation: (annotation["midpoint"][1], annotation["midpoint"][0]))
+        return annotations
+
+    async def _read_segment(self, image: Image.Image, box: Tuple[int, int, int, int]) -> List[Word]:
+        segment = await asyncio.to_thread(image.crop, box)
+        pixels = segment.tobytes()
+        digest = hashlib.blake2b(pixels, digest_size=16)
+        digest.update(f"{segment.mode}:{segment.size}:{self.language}:{self.min_confidence}".encode())
+        key = digest.hexdigest()
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        try:
+            words = await loop.run_in_executor(
+                self._get_executor(),
+                _ocr_segment,
+                pixels,
+                segment.mode,
+                segment.size,
+                self.language,
+                self.min_confidence,
+            )
+        except BrokenProcessPool:
+            # A worker died, the next call starts a fresh pool
+            log.warning("OCR process pool broke, restarting it")
+            self.shutdown()
+            raise
+        self.cache.put(key, words)
+        return words
+
+    @staticmethod
+    def _decode(image: bytes) -> Image.Image:
+        decoded = Image.open(io.BytesIO(image))
+        # Tesseract reads grayscale, converting here makes every segment a quarter of the size to send
+        return decoded.convert("L")
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """Stops the worker processes shared by every instance, the next call starts new ones."""
+        with cls._executor_lock:
+            if cls._executor is not None:
+                cls._executor.shutdown(wait=False, cancel_futures=True)
+                cls._executor = None
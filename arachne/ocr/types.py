@@ -0,0 +1,13 @@
+from typing import List, Tuple, TypedDict
+
+
+class ImageAnnotation(TypedDict):
+    text: str
+    # Center of the text's bounding box, in page pixels and normalized to the page size
+    midpoint: Tuple[float, float]
+    midpoint_normalized: Tuple[float, float]
+    width: int
+    height: int
+
+
+ImageAnnotatorResponse = List[ImageAnnotation]
@@ -0,0 +1,303 @@
+import asyncio
+import time
+from enum import StrEnum
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+import structlog
+from pydantic import BaseModel, Field, model_validator
+
+from arachne.browser.pool import BrowserContextPool, PooledBrowserContext
+from arachne.exceptions import InvalidPlan
+from arachne.metrics import Metrics, metrics as shared_metrics
+
+log = structlog.get_logger()
+
+SubgoalOutput = Dict[str, Any] | list | str | None
+
+
+class Subgoal(BaseModel):
+    id: str
+    description: str
+    # Ids of the subgoals whose results this one needs, it starts once they all completed
+    depends_on: List[str] = Field(default_factory=list)
+    resources: List[str] = Field(default_factory=list)
+
+
+class Plan(BaseModel):
+    """
+    Subgoals that reach a goal, as a dependency graph. Subgoals that don't depend on each other, directly or
+    through others, can run at the same time.
+    """
+    goal: str
+    subgoals: List[Subgoal]
+
+    @model_validator(mode="after")
+    def validate_graph(self) -> "Plan":
+        ids = [subgoal.id for subgoal in self.subgoals]
+        duplicates = sorted({subgoal_id for subgoal_id in ids if ids.count(subgoal_id) > 1})
+        if duplicates:
+            raise InvalidPlan(f"duplicate subgoal ids {duplicates}")
+        for subgoal in self.subgoals:
+            unknown = [dependency for dependency in subgoal.depends_on if dependency not in ids]
+            if unknown:
+                raise InvalidPlan(f"subgoal {subgoal.id} depends on unknown subgoals {unknown}")
+        self.topological_order()
+        return self
+
+    def topological_order(self) -> List[Subgoal]:
+        """Subgoals ordered so every subgoal comes after its dependencies, in plan order where there's a choice."""
+        by_id = {subgoal.id: subgoal for subgoal in self.subgoals}
+        remaining = {subgoal.id: set(subgoal.depends_on) for subgoal in self.subgoals}
+        ordered: List[Subgoal] = []
+        while remaining:
+            ready = [subgoal_id for subgoal_id, dependencies in remaining.items() if not dependencies]
+            if not ready:
+                raise InvalidPlan(f"dependency cycle between subgoals {sorted(remaining)}")
+            for subgoal_id in ready:
+                ordered.append(by_id[subgoal_id])
+                del remaining[subgoal_id]
+            for dependencies in remaining.values():
+                dependencies.difference_update(ready)
+        return ordered
+
+    @classmethod
+    def from_response(cls, goal: str, response: Dict[str, Any] | None) -> "Plan":
+        """
+        Builds a plan from the planner's JSON. Plans in the older `subtasks` shape (see steps.json) have no
+        dependencies, their steps are chained so they keep running one after another.
+        """
+        if not response:
+            raise InvalidPlan("the planner returned no JSON object")
+        if "subgoals" in response:
+            return cls.model_validate({"goal": response.get("goal") or goal, "subgoals": response["subgoals"]})
+        if "subtasks" in response:
+            subgoals = [
+                {
+                    "id": str(index),
+                    "description": subtask["description"],
+                    "depends_on": [str(index - 1)] if index > 1 else [],
+                    "resources": subtask.get("resources", []),
+                }
+                for index, subtask in enumerate(response["subtasks"], start=1)
+            ]
+            return cls.model_validate({"goal": response.get("goal") or goal, "subgoals": subgoals})
+        raise InvalidPlan("the planner's response has no subgoals")
+
+
+class SubgoalStatus(StrEnum):
+    pending = "pending"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+    # Not run because a subgoal it depends on did not complete
+    skipped = "skipped"
+
+
+class SubgoalResult(BaseModel):
+    subgoal_id: str
+    status: SubgoalStatus = SubgoalStatus.pending
+    output: SubgoalOutput = None
+    error: str | None = None
+    duration_seconds: float | None = None
+
+
+class PlanResult(BaseModel):
+    goal: str
+    results: Dict[str, SubgoalResult]
+
+    @property
+    def completed(self) -> bool:
+        return all(result.status == SubgoalStatus.completed for result in self.results.values())
+
+    def outputs(self) -> Dict[str, SubgoalOutput]:
+        return {
+            subgoal_id: result.output
+            for subgoal_id, result in self.results.items()
+            if result.status == SubgoalStatus.completed
+        }
+
+
+# Runs one subgoal in a leased browser context, given the outputs of the subgoals it depends on
+SubgoalRunner = Callable[[Subgoal, PooledBrowserContext, Dict[str, SubgoalOutput]], Awaitable[SubgoalOutput]]
+
+# Cookies and local storage of a browser context, as returned by BrowserContext.storage_state
+StorageState = Dict[str, Any]
+
+
+class PlanExecutor:
+    """
+    Runs a plan's subgoals as soon as their dependencies completed, in browser contexts leased from `pool`. At most
+    `max_concurrency` subgoals run at a time; pass the same semaphore to several executors to share one cap between
+    them. A subgoal that fails fails the subgoals that depend on it, which are skipped, while independent branches
+    keep running.
+
+    A subgoal continues in the context of the dependency that completed last, so a chain of subgoals runs in one
+    browser with its session, pages and storage, and the cookies and local storage of its other dependencies are
+    restored into it. When several dependents start at once only one of them continues in the context, the others
+    get a new one with the storage of all their dependencies restored. Subgoals that don't depend on each other
+    never share a context.
+    """
+
+    def __init__(
+            self,
+            pool: BrowserContextPool,
+            runner: SubgoalRunner,
+            max_concurrency: int | asyncio.Semaphore = 4,
+            lease_timeout: float | None = None,
+            metrics: Metrics | None = None,
+    ):
+        if isinstance(max_concurrency, int) and max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+
+        self.pool = pool
+        self.runner = runner
+        self.lease_timeout = lease_timeout
+        self.metrics = metrics or shared_metrics
+        self._limit = (
+            asyncio.Semaphore(max_concurrency) if isinstance(max_concurrency, int) else max_concurrency
+        )
+
+    async def run(self, plan: Plan) -> PlanResult:
+        results = {subgoal.id: SubgoalResult(subgoal_id=subgoal.id) for subgoal in plan.subgoals}
+        pending = plan.topological_order()
+        running: Dict[asyncio.Task, Subgoal] = {}
+        depended_on = {dependency for subgoal in plan.subgoals for dependency in subgoal.depends_on}
+        storage_states: Dict[str, StorageState] = {}
+        # Contexts of the subgoals that just completed, until a dependent continues in them or they are released
+        finished: Dict[str, PooledBrowserContext] = {}
+        log.info("Running plan", goal=plan.goal, subgoals=len(pending))
+
+        try:
+            while pending or running:
+                # In dependency order, so a skip cascades to every dependent in one pass
+                for subgoal in list(pending):
+                    statuses = [results[dependency].status for dependency in subgoal.depends_on]
+                    if any(status in (SubgoalStatus.failed, SubgoalStatus.skipped) for status in statuses):
+                        results[subgoal.id].status = SubgoalStatus.skipped
+                        pending.remove(subgoal)
+                        log.info("Skipping subgoal, a dependency did not complete", subgoal_id=subgoal.id)
+                    elif all(status == SubgoalStatus.completed for status in statuses):
+                        inputs = {dependency: results[dependency].output for dependency in subgoal.depends_on}
+                        inherited = next(
+                            (dependency for dependency in subgoal.depends_on if dependency in finished), None
+                        )
+                        pooled = finished.pop(inherited) if inherited is not None else None
+                        states = [
+                            storage_states[dependency] for dependency in subgoal.depends_on if dependency != inherited
+                        ]
+                        results[subgoal.id].status = SubgoalStatus.running
+                        task = asyncio.create_task(
+                            self._run_subgoal(subgoal, inputs, pooled, states, keep_context=subgoal.id in depended_on)
+                        )
+                        running[task] = subgoal
+                        pending.remove(subgoal)
+
+                # Contexts that no dependent continues in go back to the pool, their storage state was kept
+                await self._release_all(finished)
+
+                if not running:
+                    break
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    subgoal = running.pop(task)
+                    results[subgoal.id], pooled, storage_state = task.result()
+                    if pooled is not None:
+                        finished[subgoal.id] = pooled
+                    if storage_state is not None:
+                        storage_states[subgoal.id] = storage_state
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            await self._release_all(finished)
+
+        result = PlanResult(goal=plan.goal, results=results)
+        log.info(
+            "Plan finished",
+            goal=plan.goal,
+            completed=result.completed,
+            statuses={subgoal_id: str(r.status) for subgoal_id, r in results.items()},
+        )
+        return result
+
+    async def _run_subgoal(
+            self,
+            subgoal: Subgoal,
+            inputs: Dict[str, SubgoalOutput],
+            pooled: PooledBrowserContext | None,
+            storage_states: List[StorageState],
+            keep_context: bool,
+    ) -> Tuple[SubgoalResult, PooledBrowserContext | None, StorageState | None]:
+        """
+        Runs a subgoal in `pooled`, or in a newly leased context, after restoring `storage_states` into it. When
+        `keep_context` is set the context is returned still leased, with its storage state, for a dependent to
+        continue in. A context that saw a failure is discarded.
+        """
+        start_time = time.monotonic()
+        try:
+            async with self._limit:
+                start_time = time.monotonic()
+                log.info("Running subgoal", subgoal_id=subgoal.id, description=subgoal.description)
+                with self.metrics.span("subgoal"):
+                    if pooled is None:
+                        pooled = await self.pool.lease(timeout=self.lease_timeout)
+                    for storage_state in storage_states:
+                        await _restore_storage_state(pooled, storage_state)
+                    output = await self.runner(subgoal, pooled, inputs)
+                    storage_state = await pooled.browser_context.storage_state() if keep_context else None
+        except BaseException as e:
+            if pooled is not None:
+                await self.pool.release(pooled, discard=True)
+            if not isinstance(e, Exception):
+                raise
+            log.warning("Subgoal failed", subgoal_id=subgoal.id, exc_info=True)
+            return SubgoalResult(
+                subgoal_id=subgoal.id,
+                status=SubgoalStatus.failed,
+                error=f"{type(e).__name__}: {e}",
+                duration_seconds=time.monotonic() - start_time,
+            ), None, None
+
+        if not keep_context:
+            await self.pool.release(pooled)
+            pooled = None
+        return SubgoalResult(
+            subgoal_id=subgoal.id,
+            status=SubgoalStatus.completed,
+            output=output,
+            duration_seconds=time.monotonic() - start_time,
+        ), pooled, storage_state
+
+    async def _release_all(self, contexts: Dict[str, PooledBrowserContext]) -> None:
+        while contexts:
+            _, pooled = contexts.popitem()
+            await self.pool.release(pooled)
+
+
+async def _restore_storage_state(pooled: PooledBrowserContext, storage_state: StorageState) -> None:
+    """
+    Adds the cookies and local storage of `storage_state` to a context that is already open, which
+    `Browser.new_context(storage_state=...)` can't do. Each origin is loaded as an empty document, so the site
+    itself is not requested.
+    """
+    browser_context = pooled.browser_context
+    if storage_state.get("cookies"):
+        await browser_context.add_cookies(storage_state["cookies"])
+
+    origins = [origin for origin in storage_state.get("origins", []) if origin.get("localStorage")]
+    if not origins:
+        return
+    page = await browser_context.new_page()
+    try:
+        for origin in origins:
+            url = origin["origin"] + "/"
+            await page.route(url, lambda route: route.fulfill(status=200, content_type="text/html", body=""))
+            await page.goto(url)
+            await page.evaluate(
+                "items => { for (const { name, value } of items) localStorage.setItem(name, value); }",
+                origin["localStorage"],
+            )
+            await page.unroute(url)
+    finally:
+        await page.close()
@@ -0,0 +1,193 @@
+import asyncio
+import base64
+import hashlib
+import io
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Generic, TypeVar
+
+from PIL import Image
+
+from arachne.browser.manager import ScreenshotFormat
+from arachne.fingerprint import perceptual_hash
+
+ImageContent = dict[str, Any]
+
+
+EncodedSegment = tuple[str, int]
+
+V = TypeVar("V")
+
+
+class SegmentCache(Generic[V]):
+    """
+    Thread safe LRU of per segment results keyed by a hash of the segment's pixels and the settings that produced
+    them. For the encoder, values are the segment's data url and its perceptual hash.
+
+    Holds at most `max_entries` values and, when `size_of` is given, at most `max_bytes` of them as measured by
+    `size_of`. A value larger than `max_bytes` on its own is not cached.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 64,
+            max_bytes: int | None = None,
+            size_of: Callable[[V], int] | None = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.hits = 0
+        self.misses = 0
+        self.size_bytes = 0
+        self._entries: OrderedDict[str, tuple[V, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: V) -> None:
+        size = self.size_of(value) if self.size_of is not None else 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= previous[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.size_bytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self.size_bytes > self.max_bytes
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def encoded_segment_size(segment: EncodedSegment) -> int:
+    # The data url is the bulk of it, one byte per character as it is ASCII
+    return len(segment[0])
+
+
+class SegmentEncoder:
+    """
+    Splits a screenshot into vertical segments and encodes each one as a data url for the model.
+
+    Decoding, cropping and encoding run on a shared thread pool (Pillow releases the GIL while it encodes),
+    so they never block the event loop. `max_pending` bounds how many segments can be queued on the pool by all
+    the encoders running on an event loop together. Segments whose pixels did not change since an earlier step
+    are served from the cache, which is capped at `cache_max_bytes` of data urls by default.
+    """
+
+    _executor: ThreadPoolExecutor | None = None
+    max_pending: int = 32
+    # One semaphore per event loop, shared by every encoder, asyncio primitives can't be used across loops
+    _pending_by_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+        weakref.WeakKeyDictionary()
+    )
+
+    def __init__(
+            self,
+            segment_height: int = 2048,
+            max_segments: int = 10,
+            image_format: ScreenshotFormat = ScreenshotFormat.PNG,
+            quality: int | None = None,
+            cache: SegmentCache[EncodedSegment] | None = None,
+            cache_max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.segment_height = segment_height
+        self.max_segments = max_segments
+        self.image_format = image_format
+        self.quality = quality
+        self.cache: SegmentCache[EncodedSegment] = cache or SegmentCache(
+            max_bytes=cache_max_bytes, size_of=encoded_segment_size
+        )
+        # Digest of the last screenshot and its segments, identical screenshots skip decoding entirely
+        self._last_image: tuple[str, list[ImageContent], tuple[int, ...]] | None = None
+
+    @classmethod
+    def executor(cls) -> ThreadPoolExecutor:
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(thread_name_prefix="segment-encoder")
+        return cls._executor
+
+    @classmethod
+    def _pending(cls) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        pending = cls._pending_by_loop.get(loop)
+        if pending is None:
+            pending = cls._pending_by_loop[loop] = asyncio.Semaphore(cls.max_pending)
+        return pending
+
+    async def encode(self, image: bytes) -> list[ImageContent]:
+        segments, _ = await self.encode_with_hashes(image)
+        return segments
+
+    async def encode_with_hashes(self, image: bytes) -> tuple[list[ImageContent], tuple[int, ...]]:
+        """Encodes the screenshot and returns the perceptual hash of every segment along with it."""
+        loop = asyncio.get_running_loop()
+        image_digest = hashlib.blake2b(image, digest_size=16).hexdigest()
+        if self._last_image is not None and self._last_image[0] == image_digest:
+            return list(self._last_image[1]), self._last_image[2]
+
+        async with self._pending():
+            decoded = await loop.run_in_executor(self.executor(), self._decode, image)
+
+        width, img_height = decoded.size
+        num_segments = min((img_height + self.segment_height - 1) // self.segment_height, self.max_segments)
+        boxes = [
+            (0, i * self.segment_height, width, min((i + 1) * self.segment_height, img_height))
+            for i in range(num_segments)
+        ]
+
+        encoded = await asyncio.gather(*(self._encode_segment(decoded, box) for box in boxes))
+        segments = [{"type": "image_url", "image_url": {"url": url}} for url, _ in encoded]
+        hashes = tuple(segment_hash for _, segment_hash in encoded)
+        self._last_image = (image_digest, segments, hashes)
+        return list(segments), hashes
+
+    async def _encode_segment(self, image: Image.Image, box: tuple[int, int, int, int]) -> EncodedSegment:
+        async with self._pending():
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor(), self._crop_and_encode, image, box
+            )
+
+    @staticmethod
+    def _decode(image: bytes) -> Image.Image:
+        # Fully decoded up front so segments can be cropped from several threads at once
+        decoded = Image.open(io.BytesIO(image))
+        decoded.load()
+        return decoded
+
+    def _crop_and_encode(self, image: Image.Image, box: tuple[int, int, int, int]) -> EncodedSegment:
+        segment = image.crop(box)
+        if self.image_format == ScreenshotFormat.JPEG and segment.mode != "RGB":
+            segment = segment.convert("RGB")
+
+        digest = hashlib.blake2b(segment.tobytes(), digest_size=16)
+        digest.update(f"{segment.mode}:{segment.size}:{self.image_format}:{self.quality}".encode())
+        key = digest.hexdigest()
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        buffered = io.BytesIO()
+        save_kwargs = {"quality": self.quality} if self.quality and self.image_format != ScreenshotFormat.PNG else {}
+        segment.save(buffered, format=self.image_format.upper(), **save_kwargs)
+        url = f"data:image/{self.image_format};base64,{base64.b64encode(buffered.getvalue()).decode('utf-8')}"
+        encoded = (url, perceptual_hash(segment))
+        self.cache.put(key, encoded)
+        return encoded
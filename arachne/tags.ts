@@ -1,13 +1,57 @@
 // noinspection JSUnusedGlobalSymbols
 interface Window {
   tagifyWebpage: (tagLeafTexts?: boolean) => { [key: number]: string };
+  tagifyWebpageIncremental: (tagLeafTexts?: boolean) => TagDelta;
+  getTaggedElement: (id: number) => HTMLElement | null;
+  getDomDigest: () => string;
+  getTextAnnotations: () => TextAnnotation[];
+  applyActions: (actions: BatchAction[]) => BatchActionResult[];
   removeTags: () => void;
   hideNonTagElements: () => void;
   revertVisibilities: () => void;
 }
 
+interface TagDelta {
+  // True when ids were assigned from scratch and the previous id -> xpath map must be discarded
+  reset: boolean;
+  // Ids that are new or whose xpath changed since the previous call
+  changed: { [key: number]: string };
+  removed: number[];
+}
+
+interface BatchAction {
+  id: number;
+  type: "input_text" | "select_option" | "checkbox";
+  text?: string | null;
+  option?: {
+    label?: string | null;
+    value?: string | null;
+    index?: number | null;
+  } | null;
+  checked?: boolean | null;
+}
+
+interface BatchActionResult {
+  success: boolean;
+  error?: string;
+  // The value has to be typed key by key, synthetic events did not set it
+  needsTyping?: boolean;
+}
+
+interface TextAnnotation {
+  // Same shape as an OCR annotation, so text_format.format_text can lay it out
+  text: string;
+  midpoint: [number, number];
+  midpoint_normalized: [number, number];
+  width: number;
+  height: number;
+}
+
 const arachneId = "__arachne_id";
 const arachneSelector = `#${arachneId}`;
+
+// Elements tagged by the last full tagifyWebpage call, by id
+let taggedElements = new Map<number, HTMLElement>();
 const reworkdVisibilityAttr = "reworkd-original-visibility";
 
 const elIsClean = (el: HTMLElement) => {
@@ -94,63 +138,120 @@ function isElementInViewport(el: HTMLElement) {
   );
 }
 
-function getElementXPath(element: HTMLElement | null) {
-  let path_parts = [];
-
-  let iframe_str = "";
-  if (element && element.ownerDocument !== window.document) {
-    // assert element.iframe_index !== undefined, "Element is not in the main document and does not have an iframe_index attribute";
-    iframe_str = `iframe[${element.getAttribute("iframe_index")}]`;
-  }
+interface XPathNode {
+  // Path from the root element, without the leading "//"
+  path: string;
+  // Offset of this element's own segment in path
+  start: number;
+  depth: number;
+  parent: XPathNode | null;
+  // Nearest ancestor-or-self that has an id
+  idAncestor: XPathNode | null;
+}
 
-  while (element) {
-    if (!element.tagName) {
-      element = element.parentNode as HTMLElement | null;
-      continue;
+function createXPathBuilder(): (element: HTMLElement) => string {
+  /*
+  Builds xpaths for many elements of the same DOM. Every ancestor's path is
+  computed once, top down, and shared by all of its descendants. Sibling indices
+  are computed once per parent, in a single pass over its children.
+  */
+  const nodes = new Map<Element, XPathNode>();
+  const segments = new Map<Element, string>();
+  const indexedParents = new Set<Node>();
+
+  const indexChildren = (parent: ParentNode & Node) => {
+    const children = Array.from(parent.children);
+    const totals = new Map<string, number>();
+    for (let child of children) {
+      totals.set(child.tagName, (totals.get(child.tagName) || 0) + 1);
     }
 
-    let prefix = element.tagName.toLowerCase();
-    let sibling_index = 1;
+    const seen = new Map<string, number>();
+    for (let child of children) {
+      const siblingIndex = (seen.get(child.tagName) || 0) + 1;
+      seen.set(child.tagName, siblingIndex);
 
-    let sibling = element.previousElementSibling;
-    while (sibling) {
-      if (sibling.tagName === element.tagName) {
-        sibling_index++;
+      let prefix = child.tagName.toLowerCase();
+      if ((totals.get(child.tagName) as number) > 1) {
+        prefix += `[${siblingIndex}]`;
       }
-      sibling = sibling.previousElementSibling;
-    }
-
-    // Check next siblings to determine if index should be added
-    let nextSibling = element.nextElementSibling;
-    let shouldAddIndex = false;
-    while (nextSibling) {
-      if (nextSibling.tagName === element.tagName) {
-        shouldAddIndex = true;
-        break;
+      if (child.id) {
+        prefix += `[@id="${child.id}"]`;
+      } else if (child.className) {
+        prefix += `[@class="${child.className}"]`;
       }
-      nextSibling = nextSibling.nextElementSibling;
+      segments.set(child, prefix);
+    }
+    indexedParents.add(parent);
+  };
+
+  const getSegment = (element: Element): string => {
+    const parent = element.parentNode as (ParentNode & Node) | null;
+    if (!parent) {
+      let prefix = element.tagName.toLowerCase();
+      if (element.id) prefix += `[@id="${element.id}"]`;
+      else if (element.className) prefix += `[@class="${element.className}"]`;
+      return prefix;
+    }
+    if (!indexedParents.has(parent)) indexChildren(parent);
+    return segments.get(element) as string;
+  };
+
+  const getParentElement = (element: Element): Element | null => {
+    let node = element.parentNode;
+    while (node && !(node as Element).tagName) node = node.parentNode;
+    return node as Element | null;
+  };
+
+  const getNode = (element: Element): XPathNode => {
+    // Walk up to the closest ancestor that already has a path, then fill in the paths top down
+    const chain: Element[] = [];
+    let current: Element | null = element;
+    while (current && !nodes.has(current)) {
+      chain.push(current);
+      current = getParentElement(current);
     }
 
-    if (sibling_index > 1 || shouldAddIndex) {
-      prefix += `[${sibling_index}]`;
+    let parent = current ? (nodes.get(current) as XPathNode) : null;
+    for (let i = chain.length - 1; i >= 0; i--) {
+      const segment = getSegment(chain[i]);
+      const node: XPathNode = {
+        path: parent ? `${parent.path}/${segment}` : segment,
+        start: parent ? parent.path.length + 1 : 0,
+        depth: parent ? parent.depth + 1 : 1,
+        parent,
+        idAncestor: null,
+      };
+      node.idAncestor = chain[i].id ? node : parent ? parent.idAncestor : null;
+      nodes.set(chain[i], node);
+      parent = node;
     }
+    return nodes.get(element) as XPathNode;
+  };
 
-    if (element.id) {
-      prefix += `[@id="${element.id}"]`;
+  return (element: HTMLElement) => {
+    const node = getNode(element);
 
-      // If the id is unique and we have enough path parts, we can stop
-      if (path_parts.length > 3) {
-        path_parts.unshift(prefix);
-        return "//" + path_parts.join("/");
-      }
-    } else if (element.className) {
-      prefix += `[@class="${element.className}"]`;
+    // If an ancestor at least four levels up has an id, it is unique enough to anchor the path
+    let anchor = node.idAncestor;
+    while (anchor && node.depth - anchor.depth <= 3) {
+      anchor = anchor.parent ? anchor.parent.idAncestor : null;
+    }
+    if (anchor) {
+      return "//" + node.path.substring(anchor.start);
     }
 
-    path_parts.unshift(prefix);
-    element = element.parentNode as HTMLElement | null;
-  }
-  return iframe_str + "//" + path_parts.join("/");
+    let iframe_str = "";
+    if (element.ownerDocument !== window.document) {
+      // assert element.iframe_index !== undefined, "Element is not in the main document and does not have an iframe_index attribute";
+      iframe_str = `iframe[${element.getAttribute("iframe_index")}]`;
+    }
+    return iframe_str + "//" + node.path;
+  };
+}
+
+function getElementXPath(element: HTMLElement) {
+  return createXPathBuilder()(element);
 }
 
 function create_tagged_span(idNum: number, el: HTMLElement) {
@@ -195,6 +296,7 @@ function create_tagged_span(idNum: number, el: HTMLElement) {
 
 window.tagifyWebpage = (tagLeafTexts = false) => {
   window.removeTags();
+  disposeTagRegistry();
   hideMapElements();
 
   const allElements = getAllElementsInAllFrames();
@@ -269,29 +371,61 @@ function removeNestedTags(elementsToTag: HTMLElement[]): HTMLElement[] {
   // Most commonly, the text will be tagged alongside the interactable element
   // In this case there is only one child, and we should remove this nested tag
   // In other cases, we will allow for the nested tagging
+  //
+  // elementsToTag is in document order, so every tagged descendant comes after its tagged ancestors.
+  // Each tagged element is linked to its nearest tagged ancestor and descendant counts are summed
+  // in reverse order, which keeps this linear in the size of the DOM.
+
+  const tagged = new Set<Element>(elementsToTag);
+
+  // Nearest tagged ancestor of untagged nodes already walked, so no node is walked twice
+  const nearestTagged = new WeakMap<Element, HTMLElement | null>();
+  const findNearestTaggedAncestor = (el: HTMLElement): HTMLElement | null => {
+    const path: Element[] = [];
+    let node = el.parentElement;
+    let found: HTMLElement | null = null;
+    while (node) {
+      if (tagged.has(node)) {
+        found = node as HTMLElement;
+        break;
+      }
+      const cached = nearestTagged.get(node);
+      if (cached !== undefined) {
+        found = cached;
+        break;
+      }
+      path.push(node);
+      node = node.parentElement;
+    }
+    for (let visited of path) nearestTagged.set(visited, found);
+    return found;
+  };
+
+  const taggedAncestors = elementsToTag.map(findNearestTaggedAncestor);
+  const descendantCount = new Map<HTMLElement, number>();
+  const lastTaggedChild = new Map<HTMLElement, HTMLElement>();
+  for (let i = elementsToTag.length - 1; i >= 0; i--) {
+    const ancestor = taggedAncestors[i];
+    if (!ancestor) continue;
+
+    const el = elementsToTag[i];
+    descendantCount.set(
+      ancestor,
+      (descendantCount.get(ancestor) || 0) + 1 + (descendantCount.get(el) || 0),
+    );
+    lastTaggedChild.set(ancestor, el);
+  }
 
-  const res = [...elementsToTag];
-  elementsToTag.map((el) => {
+  const nestedTags = new Set<HTMLElement>();
+  for (let el of elementsToTag) {
     // Only interactable elements can have nested tags
-    if (isInteractable(el)) {
-      const elementsToRemove: HTMLElement[] = [];
-      el.querySelectorAll("*").forEach((child) => {
-        const index = res.indexOf(child as HTMLElement);
-        if (index > -1) {
-          elementsToRemove.push(child as HTMLElement);
-        }
-      });
-
-      // Only remove nested tags if there is only a single element to remove
-      if (elementsToRemove.length == 1) {
-        for (let element of elementsToRemove) {
-          res.splice(res.indexOf(element), 1);
-        }
-      }
+    // Only remove nested tags if there is only a single element to remove
+    if (isInteractable(el) && descendantCount.get(el) === 1) {
+      nestedTags.add(lastTaggedChild.get(el) as HTMLElement);
     }
-  });
+  }
 
-  return res;
+  return elementsToTag.filter((el) => !nestedTags.has(el));
 }
 
 function insertTags(
@@ -299,49 +433,422 @@ function insertTags(
   tagLeafTexts: boolean,
 ): { [key: number]: string } {
   const idToXpath: { [key: number]: string } = {};
+  const getXPath = createXPathBuilder();
+  const tagsToInsert: [number, HTMLElement, ChildNode | null][] = [];
+  taggedElements = new Map();
 
   let idNum = 0;
   for (let el of elementsToTag) {
-    idToXpath[idNum] = getElementXPath(el);
-
-    let idSpan = create_tagged_span(idNum, el);
+    idToXpath[idNum] = getXPath(el);
 
     if (isInteractable(el)) {
-      if (isTextInsertable(el) && el.parentElement) {
-        el.parentElement.insertBefore(idSpan, el);
-      } else {
-        el.prepend(idSpan);
-      }
+      tagsToInsert.push([idNum, el, null]);
+      taggedElements.set(idNum, el);
       idNum++;
     } else if (tagLeafTexts) {
       for (let child of Array.from(el.childNodes).filter(
         isNonWhiteSpaceTextNode,
       )) {
-        let idSpan = create_tagged_span(idNum, el);
-        el.insertBefore(idSpan, child);
+        tagsToInsert.push([idNum, el, child]);
+        taggedElements.set(idNum, el);
         idNum++;
       }
     }
   }
 
+  // Insert the tags once every xpath is built, so no xpath counts a tag span as a sibling
+  for (let [id, el, textNode] of tagsToInsert) {
+    insertTagSpan(id, el, textNode);
+  }
+
   return idToXpath;
 }
 
+function insertTagSpan(
+  idNum: number,
+  el: HTMLElement,
+  textNode: ChildNode | null,
+) {
+  const idSpan = create_tagged_span(idNum, el);
+  if (textNode) {
+    el.insertBefore(idSpan, textNode);
+  } else if (isTextInsertable(el) && el.parentElement) {
+    el.parentElement.insertBefore(idSpan, el);
+  } else {
+    el.prepend(idSpan);
+  }
+}
+
+/*
+Incremental tagging
+
+A MutationObserver records which subtrees changed since the previous call. Only
+those subtrees are walked again, so the cost of a step scales with what changed
+rather than with the size of the page. Elements that persist keep their id
+across steps and only the delta of the id -> xpath map is returned.
+*/
+interface TagRegistryEntry {
+  el: HTMLElement;
+  // Set for leaf text tags, which are keyed on the text node rather than on the element
+  textNode: ChildNode | null;
+  xpath: string;
+}
+
+interface TagRegistry {
+  tagLeafTexts: boolean;
+  nextId: number;
+  entries: Map<number, TagRegistryEntry>;
+  idByNode: WeakMap<Node, number>;
+  dirtyRoots: Set<Element>;
+  // Elements whose subtree may have new xpaths: a class or id changed, or same tag siblings were added or removed
+  xpathRoots: Set<Element>;
+  needsFullScan: boolean;
+  frameDocuments: (Document | null)[];
+  observer: MutationObserver;
+}
+
+// Attributes that can change whether an element is visible or interactable, or its xpath
+const observedAttributes = [
+  "id",
+  "class",
+  "style",
+  "hidden",
+  "disabled",
+  "type",
+  "role",
+  "open",
+];
+
+let tagRegistry: TagRegistry | null = null;
+
+const isArachneTag = (node: Node | null) =>
+  !!node &&
+  node.nodeType === Node.ELEMENT_NODE &&
+  (node as HTMLElement).id === arachneId;
+
+function getFrameDocuments(): (Document | null)[] {
+  const iframes = document.getElementsByTagName("iframe");
+  const frameDocuments: (Document | null)[] = [];
+  for (let i = 0; i < iframes.length; i++) {
+    try {
+      const frame = iframes[i];
+      frameDocuments.push(
+        frame.contentDocument || frame.contentWindow?.document || null,
+      );
+    } catch (e) {
+      frameDocuments.push(null);
+    }
+  }
+  return frameDocuments;
+}
+
+function createTagRegistry(tagLeafTexts: boolean): TagRegistry {
+  const registry: TagRegistry = {
+    tagLeafTexts,
+    nextId: 0,
+    entries: new Map(),
+    idByNode: new WeakMap(),
+    dirtyRoots: new Set(),
+    xpathRoots: new Set(),
+    needsFullScan: false,
+    frameDocuments: getFrameDocuments(),
+    observer: new MutationObserver((records) =>
+      recordMutations(registry, records),
+    ),
+  };
+
+  const options: MutationObserverInit = {
+    subtree: true,
+    childList: true,
+    characterData: true,
+    attributes: true,
+    attributeFilter: observedAttributes,
+  };
+  registry.observer.observe(document, options);
+  for (let frameDocument of registry.frameDocuments) {
+    if (frameDocument) registry.observer.observe(frameDocument, options);
+  }
+
+  return registry;
+}
+
+function disposeTagRegistry() {
+  if (tagRegistry) {
+    tagRegistry.observer.disconnect();
+    tagRegistry = null;
+  }
+}
+
+function recordMutations(registry: TagRegistry, records: MutationRecord[]) {
+  for (let record of records) {
+    if (record.type === "attributes") {
+      if (!isArachneTag(record.target)) {
+        registry.dirtyRoots.add(record.target as Element);
+        if (record.attributeName === "id" || record.attributeName === "class") {
+          registry.xpathRoots.add(record.target as Element);
+        }
+      }
+    } else if (record.type === "characterData") {
+      const parent = record.target.parentElement;
+      if (parent && !isArachneTag(parent)) registry.dirtyRoots.add(parent);
+    } else {
+      record.addedNodes.forEach((node) => {
+        if (isArachneTag(node)) return;
+        if (node.nodeType === Node.ELEMENT_NODE) {
+          const el = node as Element;
+          if (el.tagName === "IFRAME" || el.querySelector("iframe")) {
+            registry.needsFullScan = true;
+          }
+          registry.dirtyRoots.add(el);
+        } else if (record.target.nodeType === Node.ELEMENT_NODE) {
+          registry.dirtyRoots.add(record.target as Element);
+        }
+      });
+      // Removed elements are pruned because they are no longer connected, but a removed text node can
+      // turn its parent into an empty element
+      record.removedNodes.forEach((node) => {
+        if (
+          node.nodeType === Node.TEXT_NODE &&
+          record.target.nodeType === Node.ELEMENT_NODE
+        ) {
+          registry.dirtyRoots.add(record.target as Element);
+        }
+      });
+      recordShiftedSiblings(registry, record);
+    }
+  }
+}
+
+function recordShiftedSiblings(registry: TagRegistry, record: MutationRecord) {
+  // Adding or removing an element renumbers its siblings with the same tag, including the ones it leaves in place
+  const tagNames = new Set<string>();
+  for (let nodes of [record.addedNodes, record.removedNodes]) {
+    nodes.forEach((node) => {
+      if (node.nodeType === Node.ELEMENT_NODE && !isArachneTag(node)) {
+        tagNames.add((node as Element).tagName);
+      }
+    });
+  }
+  if (!tagNames.size || record.target.nodeType !== Node.ELEMENT_NODE) return;
+  for (let sibling of Array.from((record.target as Element).children)) {
+    if (tagNames.has(sibling.tagName)) registry.xpathRoots.add(sibling);
+  }
+}
+
+function outermostRoots(roots: Iterable<Element>): Element[] {
+  // Roots that are not inside another root, the others are walked with it
+  const rootSet = new Set(roots);
+  return Array.from(rootSet).filter((root) => {
+    if (!root.isConnected) return false;
+    let ancestor = root.parentElement;
+    while (ancestor && !rootSet.has(ancestor)) {
+      ancestor = ancestor.parentElement;
+    }
+    return !ancestor;
+  });
+}
+
+function framesChanged(registry: TagRegistry): boolean {
+  const frameDocuments = getFrameDocuments();
+  return (
+    frameDocuments.length !== registry.frameDocuments.length ||
+    frameDocuments.some((doc, i) => doc !== registry.frameDocuments[i])
+  );
+}
+
+function getDirtyElements(registry: TagRegistry): HTMLElement[] {
+  const dirtyElements: HTMLElement[] = [];
+  // Whether a tag is nested is decided against its nearest tagged ancestor, so that ancestor is walked too
+  const widenedRoots = Array.from(registry.dirtyRoots, (root) => {
+    let ancestor = root.parentElement;
+    while (ancestor && !registry.idByNode.has(ancestor)) {
+      ancestor = ancestor.parentElement;
+    }
+    return ancestor || root;
+  });
+  for (let root of outermostRoots(widenedRoots)) {
+    // Match the full scan, which only looks below the body of the main document
+    if (root === document.documentElement) root = document.body;
+    if (root.ownerDocument === document && !document.body.contains(root)) {
+      continue;
+    }
+
+    const frameIndex =
+      root.ownerDocument !== document
+        ? registry.frameDocuments.indexOf(root.ownerDocument)
+        : -1;
+    const subtree = [root, ...Array.from(root.querySelectorAll("*"))];
+    for (let el of subtree as HTMLElement[]) {
+      if (isArachneTag(el) || el === document.body) continue;
+      if (frameIndex > -1)
+        el.setAttribute("iframe_index", frameIndex.toString());
+      dirtyElements.push(el);
+    }
+  }
+  return dirtyElements;
+}
+
+function getEntriesUnder(registry: TagRegistry, roots: Set<Element>): number[] {
+  const ids: number[] = [];
+  const addId = (node: Node) => {
+    const id = registry.idByNode.get(node);
+    if (id !== undefined) ids.push(id);
+  };
+  for (let root of outermostRoots(roots)) {
+    for (let el of [root, ...Array.from(root.querySelectorAll("*"))]) {
+      addId(el);
+      // Leaf text tags are keyed on their text node
+      el.childNodes.forEach((child) => {
+        if (child.nodeType === Node.TEXT_NODE) addId(child);
+      });
+    }
+  }
+  return ids;
+}
+
+function registerTag(
+  registry: TagRegistry,
+  el: HTMLElement,
+  textNode: ChildNode | null,
+  changed: { [key: number]: string },
+  getXPath: (element: HTMLElement) => string,
+) {
+  const node = textNode || el;
+  if (registry.idByNode.has(node)) return;
+
+  const id = registry.nextId++;
+  const xpath = getXPath(el);
+  registry.entries.set(id, { el, textNode, xpath });
+  registry.idByNode.set(node, id);
+  changed[id] = xpath;
+}
+
+function unregisterTag(registry: TagRegistry, id: number, removed: number[]) {
+  const entry = registry.entries.get(id);
+  if (!entry) return;
+  registry.entries.delete(id);
+  registry.idByNode.delete(entry.textNode || entry.el);
+  removed.push(id);
+}
+
+window.tagifyWebpageIncremental = (tagLeafTexts = false) => {
+  // Mutations made right before this call have not been delivered to the observer yet
+  if (tagRegistry) {
+    recordMutations(tagRegistry, tagRegistry.observer.takeRecords());
+  }
+  window.removeTags();
+  hideMapElements();
+  // Removing the tags and hiding the maps is not a change of the page
+  tagRegistry?.observer.takeRecords();
+
+  let reset = false;
+  if (
+    !tagRegistry ||
+    tagRegistry.tagLeafTexts !== tagLeafTexts ||
+    tagRegistry.needsFullScan ||
+    framesChanged(tagRegistry)
+  ) {
+    disposeTagRegistry();
+    tagRegistry = createTagRegistry(tagLeafTexts);
+    reset = true;
+  }
+  const registry = tagRegistry;
+
+  const scannedElements = reset
+    ? getAllElementsInAllFrames()
+    : getDirtyElements(registry);
+  registry.dirtyRoots.clear();
+
+  const elementsToTag = removeNestedTags(
+    getElementsToTag(scannedElements, tagLeafTexts),
+  );
+  const taggedSet = new Set(elementsToTag);
+
+  const changed: { [key: number]: string } = {};
+  const removed: number[] = [];
+  const getXPath = createXPathBuilder();
+
+  // Drop tags whose element left the page or was re-evaluated as no longer worth tagging
+  const scannedSet = new Set(scannedElements);
+  for (let [id, entry] of registry.entries) {
+    const gone = entry.textNode
+      ? !entry.textNode.isConnected ||
+        entry.textNode.parentNode !== entry.el ||
+        !isNonWhiteSpaceTextNode(entry.textNode)
+      : !entry.el.isConnected;
+    if (gone || (scannedSet.has(entry.el) && !taggedSet.has(entry.el))) {
+      unregisterTag(registry, id, removed);
+    }
+  }
+
+  for (let el of elementsToTag) {
+    if (isInteractable(el)) {
+      registerTag(registry, el, null, changed, getXPath);
+    } else if (tagLeafTexts) {
+      for (let child of Array.from(el.childNodes).filter(
+        isNonWhiteSpaceTextNode,
+      )) {
+        registerTag(registry, el, child, changed, getXPath);
+      }
+    }
+  }
+
+  // Xpaths of persisting elements change with the class or id of an ancestor, or when same tag siblings of an
+  // ancestor are added or removed. Only the entries below those elements are checked again.
+  for (let id of getEntriesUnder(registry, registry.xpathRoots)) {
+    const entry = registry.entries.get(id);
+    if (!entry || id in changed) continue;
+    const xpath = getXPath(entry.el);
+    if (xpath !== entry.xpath) {
+      entry.xpath = xpath;
+      changed[id] = xpath;
+    }
+  }
+  registry.xpathRoots.clear();
+
+  for (let [id, entry] of registry.entries) {
+    insertTagSpan(id, entry.el, entry.textNode);
+  }
+  absolutelyPositionMissingTags();
+  // Inserting the tags is not a change of the page either
+  registry.observer.takeRecords();
+
+  return { reset, changed, removed };
+};
+
 function absolutelyPositionMissingTags() {
   /*
   Some tags don't get displayed on the page properly
   This occurs if the parent element children are disjointed from the parent
   In this case, we absolutely position the tag to the parent element
+
+  Layout is read and written in separate batched passes so the browser lays the
+  page out a fixed number of times instead of once per tag pair
   */
   const distanceThreshold = 500;
 
-  const tags: NodeListOf<HTMLElement> =
-    document.querySelectorAll(arachneSelector);
-  tags.forEach((tag) => {
+  const tags: HTMLElement[] = Array.from(
+    document.querySelectorAll(arachneSelector),
+  );
+
+  // Read pass: where every tag and its parent currently are
+  const placements = tags.map((tag) => {
     const parent = tag.parentElement as HTMLElement;
-    const parentRect = parent.getBoundingClientRect();
-    let tagRect = tag.getBoundingClientRect();
+    return {
+      tag,
+      parent,
+      parentRect: parent.getBoundingClientRect(),
+      tagRect: tag.getBoundingClientRect(),
+      isClean: elIsClean(tag),
+    };
+  });
+  const pageHeight = Math.max(
+    window.innerHeight,
+    document.documentElement.scrollHeight,
+  );
 
+  // Write pass: detach the tags that drifted away from their parent
+  for (let { tag, parent, parentRect, tagRect, isClean } of placements) {
     const parentCenter = {
       x: (parentRect.left + parentRect.right) / 2,
       y: (parentRect.top + parentRect.bottom) / 2,
@@ -354,7 +861,7 @@ function absolutelyPositionMissingTags() {
 
     const dx = Math.abs(parentCenter.x - tagCenter.x);
     const dy = Math.abs(parentCenter.y - tagCenter.y);
-    if (dx > distanceThreshold || dy > distanceThreshold || !elIsClean(tag)) {
+    if (dx > distanceThreshold || dy > distanceThreshold || !isClean) {
       tag.style.position = "absolute";
 
       // Ensure the tag is positioned within the screen bounds
@@ -369,8 +876,7 @@ function absolutelyPositionMissingTags() {
       let topPosition = Math.max(0, parentRect.top + 3); // Add some top buffer to center align better
       topPosition = Math.min(
         topPosition,
-        Math.max(window.innerHeight, document.documentElement.scrollHeight) -
-          (tagRect.bottom - tagRect.top),
+        pageHeight - (tagRect.bottom - tagRect.top),
       );
 
       tag.style.left = `${leftPosition}px`;
@@ -379,39 +885,490 @@ function absolutelyPositionMissingTags() {
       parent.removeChild(tag);
       document.body.appendChild(tag);
     }
+  }
 
-    tags.forEach((otherTag) => {
-      if (tag === otherTag) return;
-      let otherTagRect = otherTag.getBoundingClientRect();
+  // Read pass: final rects and font sizes
+  const rects = tags.map((tag) => tag.getBoundingClientRect());
+  const fontSizes = tags.map((tag) =>
+    parseFloat(window.getComputedStyle(tag).fontSize.split("px")[0]),
+  );
 
-      // reduce font of this tag and other tag until they don't overlap
-      let fontSize = parseFloat(
-        window.getComputedStyle(tag).fontSize.split("px")[0],
-      );
-      let otherFontSize = parseFloat(
-        window.getComputedStyle(otherTag).fontSize.split("px")[0],
-      );
+  // Reduce the font of overlapping tags until they don't overlap
+  const scales = resolveTagOverlaps(rects);
+
+  // Write pass: apply the reduced font sizes
+  const minFontSize = 7;
+  tags.forEach((tag, i) => {
+    if (scales[i] >= 1 || fontSizes[i] <= minFontSize) return;
+    // Shrink in 0.5px steps, like the font sizes tags were given before
+    const fontSize = Math.max(
+      minFontSize,
+      Math.floor(fontSizes[i] * scales[i] * 2) / 2,
+    );
+    tag.style.fontSize = `${fontSize}px`;
+  });
+}
 
-      while (
-        tagRect.left < otherTagRect.right &&
-        tagRect.right > otherTagRect.left &&
-        tagRect.top < otherTagRect.bottom &&
-        tagRect.bottom > otherTagRect.top &&
-        fontSize > 7 &&
-        otherFontSize > 7
-      ) {
-        fontSize -= 0.5;
-        otherFontSize -= 0.5;
-        tag.style.fontSize = `${fontSize}px`;
-        otherTag.style.fontSize = `${otherFontSize}px`;
+function resolveTagOverlaps(rects: DOMRect[]): number[] {
+  /*
+  Returns the factor each tag's font should be scaled by so that no two tags
+  overlap. Tags shrink towards their top left corner, so a pair stops
+  overlapping once either axis is separated. Candidate pairs come from a uniform
+  grid, which keeps this close to linear for tags spread over the page.
+  */
+  const cellSize = 64;
+  const maxCellsPerTag = 64;
+  const scales = rects.map(() => 1);
+  const grid = new Map<string, number[]>();
+
+  rects.forEach((rect, i) => {
+    if (rect.width === 0 || rect.height === 0) return;
+    const left = Math.floor(rect.left / cellSize);
+    const right = Math.floor(rect.right / cellSize);
+    const top = Math.floor(rect.top / cellSize);
+    const bottom = Math.floor(rect.bottom / cellSize);
+    if ((right - left + 1) * (bottom - top + 1) > maxCellsPerTag) return;
+
+    for (let x = left; x <= right; x++) {
+      for (let y = top; y <= bottom; y++) {
+        const key = `${x},${y}`;
+        const cell = grid.get(key);
+        if (cell) cell.push(i);
+        else grid.set(key, [i]);
+      }
+    }
+  });
+
+  const separatingScale = (
+    start: number,
+    otherStart: number,
+    size: number,
+    otherSize: number,
+  ) =>
+    start <= otherStart
+      ? (otherStart - start) / size
+      : (start - otherStart) / otherSize;
+
+  for (let [key, cell] of grid) {
+    const [x, y] = key.split(",").map(Number);
+    for (let a = 0; a < cell.length; a++) {
+      for (let b = a + 1; b < cell.length; b++) {
+        const i = cell[a];
+        const j = cell[b];
+        const rect = rects[i];
+        const other = rects[j];
+        const overlaps =
+          rect.left < other.right &&
+          rect.right > other.left &&
+          rect.top < other.bottom &&
+          rect.bottom > other.top;
+        if (!overlaps) continue;
+
+        // Only handle a pair in the cell holding the top left corner of the overlap, so it is handled once
+        if (
+          Math.floor(Math.max(rect.left, other.left) / cellSize) !== x ||
+          Math.floor(Math.max(rect.top, other.top) / cellSize) !== y
+        ) {
+          continue;
+        }
 
-        tagRect = tag.getBoundingClientRect();
-        otherTagRect = otherTag.getBoundingClientRect();
+        const scale = Math.max(
+          separatingScale(rect.left, other.left, rect.width, other.width),
+          separatingScale(rect.top, other.top, rect.height, other.height),
+        );
+        scales[i] = Math.min(scales[i], scale);
+        scales[j] = Math.min(scales[j], scale);
       }
+    }
+  }
+
+  return scales;
+}
+
+window.getTaggedElement = (id: number) => {
+  // Tags are usually removed before acting, but the elements they were attached to are still referenced here
+  const el = tagRegistry
+    ? tagRegistry.entries.get(id)?.el
+    : taggedElements.get(id);
+  return el && el.isConnected ? el : null;
+};
+
+window.getDomDigest = () => {
+  // FNV-1a over what a screenshot of the page shows: url, scroll position, visible text and form state
+  let hash = 0x811c9dc5;
+  const update = (value: string) => {
+    for (let i = 0; i < value.length; i++) {
+      hash ^= value.charCodeAt(i);
+      hash = Math.imul(hash, 0x01000193);
+    }
+    hash ^= 0xff;
+    hash = Math.imul(hash, 0x01000193);
+  };
+
+  update(window.location.href);
+  const { scrollX, scrollY, innerWidth, innerHeight } = window;
+  update(`${scrollX},${scrollY},${innerWidth},${innerHeight}`);
+  for (const doc of [document, ...getFrameDocuments()]) {
+    if (!doc) {
+      continue;
+    }
+    update(`${doc.getElementsByTagName("*").length}`);
+    update(doc.body ? doc.body.innerText : "");
+    doc.querySelectorAll("input, textarea, select").forEach((el) => {
+      const input = el as HTMLInputElement;
+      update(`${input.value}|${input.checked}`);
     });
+  }
+  return (hash >>> 0).toString(16).padStart(8, "0");
+};
+
+const textlessTags = ["SCRIPT", "STYLE", "NOSCRIPT", "TEMPLATE", "SVG"];
+const unlabelledInputTypes = [
+  "hidden",
+  "checkbox",
+  "radio",
+  "file",
+  "image",
+  "range",
+  "color",
+];
+
+window.getTextAnnotations = () => {
+  /*
+  The visible text of the page and its same origin frames as OCR style
+  annotations, in page pixels of the top document, without taking a screenshot.
+  Text nodes on a single line become one annotation, text that wraps is split
+  into words so every line gets its own. Form fields contribute their value or
+  placeholder.
+
+  Text is clipped by the ancestors that hide their overflow, its frame and the
+  page, so slides of a carousel or panels translated off screen are left out,
+  and what is only partly shown is cut to the part inside.
+  */
+  const pageWidth = Math.max(
+    document.documentElement.scrollWidth,
+    window.innerWidth,
+  );
+  const pageHeight = Math.max(
+    document.documentElement.scrollHeight,
+    window.innerHeight,
+  );
+  const annotations: TextAnnotation[] = [];
+
+  // Rectangles in page pixels of the top document
+  type Box = { left: number; top: number; right: number; bottom: number };
+  const pageBox: Box = {
+    left: 0,
+    top: 0,
+    right: pageWidth,
+    bottom: pageHeight,
+  };
+  const toBox = (rect: DOMRect, offsetX: number, offsetY: number): Box => ({
+    left: rect.left + offsetX,
+    top: rect.top + offsetY,
+    right: rect.right + offsetX,
+    bottom: rect.bottom + offsetY,
   });
+  const intersect = (a: Box, b: Box): Box => ({
+    left: Math.max(a.left, b.left),
+    top: Math.max(a.top, b.top),
+    right: Math.min(a.right, b.right),
+    bottom: Math.min(a.bottom, b.bottom),
+  });
+
+  const addAnnotation = (text: string, box: Box, clip: Box) => {
+    const shown = intersect(box, clip);
+    const width = shown.right - shown.left;
+    const height = shown.bottom - shown.top;
+    if (width <= 0 || height <= 0) {
+      return;
+    }
+    const x = shown.left + width / 2;
+    const y = shown.top + height / 2;
+    annotations.push({
+      text,
+      midpoint: [x, y],
+      midpoint_normalized: [x / pageWidth, y / pageHeight],
+      width: Math.round(width),
+      height: Math.round(height),
+    });
+  };
+
+  const collect = (
+    doc: Document,
+    offsetX: number,
+    offsetY: number,
+    bounds: Box,
+  ) => {
+    const view = doc.defaultView || window;
+    // Part of the page an element's content can show in, by element
+    const clips = new Map<Element, Box>();
+    const clipOf = (el: Element | null): Box => {
+      if (!el) {
+        return bounds;
+      }
+      const cached = clips.get(el);
+      if (cached) {
+        return cached;
+      }
+      const style = view.getComputedStyle(el);
+      // Fixed elements are placed against the viewport and escape the overflow of their ancestors
+      let clip = style.position === "fixed" ? bounds : clipOf(el.parentElement);
+      // The overflow of the root and the body applies to the viewport, which bounds already is
+      const clipX = style.overflowX !== "visible";
+      const clipY = style.overflowY !== "visible";
+      const isRoot = el === doc.documentElement || el === doc.body;
+      if (!isRoot && (clipX || clipY)) {
+        const box = toBox(el.getBoundingClientRect(), offsetX, offsetY);
+        clip = intersect(clip, {
+          left: clipX ? box.left : -Infinity,
+          top: clipY ? box.top : -Infinity,
+          right: clipX ? box.right : Infinity,
+          bottom: clipY ? box.bottom : Infinity,
+        });
+      }
+      clips.set(el, clip);
+      return clip;
+    };
+    if (!doc.body) {
+      return clipOf;
+    }
+    // Visibility of every element seen so far, an element is visible when it and all its ancestors are
+    const visible = new Map<Element, boolean>();
+    const isVisible = (el: Element | null): boolean => {
+      if (!el) {
+        return true;
+      }
+      const cached = visible.get(el);
+      if (cached !== undefined) {
+        return cached;
+      }
+      const style = view.getComputedStyle(el);
+      const result =
+        !textlessTags.includes(el.tagName.toUpperCase()) &&
+        style.display !== "none" &&
+        style.visibility !== "hidden" &&
+        style.opacity !== "0" &&
+        isVisible(el.parentElement);
+      visible.set(el, result);
+      return result;
+    };
+
+    const range = doc.createRange();
+    const walker = doc.createTreeWalker(doc.body, NodeFilter.SHOW_TEXT);
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+      const textNode = node as Text;
+      const text = textNode.data.replace(/\s+/g, " ").trim();
+      if (
+        !text ||
+        text === "\u200B" ||
+        !isVisible(textNode.parentElement)
+      ) {
+        continue;
+      }
+
+      range.selectNodeContents(textNode);
+      const lineRects = range.getClientRects();
+      const clip = clipOf(textNode.parentElement);
+      if (lineRects.length <= 1) {
+        addAnnotation(
+          text,
+          toBox(range.getBoundingClientRect(), offsetX, offsetY),
+          clip,
+        );
+        continue;
+      }
+      const words = /\S+/g;
+      for (
+        let match = words.exec(textNode.data);
+        match;
+        match = words.exec(textNode.data)
+      ) {
+        range.setStart(textNode, match.index);
+        range.setEnd(textNode, match.index + match[0].length);
+        addAnnotation(
+          match[0],
+          toBox(range.getBoundingClientRect(), offsetX, offsetY),
+          clip,
+        );
+      }
+    }
+
+    doc.body.querySelectorAll("input, textarea, select").forEach((el) => {
+      if (!isVisible(el)) {
+        return;
+      }
+      let text: string;
+      if (el.tagName === "SELECT") {
+        const select = el as HTMLSelectElement;
+        text = select.selectedOptions.length
+          ? select.selectedOptions[0].text
+          : "";
+      } else {
+        const input = el as HTMLInputElement;
+        if (unlabelledInputTypes.includes(input.type)) {
+          return;
+        }
+        text =
+          input.type === "password"
+            ? "*".repeat(input.value.length)
+            : input.value || input.placeholder;
+      }
+      text = text.replace(/\s+/g, " ").trim();
+      if (text) {
+        addAnnotation(
+          text,
+          toBox(el.getBoundingClientRect(), offsetX, offsetY),
+          clipOf(el.parentElement),
+        );
+      }
+    });
+    return clipOf;
+  };
+
+  const topClipOf = collect(document, window.scrollX, window.scrollY, pageBox);
+  const iframes = document.getElementsByTagName("iframe");
+  for (let i = 0; i < iframes.length; i++) {
+    try {
+      const frame = iframes[i];
+      const frameDocument =
+        frame.contentDocument || frame.contentWindow?.document;
+      if (!frameDocument) continue;
+      const frameRect = frame.getBoundingClientRect();
+      const frameX = frameRect.left + frame.clientLeft + window.scrollX;
+      const frameY = frameRect.top + frame.clientTop + window.scrollY;
+      // A frame's content only shows inside the frame, and the frame itself may be clipped
+      const frameBox = intersect(
+        {
+          left: frameX,
+          top: frameY,
+          right: frameX + frame.clientWidth,
+          bottom: frameY + frame.clientHeight,
+        },
+        topClipOf(frame),
+      );
+      collect(frameDocument, frameX, frameY, frameBox);
+    } catch (e) {
+      // Cross origin frames can't be read
+    }
+  }
+
+  // Top to bottom, then left to right, which is the reading order format_text clusters lines in
+  annotations.sort(
+    (a, b) => a.midpoint[1] - b.midpoint[1] || a.midpoint[0] - b.midpoint[0],
+  );
+  return annotations;
+};
+
+const dispatchValueEvents = (el: HTMLElement) => {
+  el.dispatchEvent(new Event("input", { bubbles: true }));
+  el.dispatchEvent(new Event("change", { bubbles: true }));
+};
+
+const setNativeValue = (
+  el: HTMLInputElement | HTMLTextAreaElement,
+  value: string,
+) => {
+  // Frameworks like React track the value through the prototype's setter, assigning el.value directly is ignored
+  const setter = Object.getOwnPropertyDescriptor(
+    Object.getPrototypeOf(el),
+    "value",
+  )?.set;
+  if (setter) {
+    setter.call(el, value);
+  } else {
+    el.value = value;
+  }
+};
+
+function applyAction(action: BatchAction): BatchActionResult {
+  const el = window.getTaggedElement(action.id);
+  if (!el) {
+    return { success: false, error: "element not found" };
+  }
+
+  if (action.type === "input_text") {
+    const text = action.text ?? "";
+    if (el.isContentEditable) {
+      // Rich text editors keep their own model of the content and only update it from key events
+      return { success: false, error: "contenteditable", needsTyping: true };
+    }
+    if (el.tagName !== "INPUT" && el.tagName !== "TEXTAREA") {
+      return { success: false, error: `can't type into a ${el.tagName}` };
+    }
+    const input = el as HTMLInputElement | HTMLTextAreaElement;
+    input.focus();
+    setNativeValue(input, text);
+    dispatchValueEvents(input);
+    input.blur();
+    // Masked inputs and listeners that only handle key events reset or rewrite a value set this way
+    if (input.value !== text) {
+      return {
+        success: false,
+        error: "the input did not keep the value",
+        needsTyping: true,
+      };
+    }
+    return { success: true };
+  }
+
+  if (action.type === "select_option") {
+    if (el.tagName !== "SELECT") {
+      return {
+        success: false,
+        error: `can't select an option of a ${el.tagName}`,
+      };
+    }
+    const select = el as HTMLSelectElement;
+    const options = Array.from(select.options);
+    const option: NonNullable<BatchAction["option"]> = action.option || {};
+    const match =
+      (option.value != null &&
+        options.find((o) => o.value === option.value)) ||
+      (option.label != null &&
+        options.find((o) => o.label.trim() === option.label?.trim())) ||
+      (option.index != null && options[option.index]);
+    if (!match) {
+      return { success: false, error: "option not found" };
+    }
+    select.value = match.value;
+    dispatchValueEvents(select);
+    return { success: true };
+  }
+
+  if (action.type === "checkbox") {
+    // Tags are often on the label or a wrapper of the checkbox
+    const input = (
+      el.tagName === "INPUT"
+        ? el
+        : el.querySelector("input[type=checkbox], input[type=radio]")
+    ) as HTMLInputElement | null;
+    if (!input) {
+      return { success: false, error: "checkbox not found" };
+    }
+    if (input.checked !== !!action.checked) {
+      // A click runs the page's own handlers, which setting checked would not
+      input.click();
+    }
+    return input.checked === !!action.checked
+      ? { success: true }
+      : { success: false, error: "checkbox state did not change" };
+  }
+
+  return { success: false, error: `unsupported action ${action.type}` };
 }
 
+window.applyActions = (actions: BatchAction[]) => {
+  // Applied in order in one call, an action that fails does not stop the ones after it
+  return actions.map((action) => {
+    try {
+      return applyAction(action);
+    } catch (e) {
+      return { success: false, error: String(e) };
+    }
+  });
+};
+
 window.removeTags = () => {
   const tags = document.querySelectorAll(arachneSelector);
   tags.forEach((tag) => tag.remove());
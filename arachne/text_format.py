@@ -1,93 +1,33 @@
 import math
 import statistics
-from collections import defaultdict
 from typing import Dict, List
 
 from arachne.ocr import ImageAnnotatorResponse
 from arachne.ocr.types import ImageAnnotation
 
 
-def format_text(ocr_text: ImageAnnotatorResponse) -> str:
-    # Cluster tokens by line
-    line_cluster: Dict[float, List[ImageAnnotation]] = defaultdict(list)
-    for annotation in ocr_text:
-        if (
-            len(line_cluster.keys())
-            and abs(annotation["midpoint"][1] - list(line_cluster.keys())[-1]) < 10
-        ):  # within 10px of the last line
-            line_cluster[list(line_cluster.keys())[-1]].append(annotation)
-        else:
-            line_cluster[annotation["midpoint"][1]].append(annotation)
-    canvas_height = len(line_cluster)
-
-    default_canvas_width = 80  # Default canvas width
-
-    # Ensure line_cluster is not empty before proceeding
-    if line_cluster:
-        canvas_width = int(
-            max(
-                [
-                    max(
-                        (
-                            sum(len(token["text"]) + 1 for token in line)
-                            for line in line_cluster.values()
-                        ),
-                        default=default_canvas_width,
-                    ),
-                    max(
-                        (
-                            canvas_height
-                            * (
-                                annotation["midpoint"][0]
-                                / annotation["midpoint_normalized"][0]
-                                if annotation["midpoint_normalized"][0] != 0
-                                else default_canvas_width
-                            )
-                            / (
-                                annotation["midpoint"][1]
-                                / annotation["midpoint_normalized"][1]
-                                if annotation["midpoint_normalized"][1] != 0
-                                else default_canvas_width
-                            )
-                            for line in line_cluster.values()
-                            for annotation in line
-                        ),
-                        default=default_canvas_width,
-                    ),
-                    max(
-                        (
-                            max(
-                                (
-                                    len(annotation["text"])
-                                    / (1 - annotation["midpoint_normalized"][0])
-                                    if annotation["midpoint_normalized"][0] != 1
-                                    else len(annotation["text"])
-                                )
-                                for annotation in line
-                            )
-                            for line in line_cluster.values()
-                        ),
-                        default=default_canvas_width,
-                    ),
-                ]
-            )
-        )
-    else:
-        canvas_width = default_canvas_width
+DEFAULT_CANVAS_WIDTH = 80
+LINE_TOLERANCE = 10  # px between a token's midpoint and the line it joins
+LETTER_HEIGHT = 30
+EMPTY_SPACE_HEIGHT = LETTER_HEIGHT + 5
 
-    # Create an empty canvas (list of lists filled with spaces)
-    canvas = [[" " for _ in range(canvas_width)] for _ in range(canvas_height)]
 
-    letter_height = 30
-    empty_space_height = letter_height + 5
-    max_previous_line_height = empty_space_height
+def format_text(ocr_text: ImageAnnotatorResponse) -> str:
+    """
+    Lays OCR annotations out as plain text, keeping their rough position on the page.
 
-    # Place the annotations on the canvas
-    i = 0
-    for y, line_annotations in line_cluster.items():
+    Annotations are clustered into lines in input order: a token joins the most recently started line when its
+    midpoint is within `LINE_TOLERANCE` px of it. The canvas width is derived from the widest line and the
+    annotations' positions, and every line is written into its row as one string.
+    """
+    line_cluster = _cluster_lines(ocr_text)
+    canvas_width = _canvas_width(line_cluster) if line_cluster else DEFAULT_CANVAS_WIDTH
+
+    rows: List[str] = []
+    max_previous_line_height = EMPTY_SPACE_HEIGHT
+    for line_annotations in line_cluster.values():
         # Sort annotations in this line by x coordinate
         line_annotations.sort(key=lambda e: e["midpoint_normalized"][0])
-        # grouped_line_annotations = line_annotations
         grouped_line_annotations = group_words_in_sentence(line_annotations)
 
         # Use the TOP height of the letter
@@ -96,12 +36,10 @@ def format_text(ocr_text: ImageAnnotatorResponse) -> str:
             for annotation in grouped_line_annotations
         )
         height_to_add = math.floor(
-            (max_line_height - max_previous_line_height) // empty_space_height
+            (max_line_height - max_previous_line_height) // EMPTY_SPACE_HEIGHT
         )
         if height_to_add > 0:
-            for _ in range(height_to_add):
-                canvas.append([" " for _ in range(canvas_width)])
-                i += 1
+            rows.extend([""] * height_to_add)
 
         # Store the BOTTOM height of the letter. In doing this, we can compare the bottom of the previous line
         # with the top of the current line. This is to avoid issues with larger font
@@ -109,38 +47,77 @@ def format_text(ocr_text: ImageAnnotatorResponse) -> str:
             max(annotation["midpoint"][1] for annotation in grouped_line_annotations)
         )
 
-        last_x = 0
-        for annotation in grouped_line_annotations:
-            text = annotation["text"]
+        rows.append(_render_line(grouped_line_annotations, canvas_width))
+
+    page_text = "\n".join(rows).strip()
+
+    return "-" * canvas_width + "\n" + page_text + "\n" + "-" * canvas_width
+
+
+def _cluster_lines(ocr_text: ImageAnnotatorResponse) -> Dict[float, List[ImageAnnotation]]:
+    line_cluster: Dict[float, List[ImageAnnotation]] = {}
+    last_key: float | None = None
+    for annotation in ocr_text:
+        y = annotation["midpoint"][1]
+        if last_key is not None and abs(y - last_key) < LINE_TOLERANCE:
+            line_cluster[last_key].append(annotation)
+        elif y in line_cluster:
+            # Same midpoint as an earlier line that is no longer the last one, it keeps its place
+            line_cluster[y].append(annotation)
+        else:
+            line_cluster[y] = [annotation]
+            last_key = y
+    return line_cluster
+
+
+def _canvas_width(line_cluster: Dict[float, List[ImageAnnotation]]) -> int:
+    annotations = [annotation for line in line_cluster.values() for annotation in line]
+
+    # Widest line, with a space after every token
+    line_width = max(sum(len(annotation["text"]) + 1 for annotation in line) for line in line_cluster.values())
+
+    # Width that keeps the page's aspect ratio at one row per line
+    aspect_width = max(
+        len(line_cluster) * _page_size(annotation, 0) / _page_size(annotation, 1) for annotation in annotations
+    )
 
-            x = math.floor(annotation["midpoint_normalized"][0] * canvas_width)
+    # Width that leaves room for every token to the right of its midpoint
+    text_width = max(
+        len(annotation["text"]) / (1 - annotation["midpoint_normalized"][0])
+        if annotation["midpoint_normalized"][0] < 1
+        else len(annotation["text"])
+        for annotation in annotations
+    )
 
-            # Move forward if there's an overlap
-            x = max(x, last_x)
+    return int(max([line_width, aspect_width, text_width]))
 
-            # Check if the text fits; if not, move to next line (this is simplistic)
-            if x + len(text) >= canvas_width:
-                canvas[i] += [" " for _ in range(len(text) + 1)]
 
-            # Place the text on the canvas
-            for j, char in enumerate(text):
-                canvas[i][x + j] = char
+def _page_size(annotation: ImageAnnotation, axis: int) -> float:
+    # The page size along an axis, recovered from the midpoint; the default when it can not be recovered
+    normalized = annotation["midpoint_normalized"][axis]
+    size = annotation["midpoint"][axis] / normalized if normalized != 0 else 0
+    return size if size > 0 else DEFAULT_CANVAS_WIDTH
 
-            # Update the last inserted position
-            last_x = x + len(text) + 1  # +1 for a space between words
 
-        i += 1
+def _render_line(grouped_line_annotations: List[ImageAnnotation], canvas_width: int) -> str:
+    pieces: List[str] = []
+    length = 0
+    last_x = 0
+    for annotation in grouped_line_annotations:
+        text = annotation["text"]
 
-    # Delete all whitespace characters after the last non-whitespace character in each row
-    canvas = [list("".join(row).rstrip()) for row in canvas]
+        # Move forward if there's an overlap. Tokens never start before the end of the previous one, so the
+        # row is the concatenation of the gaps and the tokens. Text running past the canvas width grows this row
+        x = max(math.floor(annotation["midpoint_normalized"][0] * canvas_width), last_x)
 
-    # Convert the canvas to a plaintext string
-    page_text = "\n".join("".join(row) for row in canvas)
-    page_text = page_text.strip()
+        pieces.append(" " * (x - length))
+        pieces.append(text)
+        length = x + len(text)
 
-    page_text = "-" * canvas_width + "\n" + page_text + "\n" + "-" * canvas_width
+        # Update the last inserted position
+        last_x = x + len(text) + 1  # +1 for a space between words
 
-    return page_text
+    return "".join(pieces).rstrip()
 
 
 def group_words_in_sentence(
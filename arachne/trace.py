@@ -0,0 +1,148 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List
+
+import structlog
+from pydantic import BaseModel, Field
+
+from arachne._utils import write_atomic
+from arachne.browser.actions import Action, parse_actions
+from arachne.fingerprint import PageFingerprint
+
+if TYPE_CHECKING:
+    from arachne.agent import WebWeaver
+
+log = structlog.get_logger()
+
+
+class TraceStep(BaseModel):
+    # The model's response, replayed steps are put back into the task history from it
+    response: Dict[str, Any]
+    actions: List[Dict[str, Any]]
+    # The page the model saw when it chose the actions
+    page: PageFingerprint | None
+    # Xpath of every element the actions target, by tag id
+    elements: Dict[str, str] = Field(default_factory=dict)
+
+    def parsed_actions(self) -> List[Action]:
+        return parse_actions(self.actions)
+
+
+class ActionTrace(BaseModel):
+    start_url: str
+    task_template: str
+    steps: List[TraceStep] = Field(default_factory=list)
+    final_answer: Any = None
+    created_at: float = Field(default_factory=time.time)
+
+    def record(
+            self,
+            response: Dict[str, Any],
+            actions: List[Action],
+            page: PageFingerprint | None,
+            tag_to_xpath: Dict[int, str],
+    ) -> None:
+        elements = {
+            action.element_id: tag_to_xpath[int(action.element_id)]
+            for action in actions
+            if action.element_id is not None and int(action.element_id) in tag_to_xpath
+        }
+        self.steps.append(
+            TraceStep(
+                response=response,
+                actions=[action.model_dump(mode="json", exclude_none=True) for action in actions],
+                page=page,
+                elements=elements,
+            )
+        )
+
+
+class TraceStore:
+    """
+    The latest successful trace of every start url and task template, one JSON file each under `path`.
+    """
+
+    def __init__(self, path: Path | str = Path(".arachne") / "traces"):
+        self.path = Path(path)
+
+    @staticmethod
+    def key(start_url: str, task_template: str) -> str:
+        return hashlib.blake2b(f"{start_url}\n{task_template}".encode(), digest_size=16).hexdigest()
+
+    async def load(self, start_url: str, task_template: str) -> ActionTrace | None:
+        return await asyncio.to_thread(self._load, self.key(start_url, task_template))
+
+    async def save(self, trace: ActionTrace) -> None:
+        await asyncio.to_thread(self._save, trace)
+
+    def _load(self, key: str) -> ActionTrace | None:
+        path = self.path / f"{key}.json"
+        if not path.exists():
+            return None
+        try:
+            return ActionTrace.model_validate_json(path.read_text())
+        except ValueError:
+            log.warning("Ignoring unreadable action trace", path=str(path), exc_info=True)
+            return None
+
+    def _save(self, trace: ActionTrace) -> None:
+        path = self.path / f"{self.key(trace.start_url, trace.task_template)}.json"
+        write_atomic(path, trace.model_dump_json())
+        log.info("Saved action trace", path=str(path), steps=len(trace.steps))
+
+
+@dataclass
+class ReplayResult:
+    completed: bool
+    # Steps that were replayed, they are also the steps to keep when the model takes over
+    steps: List[TraceStep]
+    diverged_at: int | None = None
+    reason: str | None = None
+
+
+class TraceReplayer:
+    """
+    Re-executes a recorded trace on the weaver's page without calling the model.
+
+    Before every step the current page is compared with the page the step was recorded on: its fingerprint must
+    match and every element the step targets must still have the same tag id and xpath. At the first step that
+    differs, or whose actions fail, replay stops so the model can take over from the page as it is.
+    """
+
+    def __init__(self, weaver: "WebWeaver"):
+        self.weaver = weaver
+
+    async def replay(self, trace: ActionTrace) -> ReplayResult:
+        weaver = self.weaver
+        replayed: List[TraceStep] = []
+        await weaver.read_page()
+
+        for index, step in enumerate(trace.steps):
+            reason = self._divergence(step)
+            if reason is None:
+                results, _ = await weaver.action_executor.execute(step.parsed_actions())
+                failed = [result for result in results if not result.success]
+                if not failed:
+                    replayed.append(step)
+                    continue
+                reason = f"action on element {failed[0].action.element_id} failed: {failed[0].error}"
+
+            log.info("Trace replay diverged, handing over to the model", step=index, reason=reason)
+            weaver.metrics.increment("trace_replays_total", result="diverged")
+            return ReplayResult(completed=False, steps=replayed, diverged_at=index, reason=reason)
+
+        log.info("Trace replayed without the model", steps=len(replayed))
+        weaver.metrics.increment("trace_replays_total", result="completed")
+        return ReplayResult(completed=True, steps=replayed)
+
+    def _divergence(self, step: TraceStep) -> str | None:
+        if step.page is not None and not step.page.matches(self.weaver.page_fingerprint):
+            return "page fingerprint changed"
+        for element_id, xpath in step.elements.items():
+            current = self.weaver.tag_to_xpath.get(int(element_id))
+            if current != xpath:
+                return f"element {element_id} moved from {xpath} to {current}"
+        return None
@@ -0,0 +1,139 @@
+"""
+`text_format.format_text` against the implementation it replaced, on synthetic OCR output of 10k-100k annotations.
+Checks that both produce the same text before timing them.
+
+Run with `python benchmarks/format_text.py`. The old implementation is quadratic in the number of lines, so it is only
+timed up to LEGACY_MAX_ANNOTATIONS.
+"""
+import copy
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from arachne.ocr import ImageAnnotatorResponse
+from arachne.ocr.types import ImageAnnotation
+from arachne.text_format import format_text, group_words_in_sentence
+
+SIZES = (10_000, 30_000, 100_000)
+LEGACY_MAX_ANNOTATIONS = 30_000
+WORDS = "Apply for this job Name Email Phone Resume LinkedIn Submit application , . ! ? : Point72 Analyst".split()
+
+
+def legacy_format_text(ocr_text: ImageAnnotatorResponse) -> str:
+    line_cluster: Dict[float, List[ImageAnnotation]] = defaultdict(list)
+    for annotation in ocr_text:
+        if (
+            len(line_cluster.keys())
+            and abs(annotation["midpoint"][1] - list(line_cluster.keys())[-1]) < 10
+        ):
+            line_cluster[list(line_cluster.keys())[-1]].append(annotation)
+        else:
+            line_cluster[annotation["midpoint"][1]].append(annotation)
+    canvas_height = len(line_cluster)
+    default_canvas_width = 80
+    canvas_width = int(
+        max(
+            [
+                max(sum(len(token["text"]) + 1 for token in line) for line in line_cluster.values()),
+                max(
+                    canvas_height
+                    * (a["midpoint"][0] / a["midpoint_normalized"][0]
+                       if a["midpoint_normalized"][0] != 0 else default_canvas_width)
+                    / (a["midpoint"][1] / a["midpoint_normalized"][1]
+                       if a["midpoint_normalized"][1] != 0 else default_canvas_width)
+                    for line in line_cluster.values()
+                    for a in line
+                ),
+                max(
+                    max(
+                        len(a["text"]) / (1 - a["midpoint_normalized"][0])
+                        if a["midpoint_normalized"][0] != 1 else len(a["text"])
+                        for a in line
+                    )
+                    for line in line_cluster.values()
+                ),
+            ]
+        )
+    )
+    canvas = [[" " for _ in range(canvas_width)] for _ in range(canvas_height)]
+    empty_space_height = 35
+    max_previous_line_height = empty_space_height
+    i = 0
+    for y, line_annotations in line_cluster.items():
+        line_annotations.sort(key=lambda e: e["midpoint_normalized"][0])
+        grouped_line_annotations = group_words_in_sentence(line_annotations)
+        max_line_height = max(a["midpoint"][1] - a["height"] for a in grouped_line_annotations)
+        height_to_add = math.floor((max_line_height - max_previous_line_height) // empty_space_height)
+        if height_to_add > 0:
+            for _ in range(height_to_add):
+                canvas.append([" " for _ in range(canvas_width)])
+                i += 1
+        max_previous_line_height = int(max(a["midpoint"][1] for a in grouped_line_annotations))
+        last_x = 0
+        for annotation in grouped_line_annotations:
+            text = annotation["text"]
+            x = max(math.floor(annotation["midpoint_normalized"][0] * canvas_width), last_x)
+            if x + len(text) >= canvas_width:
+                canvas[i] += [" " for _ in range(len(text) + 1)]
+            for j, char in enumerate(text):
+                canvas[i][x + j] = char
+            last_x = x + len(text) + 1
+        i += 1
+    canvas = [list("".join(row).rstrip()) for row in canvas]
+    page_text = "\n".join("".join(row) for row in canvas).strip()
+    return "-" * canvas_width + "\n" + page_text + "\n" + "-" * canvas_width
+
+
+def synthetic_page(annotations: int, seed: int = 11) -> ImageAnnotatorResponse:
+    """A long page of left aligned paragraphs and form labels, in reading order like OCR returns it."""
+    rng = random.Random(seed)
+    page_width = 1280
+    page_height = annotations * 4
+    result: ImageAnnotatorResponse = []
+    y = 20.0
+    while len(result) < annotations:
+        height = rng.choice([14, 14, 16, 20, 32])
+        x = rng.uniform(20, 120)
+        for _ in range(rng.randint(2, 12)):
+            text = rng.choice(WORDS)
+            width = len(text) * height * 0.55
+            midpoint = (x + width / 2, y + rng.uniform(-2, 2))
+            result.append({
+                "text": text,
+                "midpoint": midpoint,
+                "midpoint_normalized": (midpoint[0] / page_width, midpoint[1] / page_height),
+                "width": int(width),
+                "height": height,
+            })
+            x += width + rng.uniform(6, 40)
+            if x > page_width - 100:
+                break
+        y += height + rng.choice([6, 10, 24, 60])
+    return result[:annotations]
+
+
+def timed(format_fn, page: ImageAnnotatorResponse) -> tuple[float, str]:
+    page = copy.deepcopy(page)
+    start = time.perf_counter()
+    text = format_fn(page)
+    return (time.perf_counter() - start) * 1000, text
+
+
+def main() -> None:
+    for size in SIZES:
+        page = synthetic_page(size)
+        new_ms, new_text = timed(format_text, page)
+        if size > LEGACY_MAX_ANNOTATIONS:
+            print(f"annotations={size:>7} format_text={new_ms:9.1f}ms legacy=skipped")
+            continue
+        legacy_ms, legacy_text = timed(legacy_format_text, page)
+        print(
+            f"annotations={size:>7} format_text={new_ms:9.1f}ms legacy={legacy_ms:9.1f}ms "
+            f"speedup={legacy_ms / new_ms:6.1f}x identical={new_text == legacy_text}"
+        )
+
+
+if __name__ == "__main__":
+    main()
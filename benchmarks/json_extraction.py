@@ -0,0 +1,102 @@
+"""
+JSON extraction from model outputs: the recursive `regex` pattern the agent used to compile per call versus
+`arachne.llm.parsing.extract_json`. Checks that both return the same object wherever the old pattern succeeded.
+
+Run with `python benchmarks/json_extraction.py [corpus_dir]`. Every `*.txt` file in `corpus_dir` is used as a
+recorded model output; without one a synthetic corpus shaped like the agent's responses is generated.
+"""
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from regex import regex
+
+from arachne.llm.parsing import extract_json
+
+RUNS = 20
+
+
+def legacy_extract(text: str) -> dict | None:
+    pattern = regex.compile(r'\{(?:[^{}]|(?R))*\}')
+    try:
+        return json.loads(pattern.findall(text)[0])
+    except Exception:
+        return None
+
+
+def synthetic_corpus(size: int = 400, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    words = "the page shows a form with name email phone fields and a submit button near the bottom".split()
+    outputs = []
+    for i in range(size):
+        thought = " ".join(rng.choice(words) for _ in range(rng.randint(10, 600)))
+        action = rng.choice(["click", "type_text", "read_page", "go_to_url"])
+        action_input = {
+            "click": rng.randint(0, 300),
+            "type_text": [[rng.choice(words), rng.randint(0, 300)] for _ in range(rng.randint(1, 6))],
+            "read_page": "",
+            "go_to_url": "https://example.com/jobs?id={}".format(i),
+        }[action]
+        body = json.dumps(
+            {"question": "fill these details in the web page", "thought": thought, "action": action,
+             "action_input": action_input},
+            indent=rng.choice([None, 2]),
+        )
+        shape = i % 4
+        if shape == 0:
+            outputs.append(body)
+        elif shape == 1:
+            outputs.append(f"Here is my next step:\n```json\n{body}\n```\nLet me know if this works.")
+        elif shape == 2:
+            outputs.append(f"{body}\n\nNote: I used the {{tag}} ids from the screenshot. " + thought)
+        else:
+            # Long, unbalanced reasoning before the object, the worst case for the recursive pattern
+            outputs.append("Thinking { about " + "{ nested " * 40 + thought + "\n" + body)
+    return outputs
+
+
+def load_corpus() -> list[str]:
+    if len(sys.argv) > 1:
+        return [path.read_text() for path in sorted(Path(sys.argv[1]).glob("*.txt"))]
+    return synthetic_corpus()
+
+
+def measure(extract, corpus: list[str]) -> list[float]:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        for text in corpus:
+            extract(text)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> None:
+    corpus = load_corpus()
+
+    mismatches = 0
+    regex_failures = 0
+    for text in corpus:
+        expected = legacy_extract(text)
+        if expected is None:
+            regex_failures += 1
+        elif extract_json(text) != expected:
+            mismatches += 1
+    print(
+        f"corpus={len(corpus)} outputs, regex found no object in {regex_failures}, "
+        f"mismatches where the regex succeeded: {mismatches}"
+    )
+
+    results = {}
+    for name, extract in (("recursive regex", legacy_extract), ("extract_json", extract_json)):
+        timings = measure(extract, corpus)
+        results[name] = statistics.median(timings)
+        print(f"{name:<16} median={results[name]:9.2f}ms per corpus")
+    print(f"speedup={results['recursive regex'] / results['extract_json']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Per-step cost of re-evaluating tags.min.js on every call versus registering it once per browser context.
+
+Run with `python benchmarks/tag_injection.py` after `npm run build`.
+"""
+import asyncio
+import statistics
+import time
+
+from playwright.async_api import async_playwright
+
+from arachne.agent import WebWeaver
+
+STEPS = 20
+ELEMENTS = 5000
+
+
+def build_large_page(elements: int) -> str:
+    rows = "".join(
+        f'<div class="row"><a href="#{i}">link {i}</a><input type="text" name="field-{i}"/><span>text {i}</span></div>'
+        for i in range(elements)
+    )
+    return f"<html><body>{rows}</body></html>"
+
+
+async def legacy_step(weaver: WebWeaver, page) -> None:
+    await page.evaluate(weaver._js_utils)
+    await page.evaluate("tagifyWebpage(false)")
+    await page.evaluate(weaver._js_utils)
+    await page.evaluate("removeTags()")
+
+
+async def injected_step(weaver: WebWeaver, page) -> None:
+    await weaver._tag_page(page)
+    await weaver._remove_tags(page)
+
+
+async def measure(step, weaver: WebWeaver, page) -> list[float]:
+    timings = []
+    for _ in range(STEPS):
+        start = time.perf_counter()
+        await step(weaver, page)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+async def main() -> None:
+    weaver = WebWeaver(api_key="")
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
+        page = await browser.new_page()
+        await page.set_content(build_large_page(ELEMENTS))
+
+        for name, step in (("re-evaluate per call", legacy_step), ("inject once per context", injected_step)):
+            timings = await measure(step, weaver, page)
+            print(
+                f"{name:<24} median={statistics.median(timings):8.2f}ms "
+                f"p95={statistics.quantiles(timings, n=20)[-1]:8.2f}ms"
+            )
+
+        await browser.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+"""
+Tagging time on synthetic link-heavy DOMs of increasing size, to check that it scales linearly.
+
+Run with `python benchmarks/tagging_scale.py` after `npm run build`.
+"""
+import asyncio
+import random
+import statistics
+import time
+
+from playwright.async_api import async_playwright
+
+from arachne.agent import WebWeaver
+
+SIZES = (1_000, 10_000, 50_000)
+REPEATS = 5
+
+
+def build_synthetic_page(nodes: int, seed: int = 0) -> str:
+    """Nested cards where most links wrap a single span, the case removeNestedTags collapses."""
+    rng = random.Random(seed)
+    parts = []
+    emitted = 0
+    while emitted < nodes:
+        depth = rng.randint(1, 6)
+        parts.append("<div>" * depth)
+        parts.append(f'<a href="#{emitted}"><span>item {emitted}</span></a><button>go</button>')
+        parts.append("</div>" * depth)
+        emitted += depth + 3
+    return f"<html><body>{''.join(parts)}</body></html>"
+
+
+async def main() -> None:
+    weaver = WebWeaver(api_key="")
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
+        page = await browser.new_page()
+
+        for size in SIZES:
+            await page.set_content(build_synthetic_page(size))
+            timings = []
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                tags = await weaver._tag_page(page)
+                timings.append((time.perf_counter() - start) * 1000)
+                await weaver._remove_tags(page)
+            median = statistics.median(timings)
+            print(f"{size:>7} nodes  {len(tags):>6} tags  median={median:9.2f}ms  per 1k nodes={median / size * 1000:7.2f}ms")
+
+        await browser.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+// getElementXPath as it was before createXPathBuilder, with its types stripped, for the xpath parity test
+window.legacyGetElementXPath = function (element) {
+  let path_parts = [];
+
+  let iframe_str = "";
+  if (element && element.ownerDocument !== window.document) {
+    // assert element.iframe_index !== undefined, "Element is not in the main document and does not have an iframe_index attribute";
+    iframe_str = `iframe[${element.getAttribute("iframe_index")}]`;
+  }
+
+  while (element) {
+    if (!element.tagName) {
+      element = element.parentNode;
+      continue;
+    }
+
+    let prefix = element.tagName.toLowerCase();
+    let sibling_index = 1;
+
+    let sibling = element.previousElementSibling;
+    while (sibling) {
+      if (sibling.tagName === element.tagName) {
+        sibling_index++;
+      }
+      sibling = sibling.previousElementSibling;
+    }
+
+    // Check next siblings to determine if index should be added
+    let nextSibling = element.nextElementSibling;
+    let shouldAddIndex = false;
+    while (nextSibling) {
+      if (nextSibling.tagName === element.tagName) {
+        shouldAddIndex = true;
+        break;
+      }
+      nextSibling = nextSibling.nextElementSibling;
+    }
+
+    if (sibling_index > 1 || shouldAddIndex) {
+      prefix += `[${sibling_index}]`;
+    }
+
+    if (element.id) {
+      prefix += `[@id="${element.id}"]`;
+
+      // If the id is unique and we have enough path parts, we can stop
+      if (path_parts.length > 3) {
+        path_parts.unshift(prefix);
+        return "//" + path_parts.join("/");
+      }
+    } else if (element.className) {
+      prefix += `[@class="${element.className}"]`;
+    }
+
+    path_parts.unshift(prefix);
+    element = element.parentNode;
+  }
+  return iframe_str + "//" + path_parts.join("/");
+};
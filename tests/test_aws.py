@@ -0,0 +1,84 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from arachne.exceptions import LLMRequestTimeout
+from arachne.llm.aws import LLM
+
+
+class BedrockStandIn(BaseHTTPRequestHandler):
+    """Answers InvokeModel like the Bedrock runtime, after `delay` seconds."""
+    delay = 0.0
+    status = 200
+    requests: list[str] = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        BedrockStandIn.requests.append(self.path)
+        time.sleep(self.delay)
+        text = body["messages"][0]["content"][0]["text"]
+        payload = json.dumps({"content": [{"type": "text", "text": f'{{"echo": "{text}"}}'}]}).encode()
+        self.send_response(self.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    BedrockStandIn.delay = 0.0
+    BedrockStandIn.status = 200
+    BedrockStandIn.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BedrockStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_calls_do_not_block_each_other(endpoint):
+    BedrockStandIn.delay = 0.3
+    llm = LLM(region_name="us-east-1", endpoint_url=endpoint, max_pool_connections=8)
+
+    async def main():
+        start = time.monotonic()
+        responses = await asyncio.gather(*(llm.get_json_response(f"prompt {i}") for i in range(8)))
+        return responses, time.monotonic() - start
+
+    responses, elapsed = asyncio.run(main())
+    assert responses == [{"echo": f"prompt {i}"} for i in range(8)]
+    assert elapsed < 1.5
+    assert len(BedrockStandIn.requests) == 8
+    assert BedrockStandIn.requests[0] == "/model/anthropic.claude-v2/invoke"
+
+
+def test_a_timed_out_call_is_not_retried(endpoint):
+    # A retryable error that arrives after the caller gave up
+    BedrockStandIn.delay = 0.3
+    BedrockStandIn.status = 503
+    llm = LLM(region_name="us-east-1", endpoint_url=endpoint, max_attempts=3)
+
+    with pytest.raises(LLMRequestTimeout):
+        asyncio.run(llm.call_llm("slow", timeout=0.1))
+    # The first retry would start within a second of the error
+    time.sleep(1.5)
+    assert len(BedrockStandIn.requests) == 1
+
+
+def test_each_client_gets_a_pool_of_its_own_size(endpoint):
+    small = LLM(region_name="us-east-1", endpoint_url=endpoint, max_pool_connections=2)
+    large = LLM(region_name="us-east-1", endpoint_url=endpoint, max_pool_connections=16)
+    assert small._executor._max_workers == 2
+    assert large._executor._max_workers == 16
+    assert LLM(region_name="us-east-1", endpoint_url=endpoint, max_pool_connections=2)._executor is small._executor
@@ -0,0 +1,84 @@
+import asyncio
+
+from arachne.browser.actions import CheckboxAction, InputTextAction
+from arachne.executor import ActionExecutor
+from arachne.metrics import Metrics
+
+
+class FakeElement:
+    def __init__(self, calls: list):
+        self.calls = calls
+
+    async def click(self):
+        self.calls.append(("click",))
+
+    async def select_text(self):
+        self.calls.append(("select_text",))
+
+    async def press(self, key: str):
+        self.calls.append(("press", key))
+
+    async def focus(self):
+        self.calls.append(("focus",))
+
+    async def fill(self, text: str):
+        self.calls.append(("fill", text))
+
+
+class FakeReadiness:
+    def track(self, page):
+        pass
+
+    async def wait_for_settle(self, page):
+        pass
+
+
+class FakeWeaver:
+    """Stands in for WebWeaver, `applyActions` answers with `outcomes`."""
+
+    def __init__(self, outcomes: list[dict]):
+        self.outcomes = outcomes
+        self.page = object()
+        self.readiness = FakeReadiness()
+        self.metrics = Metrics()
+        self.calls: dict[int, list] = {}
+
+    async def _run_js_utils(self, page, script: str):
+        assert script.startswith("window.applyActions(")
+        return self.outcomes
+
+    async def _resolve_element(self, element_id: int) -> FakeElement:
+        return FakeElement(self.calls.setdefault(element_id, []))
+
+    async def _press_sequentially(self, element: FakeElement, text: str):
+        await element.focus()
+        element.calls.append(("press_sequentially", text))
+
+    async def read_page(self):
+        return []
+
+
+def test_text_the_page_could_not_set_is_typed_key_by_key():
+    weaver = FakeWeaver([
+        {"success": True},
+        {"success": False, "error": "contenteditable", "needsTyping": True},
+        {"success": False, "error": "element not found"},
+    ])
+    actions = [
+        CheckboxAction(element_id=1, is_checked=True),
+        InputTextAction(element_id=2, text="Hello"),
+        InputTextAction(element_id=3, text="World"),
+    ]
+
+    results, _ = asyncio.run(ActionExecutor(weaver).execute(actions))
+
+    assert [result.success for result in results] == [True, True, True]
+    assert 1 not in weaver.calls
+    assert weaver.calls[2] == [
+        ("click",),
+        ("select_text",),
+        ("press", "Backspace"),
+        ("focus",),
+        ("press_sequentially", "Hello"),
+    ]
+    assert weaver.calls[3] == [("fill", "World")]
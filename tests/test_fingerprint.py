@@ -0,0 +1,25 @@
+from arachne.fingerprint import PageFingerprint
+
+PAGE = PageFingerprint(dom_digest="0a1b2c3d", segment_hashes=(0xF0F0, 0x0F0F), tag_digest="tags")
+
+
+def test_rendering_noise_keeps_the_page_the_same():
+    noisy = PageFingerprint(dom_digest="0a1b2c3d", segment_hashes=(0xF0F1, 0x0F0F), tag_digest="tags")
+
+    assert noisy.matches(PAGE)
+    assert not PAGE.matches(None)
+
+
+def test_a_style_change_the_dom_digest_misses_is_a_change():
+    # Same text and form state, but a modal toggled through a class changed the screenshot
+    restyled = PageFingerprint(dom_digest="0a1b2c3d", segment_hashes=(0xFFFF, 0x0F0F), tag_digest="tags")
+
+    assert not restyled.matches(PAGE)
+
+
+def test_a_changed_dom_digest_or_tag_map_is_a_change():
+    typed = PageFingerprint(dom_digest="99999999", segment_hashes=PAGE.segment_hashes, tag_digest="tags")
+    retagged = PageFingerprint(dom_digest="0a1b2c3d", segment_hashes=PAGE.segment_hashes, tag_digest="other")
+
+    assert not typed.matches(PAGE)
+    assert not retagged.matches(PAGE)
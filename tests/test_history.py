@@ -0,0 +1,55 @@
+import json
+
+from arachne.history import TaskHistory
+
+
+def _click(element_id: int) -> dict:
+    return {"thought": "Clicking " * 20, "action": "click", "action_input": element_id}
+
+
+def test_short_history_is_rendered_verbatim():
+    history = TaskHistory(keep_last=3)
+    history.append(_click(1))
+    history.append({"thought": "Done", "action": "complete", "action_input": None})
+
+    lines = [json.loads(line) for line in history.render().splitlines()]
+
+    assert lines == [
+        {"step": 1, **_click(1)},
+        {"step": 2, "thought": "Done", "action": "complete", "action_input": None},
+    ]
+    assert history.reports[-1].verbatim_steps == 2
+
+
+def test_older_steps_are_compacted_to_their_action():
+    history = TaskHistory(keep_last=1, max_input_chars=5)
+    history.append({"thought": "Opening", "action": "go_to_url", "action_input": "https://example.com"})
+    history.append(_click(7))
+
+    first, last = [json.loads(line) for line in history.render().splitlines()]
+
+    assert first == {"step": 1, "action": "go_to_url", "action_input": "https..."}
+    assert last["thought"] == _click(7)["thought"]
+    report = history.reports[-1]
+    assert (report.verbatim_steps, report.compacted_steps, report.summarized_steps) == (1, 1, 0)
+
+
+def test_history_over_budget_folds_the_oldest_steps_into_a_summary():
+    history = TaskHistory(token_budget=300, keep_last=2)
+    for element_id in range(1, 21):
+        history.append(_click(element_id))
+    history.append({"thought": "Filling", "action": "type_text", "action_input": [["Jane", 30], ["Doe", 31]]})
+
+    rendered = history.render()
+    summary = json.loads(rendered.splitlines()[0])
+    report = history.reports[-1]
+
+    assert summary["summary"] == "earlier steps"
+    assert summary["steps"] == f"1-{report.summarized_steps}"
+    assert summary["actions"]["click"]["count"] == report.summarized_steps
+    assert summary["actions"]["click"]["targets"] == list(range(1, report.summarized_steps + 1))
+    assert report.verbatim_steps == 2
+    assert report.rendered_tokens <= history.token_budget < report.full_tokens
+    # Every step is accounted for, the two most recent verbatim
+    assert report.summarized_steps + report.compacted_steps + report.verbatim_steps == len(history)
+    assert json.loads(rendered.splitlines()[-1])["action"] == "type_text"
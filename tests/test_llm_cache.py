@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import pytest
+
+from arachne.exceptions import LLMCacheMiss
+from arachne.llm.cache import LLMCacheMode, LLMResponseCache, chat_cache_key
+
+
+def _payload(text: str, image_url: str = "data:image/png;base64,AAAA", stream: bool = False) -> dict:
+    return {
+        "model": "gpt-4o",
+        "temperature": 0,
+        "stream": stream,
+        "messages": [
+            {"role": "system", "content": "You are a web agent"},
+            {
+                "role": "user",
+                "content": [{"type": "text", "text": text}, {"type": "image_url", "image_url": {"url": image_url}}],
+            },
+        ],
+    }
+
+
+def test_chat_keys_depend_on_prompt_and_images_but_not_streaming():
+    key = chat_cache_key(_payload("Apply for the job"))
+
+    assert chat_cache_key(_payload("Apply for the job", stream=True)) == key
+    assert chat_cache_key(_payload("Apply for another job")) != key
+    assert chat_cache_key(_payload("Apply for the job", image_url="data:image/png;base64,BBBB")) != key
+    assert chat_cache_key({**_payload("Apply for the job"), "temperature": 1}) != key
+
+
+def test_repeated_calls_are_served_from_the_cache(tmp_path):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return {"action": "click", "action_input": len(calls)}
+
+    async def main():
+        cache = LLMResponseCache(tmp_path / "cache.sqlite3")
+        first = await cache.get_or_call("key", call)
+        second = await cache.get_or_call("key", call)
+        cache.close()
+        return first, second, cache
+
+    first, second, cache = asyncio.run(main())
+    assert first == second == {"action": "click", "action_input": 1}
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    async def main():
+        cache = LLMResponseCache(tmp_path / "cache.sqlite3", max_entries=2)
+        await cache.put("a", "A")
+        await cache.put("b", "B")
+        time.sleep(0.01)
+        assert await cache.get("a") == "A"
+        await cache.put("c", "C")
+        values = [await cache.get(key) for key in ("a", "b", "c")]
+        cache.close()
+        return values
+
+    assert asyncio.run(main()) == ["A", None, "C"]
+
+
+def test_expired_entries_miss_except_in_replay_mode(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+
+    async def main():
+        recorder = LLMResponseCache(path, ttl_seconds=0.01)
+        await recorder.put("key", "recorded")
+        time.sleep(0.05)
+        replay = LLMResponseCache(path, mode=LLMCacheMode.replay, ttl_seconds=0.01)
+        replayed = await replay.get("key")
+        replay.close()
+        expired = await recorder.get("key")
+        recorder.close()
+        return replayed, expired
+
+    assert asyncio.run(main()) == ("recorded", None)
+
+
+def test_replay_mode_raises_on_a_miss_instead_of_calling_the_model(tmp_path):
+    async def call():
+        raise AssertionError("the model must not be called in replay mode")
+
+    async def main():
+        cache = LLMResponseCache(tmp_path / "cache.sqlite3", mode=LLMCacheMode.replay)
+        try:
+            await cache.get_or_call("unknown", call)
+        finally:
+            cache.close()
+
+    with pytest.raises(LLMCacheMiss):
+        asyncio.run(main())
@@ -0,0 +1,56 @@
+import pytest
+
+from arachne.llm.parsing import IncrementalJSONParser, extract_json
+
+ACTION = '{"action": "click", "action_input": 3, "thought": "the submit button"}'
+
+
+def _feed(text: str, chunk_size: int = 1) -> IncrementalJSONParser:
+    parser = IncrementalJSONParser()
+    for i in range(0, len(text), chunk_size):
+        parser.feed(text[i:i + chunk_size])
+    return parser
+
+
+def test_extract_json_skips_prose_and_fences():
+    assert extract_json("Sure! ```json\n" + ACTION + "\n``` done {x}") == {
+        "action": "click",
+        "action_input": 3,
+        "thought": "the submit button",
+    }
+    assert extract_json("no object {here}") is None
+
+
+def test_fields_are_emitted_as_they_complete():
+    parser = IncrementalJSONParser()
+    emitted = parser.feed('{"action": "click", "action_input": 3, "tho')
+    assert emitted == [("action", "click"), ("action_input", 3)]
+    assert not parser.done
+    assert parser.feed('ught": "x"}') == [("thought", "x")]
+    assert parser.done
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        # A stray brace right before the object must not swallow the brace that opens it
+        ('Plan: {\n{"action": "click", "action_input": 3}', {"action": "click", "action_input": 3}),
+        # The fields of a nested value must never be reported as the object's
+        ('Thinking {a} {\n{"key0": "", "key2\\"": {"k0": ""}}', {"key0": "", 'key2"': {"k0": ""}}),
+        # A key that is not valid JSON is prose, not an error
+        ('Note {"\n"} then {"action": "read_page", "action_input": ""}', {"action": "read_page", "action_input": ""}),
+        ('{"a": nope} {"a": [1, {"b": "}"}], "c": true}', {"a": [1, {"b": "}"}], "c": True}),
+    ],
+)
+def test_prose_around_the_object(text, expected, chunk_size):
+    parser = _feed(text, chunk_size)
+    assert parser.result() == expected == extract_json(text)
+    if parser.done:
+        assert parser.fields == expected
+
+
+def test_result_is_none_without_an_object():
+    parser = _feed("I could not find the button {sorry}")
+    assert not parser.done
+    assert parser.result() is None
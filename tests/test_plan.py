@@ -0,0 +1,111 @@
+import asyncio
+import itertools
+
+import pytest
+
+from arachne.browser.pool import PooledBrowserContext
+from arachne.browser.state import BrowserArtifacts
+from arachne.exceptions import InvalidPlan
+from arachne.plan import Plan, PlanExecutor, SubgoalStatus
+
+
+class FakeBrowserContext:
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self.id = next(self._ids)
+        self.cookies: list[dict] = []
+
+    async def add_cookies(self, cookies):
+        self.cookies.extend(cookies)
+
+    async def storage_state(self):
+        return {"cookies": list(self.cookies), "origins": []}
+
+
+class FakePool:
+    def __init__(self):
+        self.leased: set[int] = set()
+        self.released: list[tuple[int, bool]] = []
+
+    async def lease(self, timeout=None):
+        pooled = PooledBrowserContext(browser_context=FakeBrowserContext(), browser_artifacts=BrowserArtifacts())
+        self.leased.add(id(pooled))
+        return pooled
+
+    async def release(self, pooled, discard=False):
+        self.leased.remove(id(pooled))
+        self.released.append((pooled.browser_context.id, discard))
+
+
+def _plan(**depends_on):
+    subgoals = [{"id": subgoal_id, "description": "", "depends_on": deps} for subgoal_id, deps in depends_on.items()]
+    return Plan(goal="goal", subgoals=subgoals)
+
+
+def _run(plan, runner):
+    pool = FakePool()
+    result = asyncio.run(PlanExecutor(pool, runner).run(plan))
+    assert not pool.leased, "every leased context goes back to the pool"
+    return result, pool
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(InvalidPlan):
+        _plan(a=["b"], b=["a"])
+    with pytest.raises(InvalidPlan):
+        _plan(a=["missing"])
+    with pytest.raises(InvalidPlan):
+        Plan(goal="goal", subgoals=[{"id": "a", "description": ""}, {"id": "a", "description": ""}])
+
+
+def test_subtasks_are_chained():
+    plan = Plan.from_response("goal", {"subtasks": [{"description": "log in"}, {"description": "post"}]})
+    assert [subgoal.depends_on for subgoal in plan.topological_order()] == [[], ["1"]]
+
+
+def test_a_chain_continues_in_its_predecessors_context():
+    contexts = {}
+
+    async def runner(subgoal, pooled, inputs):
+        contexts[subgoal.id] = pooled.browser_context.id
+        if subgoal.id == "login":
+            await pooled.browser_context.add_cookies([{"name": "session", "value": "1"}])
+        return [cookie["name"] for cookie in pooled.browser_context.cookies]
+
+    result, _ = _run(_plan(login=[], post=["login"], research=[]), runner)
+    assert result.completed
+    assert contexts["post"] == contexts["login"] != contexts["research"]
+    assert result.outputs()["post"] == ["session"]
+
+
+def test_dependents_that_start_together_all_get_the_session():
+    contexts = {}
+
+    async def runner(subgoal, pooled, inputs):
+        contexts[subgoal.id] = pooled.browser_context.id
+        if subgoal.id == "login":
+            await pooled.browser_context.add_cookies([{"name": "session", "value": "1"}])
+        return [cookie["name"] for cookie in pooled.browser_context.cookies]
+
+    result, _ = _run(_plan(login=[], first=["login"], second=["login"]), runner)
+    assert contexts["first"] != contexts["second"]
+    assert contexts["login"] in (contexts["first"], contexts["second"])
+    assert result.outputs()["first"] == result.outputs()["second"] == ["session"]
+
+
+def test_a_failure_skips_its_dependents_only():
+    async def runner(subgoal, pooled, inputs):
+        if subgoal.id == "login":
+            raise RuntimeError("wrong password")
+        return subgoal.id
+
+    result, pool = _run(_plan(login=[], post=["login"], comment=["post"], research=[]), runner)
+    statuses = {subgoal_id: r.status for subgoal_id, r in result.results.items()}
+    assert statuses == {
+        "login": SubgoalStatus.failed,
+        "post": SubgoalStatus.skipped,
+        "comment": SubgoalStatus.skipped,
+        "research": SubgoalStatus.completed,
+    }
+    assert sorted(discard for _, discard in pool.released) == [False, True]
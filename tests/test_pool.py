@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+
+from arachne.browser.pool import BrowserContextPool, PooledBrowserContext
+from arachne.browser.state import BrowserArtifacts
+
+
+class FakePage:
+    def __init__(self, url):
+        self.url = url
+
+    async def goto(self, url):
+        self.url = url
+
+    async def close(self):
+        pass
+
+
+class FakeCDPSession:
+    def __init__(self, cleared):
+        self.cleared = cleared
+
+    async def send(self, method, params):
+        assert method == "Storage.clearDataForOrigin"
+        self.cleared.append(params["origin"])
+
+    async def detach(self):
+        pass
+
+
+class FakeBrowserContext:
+    def __init__(self, *urls):
+        self.pages = [FakePage(url) for url in urls]
+        self.cleared: list[str] = []
+
+    async def clear_cookies(self):
+        pass
+
+    async def clear_permissions(self):
+        pass
+
+    async def new_cdp_session(self, page):
+        return FakeCDPSession(self.cleared)
+
+
+def _request(url, resource_type="document"):
+    return SimpleNamespace(url=url, resource_type=resource_type)
+
+
+def _pooled(browser_context):
+    return PooledBrowserContext(browser_context=browser_context, browser_artifacts=BrowserArtifacts())
+
+
+def test_reset_clears_every_origin_seen_during_the_lease():
+    browser_context = FakeBrowserContext("https://shop.example.com/cart")
+    pooled = _pooled(browser_context)
+    for request in [
+        _request("https://login.example.com/sso"),
+        _request("https://widgets.example.net/frame"),
+        _request("https://cdn.example.org/app.js", resource_type="script"),
+        _request("data:text/html,hello"),
+    ]:
+        BrowserContextPool._record_origin(pooled, request)
+
+    assert asyncio.run(BrowserContextPool()._reset(pooled))
+    assert sorted(browser_context.cleared) == [
+        "https://login.example.com",
+        "https://shop.example.com",
+        "https://widgets.example.net",
+    ]
+    assert browser_context.pages[0].url == "about:blank"
+    assert not pooled.origins
+
+
+def test_reset_recycles_a_context_with_too_many_origins():
+    browser_context = FakeBrowserContext("https://example.com")
+    pooled = _pooled(browser_context)
+    for i in range(3):
+        BrowserContextPool._record_origin(pooled, _request(f"https://site{i}.example.com"))
+
+    assert not asyncio.run(BrowserContextPool(max_reset_origins=2)._reset(pooled))
+    assert not browser_context.cleared
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from arachne.browser.scheduler import TaskScheduler
+from arachne.browser.task import TaskRequest, TaskStatus
+from arachne.exceptions import TaskNotFound
+
+REQUEST = TaskRequest(url="https://example.com")
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_tasks_run_by_priority_with_bounded_concurrency():
+    async def main():
+        order, running, peak = [], 0, 0
+
+        async def runner(task):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            order.append(task.title)
+            running -= 1
+            return task.title
+
+        scheduler = TaskScheduler(runner, max_concurrency=2)
+        tasks = [
+            await scheduler.submit(REQUEST.model_copy(update={"title": str(priority)}), priority=priority)
+            for priority in (3, 1, 2, 0)
+        ]
+        await scheduler.start()
+        await scheduler.join()
+        await scheduler.stop()
+        return order, peak, tasks
+
+    order, peak, tasks = _run(main())
+    assert peak == 2
+    assert order[:2] == ["0", "1"]
+    assert all(task.status == TaskStatus.completed for task in tasks)
+    assert tasks[0].modified_at.tzinfo is not None
+
+
+def test_a_queued_task_times_out_without_a_free_worker():
+    async def main():
+        release = asyncio.Event()
+
+        async def runner(task):
+            await release.wait()
+            return "done"
+
+        scheduler = TaskScheduler(runner, max_concurrency=1)
+        await scheduler.start()
+        await scheduler.submit(REQUEST)
+        queued = await scheduler.submit(REQUEST, timeout=0.05)
+        await asyncio.wait_for(scheduler.wait(queued.task_id), 0.5)
+        release.set()
+        await scheduler.join()
+        await scheduler.stop()
+        return queued
+
+    queued = _run(main())
+    assert queued.status == TaskStatus.timed_out
+    assert queued.failure_reason == "Task deadline expired while queued"
+
+
+def test_a_running_task_times_out():
+    async def main():
+        async def runner(task):
+            await asyncio.sleep(10)
+
+        scheduler = TaskScheduler(runner, default_timeout=0.05)
+        await scheduler.start()
+        task = await scheduler.submit(REQUEST)
+        await asyncio.wait_for(scheduler.wait(task.task_id), 0.5)
+        await scheduler.stop()
+        return task
+
+    assert _run(main()).failure_reason == "Task deadline expired while running"
+
+
+def test_finished_tasks_are_evicted():
+    async def main():
+        async def runner(task):
+            return "done"
+
+        scheduler = TaskScheduler(runner, max_finished_tasks=2)
+        await scheduler.start()
+        tasks = [await scheduler.submit(REQUEST) for _ in range(5)]
+        await scheduler.join()
+        await scheduler.stop()
+        return scheduler, tasks
+
+    scheduler, tasks = _run(main())
+    with pytest.raises(TaskNotFound):
+        scheduler.get_task(tasks[0].task_id)
+    assert scheduler.get_task(tasks[-1].task_id).status == TaskStatus.completed
+    assert not scheduler._done
@@ -0,0 +1,79 @@
+import asyncio
+import io
+
+from PIL import Image
+
+from arachne.browser.manager import ScreenshotFormat
+from arachne.segments import SegmentCache, SegmentEncoder
+
+
+def _png(width: int, height: int, color: tuple[int, int, int]) -> bytes:
+    buffered = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def test_cache_evicts_least_recently_used_values_over_the_byte_cap():
+    cache: SegmentCache[str] = SegmentCache(max_entries=10, max_bytes=10, size_of=len)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    assert cache.get("a") == "aaaa"
+    cache.put("c", "cccc")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+    assert cache.size_bytes == 8
+
+
+def test_cache_replacing_a_value_updates_its_size_and_skips_oversized_values():
+    cache: SegmentCache[str] = SegmentCache(max_bytes=10, size_of=len)
+    cache.put("a", "aaaa")
+    cache.put("a", "aa")
+    assert cache.size_bytes == 2
+
+    cache.put("b", "b" * 11)
+    assert cache.get("b") is None
+    assert len(cache) == 1
+
+
+def test_cache_without_size_of_is_capped_by_entries():
+    cache: SegmentCache[int] = SegmentCache(max_entries=2)
+    for value in range(3):
+        cache.put(str(value), value)
+
+    assert cache.get("0") is None
+    assert len(cache) == 2
+
+
+def test_encoders_share_the_pending_limit_on_a_loop():
+    async def main():
+        first, second = SegmentEncoder(), SegmentEncoder()
+        assert first._pending() is second._pending()
+        return first._pending()
+
+    assert asyncio.run(main()) is not asyncio.run(main())
+
+
+def test_unchanged_segments_are_served_from_the_cache():
+    async def main():
+        encoder = SegmentEncoder(segment_height=100)
+        first = await encoder.encode(_png(50, 200, (255, 255, 255)))
+        # The same segment pixels in a different screenshot
+        second = await encoder.encode(_png(50, 100, (255, 255, 255)))
+        return encoder, first, second
+
+    encoder, first, second = asyncio.run(main())
+    assert len(first) == 2
+    assert second == first[:1]
+    assert encoder.cache.hits >= 2
+    assert encoder.cache.size_bytes == len(first[0]["image_url"]["url"])
+
+
+def test_segments_keep_the_screenshot_format():
+    async def main():
+        encoder = SegmentEncoder(image_format=ScreenshotFormat.JPEG, quality=70)
+        return await encoder.encode(_png(50, 50, (0, 128, 255)))
+
+    segments = asyncio.run(main())
+    assert segments[0]["image_url"]["url"].startswith("data:image/jpeg;base64,")
@@ -0,0 +1,53 @@
+from arachne.ocr.types import ImageAnnotation
+from arachne.text_format import DEFAULT_CANVAS_WIDTH, format_text
+
+PAGE_WIDTH = 1280
+PAGE_HEIGHT = 720
+
+
+def _annotation(text: str, x: float, y: float, height: int = 14) -> ImageAnnotation:
+    return {
+        "text": text,
+        "midpoint": (x, y),
+        "midpoint_normalized": (x / PAGE_WIDTH, y / PAGE_HEIGHT),
+        "width": int(len(text) * height * 0.55),
+        "height": height,
+    }
+
+
+def _rows(text: str) -> list[str]:
+    return text.split("\n")[1:-1]
+
+
+def test_empty_page_uses_the_default_width():
+    assert format_text([]) == "-" * DEFAULT_CANVAS_WIDTH + "\n\n" + "-" * DEFAULT_CANVAS_WIDTH
+
+
+def test_lines_keep_their_order_and_horizontal_position():
+    text = format_text([
+        _annotation("Apply", 40, 50),
+        _annotation("Submit", 1000, 52),
+        _annotation("Name", 40, 100),
+    ])
+    first, *_, last = _rows(text)
+    assert first.startswith("Apply") and first.rstrip().endswith("Submit")
+    assert first.index("Submit") > len(first) // 2
+    assert last == "Name"
+
+
+def test_zero_page_size_falls_back_to_the_default():
+    annotation = _annotation("Email", 40, 50)
+    annotation["midpoint"] = (40, 0)
+    assert "Email" in format_text([annotation])
+
+
+def test_text_past_the_canvas_grows_its_row():
+    # Off page text, e.g. a carousel slide that is clipped but still in the DOM
+    annotations = [_annotation(word, x, 50) for word, x in [("one", 1500), ("two", 1600), ("three", 1700)]]
+    rows = _rows(format_text(annotations))
+    assert rows[0].split() == ["one", "two", "three"]
+
+
+def test_negative_positions_start_at_the_left_edge():
+    annotation = _annotation("Menu", -200, 50)
+    assert _rows(format_text([annotation]))[0] == "Menu"
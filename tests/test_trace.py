@@ -0,0 +1,170 @@
+import asyncio
+
+from arachne.browser.actions import Action, ClickAction, InputTextAction
+from arachne.executor import ActionResult
+from arachne.fingerprint import PageFingerprint
+from arachne.metrics import Metrics
+from arachne.trace import ActionTrace, TraceReplayer, TraceStore
+
+START_URL = "https://example.com/jobs/1"
+TASK = "fill these details in the web page"
+FORM = PageFingerprint(dom_digest="form", segment_hashes=(0x0F0F,), tag_digest="form-tags")
+REVIEW = PageFingerprint(dom_digest="review", segment_hashes=(0xF0F0,), tag_digest="review-tags")
+FORM_TAGS = {3: "/html/body/form/input[1]", 5: "/html/body/form/input[2]", 7: "/html/body/form/button"}
+REVIEW_TAGS = {2: "/html/body/div/button"}
+
+
+class FakeChatClient:
+    async def stream(self, payload):
+        raise AssertionError("replay must not call the model")
+
+    async def complete(self, payload):
+        raise AssertionError("replay must not call the model")
+
+
+class FakeExecutor:
+    """
+    Runs actions by moving the fake weaver to the next page and observes it once at the end, like ActionExecutor.
+    An action on a `failing` element fails.
+    """
+
+    def __init__(self, weaver: "FakeWeaver", failing: set[str]):
+        self.weaver = weaver
+        self.failing = failing
+        self.executed: list[list[Action]] = []
+
+    async def execute(self, actions: list[Action]):
+        self.executed.append(actions)
+        results = [
+            ActionResult(action=action, success=False, error="element is detached")
+            if action.element_id in self.failing
+            else ActionResult(action=action, success=True)
+            for action in actions
+        ]
+        if all(result.success for result in results):
+            self.weaver.advance()
+        return results, await self.weaver.read_page()
+
+
+class FakeWeaver:
+    """Stands in for WebWeaver, showing `pages` one after another as actions run."""
+
+    def __init__(self, pages: list[tuple[PageFingerprint, dict[int, str]]], failing: set[str] = frozenset()):
+        self.pages = pages
+        self.index = 0
+        self.page_fingerprint: PageFingerprint | None = None
+        self.tag_to_xpath: dict[int, str] = {}
+        self.metrics = Metrics()
+        self.chat_client = FakeChatClient()
+        self.action_executor = FakeExecutor(self, set(failing))
+
+    def advance(self) -> None:
+        self.index = min(self.index + 1, len(self.pages) - 1)
+
+    async def read_page(self):
+        self.page_fingerprint, self.tag_to_xpath = self.pages[self.index]
+        return []
+
+
+def _recorded_trace() -> ActionTrace:
+    trace = ActionTrace(start_url=START_URL, task_template=TASK, final_answer="Submitted")
+    trace.record(
+        {"action": "type_text", "action_input": [["Jane", 3], ["jane@example.com", 5]]},
+        [InputTextAction(element_id=3, text="Jane"), InputTextAction(element_id=5, text="jane@example.com")],
+        FORM,
+        FORM_TAGS,
+    )
+    trace.record({"action": "click", "action_input": 7}, [ClickAction(element_id=7)], FORM, FORM_TAGS)
+    trace.record({"action": "click", "action_input": 2}, [ClickAction(element_id=2)], REVIEW, REVIEW_TAGS)
+    return trace
+
+
+def _replay(weaver: FakeWeaver, trace: ActionTrace):
+    return asyncio.run(TraceReplayer(weaver).replay(trace))
+
+
+def test_a_recorded_trace_replays_to_completion_without_the_model():
+    weaver = FakeWeaver([(FORM, FORM_TAGS), (FORM, FORM_TAGS), (REVIEW, REVIEW_TAGS)])
+    trace = _recorded_trace()
+
+    result = _replay(weaver, trace)
+
+    assert result.completed
+    assert result.diverged_at is None
+    assert result.steps == trace.steps
+    assert [[action.element_id for action in actions] for actions in weaver.action_executor.executed] == [
+        ["3", "5"],
+        ["7"],
+        ["2"],
+    ]
+
+
+def test_replay_diverges_when_the_page_fingerprint_changed():
+    changed_review = PageFingerprint(dom_digest="review", segment_hashes=(0xFFFF,), tag_digest="review-tags")
+    weaver = FakeWeaver([(FORM, FORM_TAGS), (FORM, FORM_TAGS), (changed_review, REVIEW_TAGS)])
+
+    result = _replay(weaver, _recorded_trace())
+
+    assert not result.completed
+    assert result.diverged_at == 2
+    assert result.reason == "page fingerprint changed"
+    assert len(result.steps) == 2
+    assert len(weaver.action_executor.executed) == 2
+
+
+def test_replay_diverges_when_a_targeted_element_moved():
+    moved = {**FORM_TAGS, 5: "/html/body/form/div/input"}
+    weaver = FakeWeaver([(FORM, moved)])
+
+    result = _replay(weaver, _recorded_trace())
+
+    assert not result.completed
+    assert result.diverged_at == 0
+    assert result.reason == "element 5 moved from /html/body/form/input[2] to /html/body/form/div/input"
+    assert result.steps == []
+    assert weaver.action_executor.executed == []
+
+
+def test_a_failed_action_stops_replay_at_its_step():
+    weaver = FakeWeaver([(FORM, FORM_TAGS), (FORM, FORM_TAGS)], failing={"7"})
+
+    result = _replay(weaver, _recorded_trace())
+
+    assert not result.completed
+    assert result.diverged_at == 1
+    assert result.reason == "action on element 7 failed: element is detached"
+    assert len(result.steps) == 1
+    assert len(weaver.action_executor.executed) == 2
+
+
+def test_traces_are_stored_per_start_url_and_task_template(tmp_path):
+    store = TraceStore(tmp_path)
+    trace = _recorded_trace()
+    other_task = ActionTrace(start_url=START_URL, task_template="apply with another resume", final_answer="Other")
+
+    async def main():
+        await store.save(trace)
+        await store.save(other_task)
+        return (
+            await store.load(START_URL, TASK),
+            await store.load(START_URL, other_task.task_template),
+            await store.load("https://example.com/jobs/2", TASK),
+        )
+
+    loaded, loaded_other, missing = asyncio.run(main())
+
+    assert loaded == trace
+    assert loaded.steps[0].parsed_actions()[1].text == "jane@example.com"
+    assert loaded_other.final_answer == "Other"
+    assert missing is None
+    # Written atomically, no temporary files are left next to the traces
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        f"{TraceStore.key(START_URL, task)}.json" for task in (TASK, other_task.task_template)
+    )
+
+
+def test_an_unreadable_trace_is_ignored(tmp_path):
+    store = TraceStore(tmp_path)
+    (tmp_path / f"{TraceStore.key(START_URL, TASK)}.json").write_text("{not json")
+
+    assert asyncio.run(store.load(START_URL, TASK)) is None
@@ -0,0 +1,52 @@
+"""
+The memoized xpath builder in tags.ts against the getElementXPath it replaced, on the saved pages in
+tests/fixtures/xpath. Needs the built tags bundle (`npm run build`) and a Playwright Chromium.
+"""
+from pathlib import Path
+
+import pytest
+
+from arachne.agent import WebWeaver
+
+FIXTURES = Path(__file__).parent / "fixtures" / "xpath"
+PAGES = sorted(FIXTURES.glob("*.html"))
+
+sync_api = pytest.importorskip("playwright.sync_api")
+if not WebWeaver._JS_TAG_UTILS.exists():
+    pytest.skip(f"{WebWeaver._JS_TAG_UTILS.name} is not built, run npm run build", allow_module_level=True)
+
+
+@pytest.fixture(scope="module")
+def browser():
+    with sync_api.sync_playwright() as playwright:
+        try:
+            browser = playwright.chromium.launch()
+        except sync_api.Error as e:
+            pytest.skip(f"Chromium is not available: {e}")
+        yield browser
+        browser.close()
+
+
+@pytest.mark.parametrize("tag_leaf_texts", [False, True])
+@pytest.mark.parametrize("fixture", PAGES, ids=[page.stem for page in PAGES])
+def test_builder_matches_legacy_get_xpath(browser, fixture, tag_leaf_texts):
+    page = browser.new_page()
+    try:
+        page.set_content(fixture.read_text())
+        page.add_script_tag(path=WebWeaver._JS_TAG_UTILS)
+        page.add_script_tag(path=FIXTURES / "legacy_xpath.js")
+
+        tag_to_xpath = page.evaluate("tagLeafTexts => window.tagifyWebpage(tagLeafTexts)", tag_leaf_texts)
+        # The legacy builder has to see the page without the tag spans, like the new one did
+        page.evaluate("window.removeTags()")
+        legacy = page.evaluate(
+            """ids => Object.fromEntries(
+                ids.map((id) => [id, window.legacyGetElementXPath(window.getTaggedElement(Number(id)))]),
+            )""",
+            list(tag_to_xpath),
+        )
+
+        assert tag_to_xpath
+        assert tag_to_xpath == legacy
+    finally:
+        page.close()